@@ -0,0 +1,95 @@
+"""Compare per-call overhead of bare requests.post vs the pooled LLMClient.
+
+Runs against the bundled local stub server, so it measures connection setup and client
+overhead only. Against a real HTTPS endpoint the pooled client additionally skips the TLS
+handshake on every reused connection, so the gap is considerably larger there.
+
+    python benchmarks/bench_http_pool.py --calls 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parents[1] / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+import requests  # noqa: E402
+
+from aiweb_gen.llm import LLMClient, LLMConfig  # noqa: E402
+from aiweb_gen.stubserver import StubServer  # noqa: E402
+
+
+def _payload(cfg: LLMConfig) -> str:
+    return json.dumps(
+        {
+            "model": cfg.model,
+            "temperature": 0.0,
+            "messages": [
+                {"role": "system", "content": "bench"},
+                {"role": "user", "content": "ping"},
+            ],
+        }
+    )
+
+
+def bench_bare(cfg: LLMConfig, calls: int) -> list[float]:
+    url = f"{cfg.base_url}/chat/completions"
+    headers = {"Authorization": f"Bearer {cfg.api_key}", "Content-Type": "application/json"}
+    body = _payload(cfg)
+    timings: list[float] = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        resp = requests.post(url, headers=headers, data=body, timeout=cfg.timeout_s)
+        resp.json()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_pooled(cfg: LLMConfig, calls: int) -> list[float]:
+    timings: list[float] = []
+    with LLMClient(cfg) as client:
+        for _ in range(calls):
+            start = time.perf_counter()
+            client.chat_completion(system="bench", user="ping")
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _summary(name: str, timings: list[float], connections: int) -> dict:
+    ordered = sorted(timings)
+    return {
+        "mode": name,
+        "calls": len(timings),
+        "connections": connections,
+        "mean_ms": round(statistics.fmean(timings) * 1000, 3),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p95_ms": round(ordered[int(len(ordered) * 0.95) - 1] * 1000, 3),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    results = []
+    for name, fn in (("bare_requests_post", bench_bare), ("pooled_session", bench_pooled)):
+        with StubServer() as stub:
+            cfg = LLMConfig(api_key="bench", base_url=stub.base_url, model="stub")
+            timings = fn(cfg, args.calls)
+            results.append(_summary(name, timings, stub.connections))
+
+    sys.stdout.write(json.dumps(results, indent=2))
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
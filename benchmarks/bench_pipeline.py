@@ -0,0 +1,313 @@
+"""End-to-end timings for architect, generate and patch against a replaying stub server.
+
+Each app size gets a synthetic cassette (a spec with N models and pages, matching backend
+and frontend bundles, a passing validator report and a one-line diff) served by
+``aiweb_gen.stubserver`` in its own process. Every flow runs in a fresh worker process, so
+wall time, CPU time and peak RSS belong to that run alone; the request count comes from the
+stub's /stats endpoint.
+
+    python benchmarks/bench_pipeline.py --sizes small,medium --repeat 3
+    python benchmarks/bench_pipeline.py --latency 0.5 --jitter 0.2 --tokens-per-second 300
+
+A cassette recorded from a real provider (``python -m aiweb_gen.stubserver --record``) can
+be replayed with ``--cassette`` instead; it is matched on the system prompt only.
+"""
+
+from __future__ import annotations
+
+import argparse
+import difflib
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+import requests  # noqa: E402
+
+from aiweb_gen.llm import LLMClient, LLMConfig  # noqa: E402
+from aiweb_gen.prompts import load_prompt  # noqa: E402
+from aiweb_gen.stubserver import Cassette  # noqa: E402
+from aiweb_gen.tracing import Tracer, use_tracer  # noqa: E402
+
+PROMPTS_DIR = ROOT / "prompts"
+# Number of database models (and pages) in the synthetic app.
+SIZES = {"small": 3, "medium": 12, "large": 40}
+FLOWS = ("architect", "generate", "patch")
+PATCH_REQUEST = "Add a health check endpoint"
+
+
+def _name(i: int) -> str:
+    return f"item{i}"
+
+
+def synthetic_spec(size: str) -> dict:
+    n = SIZES[size]
+    return {
+        "app_name": f"bench_{size}",
+        "description": f"Synthetic benchmark app with {n} models",
+        "tech_stack": {"backend": "fastapi", "frontend": "react"},
+        "pages": [{"name": f"Page{i}", "route": f"/{_name(i)}"} for i in range(n)],
+        "components": [{"name": "Layout"}],
+        "database_models": [
+            {"name": f"Item{i}", "fields": [{"name": "id", "type": "int"}]} for i in range(n)
+        ],
+        "api_endpoints": [
+            {"method": method, "path": f"/api/{_name(i)}"}
+            for i in range(n)
+            for method in ("GET", "POST")
+        ],
+        "non_functional_requirements": [],
+    }
+
+
+def _main_py(n: int, *, patched: bool = False) -> str:
+    lines = ["from fastapi import FastAPI", ""]
+    lines += [f"from .routers import {_name(i)}" for i in range(n)]
+    lines += ["", "app = FastAPI()"]
+    lines += [f"app.include_router({_name(i)}.router)" for i in range(n)]
+    if patched:
+        lines += ["", "", '@app.get("/health")', "def health() -> dict:", '    return {"ok": True}']
+    return "\n".join(lines) + "\n"
+
+
+def _bundle(files: dict[str, str]) -> str:
+    return "".join(f"=== FILE: {path} ===\n{content}" for path, content in files.items())
+
+
+def backend_bundle(n: int) -> str:
+    files = {"app/__init__.py": "\n", "app/main.py": _main_py(n), "app/routers/__init__.py": "\n"}
+    for i in range(n):
+        name = _name(i)
+        files[f"app/models/{name}.py"] = (
+            f"from pydantic import BaseModel\n\n\nclass Item{i}(BaseModel):\n    id: int\n"
+        )
+        files[f"app/routers/{name}.py"] = (
+            "from fastapi import APIRouter\n\n"
+            f"from ..models.{name} import Item{i}\n\n"
+            f'router = APIRouter(prefix="/api/{name}")\n\n\n'
+            f'@router.get("")\ndef list_{name}() -> list[Item{i}]:\n    return []\n'
+        )
+    return _bundle(files)
+
+
+def frontend_bundle(n: int) -> str:
+    imports = "".join(f"import Page{i} from './pages/Page{i}';\n" for i in range(n))
+    routes = "".join(f"      <Page{i} />\n" for i in range(n))
+    files = {
+        "src/main.jsx": "import App from './App';\n\nexport default App;\n",
+        "src/App.jsx": f"{imports}\nexport default function App() {{\n  return (\n"
+        f"    <main>\n{routes}    </main>\n  );\n}}\n",
+    }
+    for i in range(n):
+        files[f"src/pages/Page{i}.jsx"] = (
+            f"export default function Page{i}() {{\n  return <h1>Item {i}</h1>;\n}}\n"
+        )
+    return _bundle(files)
+
+
+def patch_diff(n: int) -> str:
+    return "".join(
+        difflib.unified_diff(
+            _main_py(n).splitlines(keepends=True),
+            _main_py(n, patched=True).splitlines(keepends=True),
+            fromfile="a/app/main.py",
+            tofile="b/app/main.py",
+        )
+    )
+
+
+def write_cassette(path: Path, size: str) -> None:
+    """One recording per prompt, matched by system prompt only."""
+    n = SIZES[size]
+    answers = {
+        "ARCHITECT_MODE": json.dumps(synthetic_spec(size)),
+        "BACKEND_GENERATOR": backend_bundle(n),
+        "FRONTEND_GENERATOR": frontend_bundle(n),
+        "CODE_VALIDATOR": json.dumps({"valid": True, "issues": []}),
+        "PATCH_MODE": patch_diff(n),
+    }
+    cassette = Cassette(path, match="system")
+    for prompt, answer in answers.items():
+        system = load_prompt(PROMPTS_DIR, prompt)
+        messages = [{"role": "system", "content": system}, {"role": "user", "content": ""}]
+        cassette.add({"messages": messages}, answer)
+
+
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_worker(flow: str, size: str, base_url: str, workdir: Path) -> dict:
+    from aiweb_gen.flow import apply_patch_flow, architect_flow, generate_flow
+
+    cfg = LLMConfig(api_key="bench", base_url=base_url, model="stub")
+    idea = f"benchmark app ({size})"
+    out_dir = workdir / "out"
+    if flow == "patch":
+        # Patch a fresh copy of the generated backend; the copy is not timed.
+        source = next(out_dir.glob("*/backend"))
+        target = Path(tempfile.mkdtemp(prefix="patch-", dir=workdir))
+        shutil.copytree(source, target, dirs_exist_ok=True)
+
+    tracer = Tracer()
+    with LLMClient(cfg) as client, use_tracer(tracer):
+        wall, cpu = time.perf_counter(), time.process_time()
+        if flow == "architect":
+            spec = architect_flow(idea=idea, prompts_dir=PROMPTS_DIR, client=client)
+            result: dict = {"ok": bool(spec)}
+        elif flow == "generate":
+            result = generate_flow(
+                idea=idea,
+                out_dir=out_dir,
+                prompts_dir=PROMPTS_DIR,
+                strict=True,
+                concurrent=True,
+                client=client,
+            )
+        else:
+            result = apply_patch_flow(
+                root_dir=target,
+                change_request=PATCH_REQUEST,
+                prompts_dir=PROMPTS_DIR,
+                dry_run=False,
+                client=client,
+            )
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+    return {
+        "ok": bool(result.get("ok")),
+        "wall_s": round(wall, 4),
+        "cpu_s": round(cpu, 4),
+        "peak_rss_mb": _peak_rss_mb(),
+        "llm_calls": tracer.summary()["totals"]["llm_calls"],
+    }
+
+
+def _start_stub(cassette: Path, args: argparse.Namespace) -> tuple[subprocess.Popen, str]:
+    cmd = [sys.executable, "-m", "aiweb_gen.stubserver", "--port", "0"]
+    cmd += ["--cassette", str(cassette), "--match", "system"]
+    cmd += ["--latency", str(args.latency), "--jitter", str(args.jitter)]
+    cmd += ["--tokens-per-second", str(args.tokens_per_second)]
+    cmd += ["--rate-limit-every", str(args.rate_limit_every), "--retry-after", "0.05"]
+    if args.seed is not None:
+        cmd += ["--seed", str(args.seed)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True, env=_env())
+    assert proc.stdout is not None
+    line = proc.stdout.readline().strip()
+    if not line.startswith("Serving stub LLM on "):
+        proc.kill()
+        raise RuntimeError(f"Stub server failed to start: {line!r}")
+    return proc, line.rsplit(" ", 1)[-1]
+
+
+def _env() -> dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(SRC), env.get("PYTHONPATH")]))
+    # Keep the user's cache and routing config out of the measurements.
+    for key in ("AIWEB_CACHE", "AIWEB_ROUTES"):
+        env.pop(key, None)
+    return env
+
+
+def _stub_requests(base_url: str) -> int:
+    return int(requests.get(f"{base_url}/stats", timeout=10).json()["requests"])
+
+
+def _run_flow(flow: str, size: str, base_url: str, workdir: Path) -> dict:
+    before = _stub_requests(base_url)
+    cmd = [sys.executable, __file__, "--worker", flow, "--size", size]
+    cmd += ["--base-url", base_url, "--workdir", str(workdir)]
+    proc = subprocess.run(cmd, capture_output=True, text=True, env=_env())
+    if proc.returncode != 0:
+        raise RuntimeError(f"{flow} ({size}) failed:\n{proc.stderr}")
+    sample = json.loads(proc.stdout)
+    sample["requests"] = _stub_requests(base_url) - before
+    return sample
+
+
+def _summary(size: str, flow: str, samples: list[dict]) -> dict:
+    rss = [s["peak_rss_mb"] for s in samples if s["peak_rss_mb"] is not None]
+    return {
+        "size": size,
+        "flow": flow,
+        "runs": len(samples),
+        "ok": all(s["ok"] for s in samples),
+        "wall_s": round(statistics.median(s["wall_s"] for s in samples), 4),
+        "cpu_s": round(statistics.median(s["cpu_s"] for s in samples), 4),
+        "peak_rss_mb": max(rss) if rss else None,
+        "llm_calls": samples[-1]["llm_calls"],
+        "requests": samples[-1]["requests"],
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="small,medium,large")
+    parser.add_argument("--flows", default=",".join(FLOWS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cassette", help="Replay this cassette instead of a synthetic one")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--rate-limit-every", type=int, default=0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--worker", choices=FLOWS, help=argparse.SUPPRESS)
+    parser.add_argument("--size", choices=sorted(SIZES), help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        sample = run_worker(args.worker, args.size, args.base_url, Path(args.workdir))
+        sys.stdout.write(json.dumps(sample) + "\n")
+        return 0
+
+    sizes = [s for s in args.sizes.split(",") if s]
+    flows = [f for f in args.flows.split(",") if f]
+    unknown = [s for s in sizes if s not in SIZES] + [f for f in flows if f not in FLOWS]
+    if unknown:
+        parser.error(f"unknown sizes/flows: {', '.join(unknown)}")
+    if "patch" in flows and "generate" not in flows:
+        parser.error("patch runs on the generated backend, so it needs the generate flow")
+
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory(prefix="aiweb-bench-") as tmp:
+            workdir = Path(tmp)
+            cassette = Path(args.cassette) if args.cassette else workdir / "cassette.jsonl"
+            if not args.cassette:
+                write_cassette(cassette, size)
+            stub, base_url = _start_stub(cassette, args)
+            try:
+                for flow in flows:
+                    samples = [
+                        _run_flow(flow, size, base_url, workdir) for _ in range(args.repeat)
+                    ]
+                    results.append(_summary(size, flow, samples))
+            finally:
+                stub.terminate()
+                stub.wait(timeout=10)
+
+    sys.stdout.write(json.dumps(results, indent=2))
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
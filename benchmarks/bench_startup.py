@@ -0,0 +1,107 @@
+"""CLI startup cost: wall time of short invocations and `python -X importtime` of the CLI.
+
+Each command runs in a fresh interpreter; ``python -c pass`` is the floor they are measured
+against. The import breakdown lists the modules with the largest self time below
+``aiweb_gen.cli``, which is where to look when the budget in tests/test_startup.py trips.
+
+    python benchmarks/bench_startup.py --runs 30
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parents[1] / "src"
+
+
+def _env() -> dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(SRC), env.get("PYTHONPATH")]))
+    return env
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int, int]]:
+    """(module, depth, self_us, cumulative_us) for each line of -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|", 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def cli_imports() -> list[tuple[str, int, int, int]]:
+    """The import tree of aiweb_gen.cli (children are listed before their parent)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import aiweb_gen.cli"],
+        capture_output=True,
+        text=True,
+        env=_env(),
+        check=True,
+    )
+    rows = parse_importtime(proc.stderr)
+    end = next(i for i, row in enumerate(rows) if row[0] == "aiweb_gen.cli" and row[1] == 0)
+    start = end
+    while start > 0 and rows[start - 1][1] > 0:
+        start -= 1
+    return rows[start : end + 1]
+
+
+def _time_command(args: list[str], runs: int) -> dict:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], capture_output=True, env=_env(), check=False)
+        timings.append(time.perf_counter() - start)
+    return {
+        "command": " ".join(["python", *args]),
+        "median_ms": round(statistics.median(timings) * 1000, 2),
+        "min_ms": round(min(timings) * 1000, 2),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as runs_dir:
+        commands = [
+            ["-c", "pass"],
+            ["-m", "aiweb_gen", "--version"],
+            ["-m", "aiweb_gen", "--help"],
+            ["-m", "aiweb_gen", "runs", "list", "--runs-dir", runs_dir],
+            ["-m", "aiweb_gen", "patch"],  # usage error
+        ]
+        timings = [_time_command(cmd, args.runs) for cmd in commands]
+
+    samples = [cli_imports() for _ in range(args.runs)]
+    cli_us = [rows[-1][3] for rows in samples]
+    modules = {row[0] for row in samples[-1]}
+    heaviest = sorted(samples[-1], key=lambda row: row[2], reverse=True)[: args.top]
+
+    result = {
+        "commands": timings,
+        "import_aiweb_gen_cli_ms": round(statistics.median(cli_us) / 1000, 2),
+        "modules_imported": len(modules),
+        "requests_imported": "requests" in modules,
+        "heaviest_self_us": [{"module": row[0], "self_us": row[2]} for row in heaviest],
+    }
+    sys.stdout.write(json.dumps(result, indent=2))
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import json
+import math
+import re
+import threading
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+
+from . import tracing
+from .blobstore import BlobStore
+from .flow import generate_flow
+from .llm import LLMClient
+
+
+class BatchError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class BatchItem:
+    index: int
+    id: str
+    idea: str
+
+
+_SAFE_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+
+def read_batch_items(lines: Iterable[str]) -> list[BatchItem]:
+    """Parse a JSONL batch: each line is a JSON string (the idea) or {"idea": ..., "id": ...}.
+
+    The whole input is validated up front so a malformed line fails the batch before any
+    tokens are spent. Each item is generated under ``<out>/<id>``; ids default to the line
+    number and must be unique, plain directory names.
+    """
+    items: list[BatchItem] = []
+    seen: set[str] = set()
+    for lineno, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise BatchError(f"line {lineno}: invalid JSON: {exc}") from exc
+
+        if isinstance(obj, str):
+            obj = {"idea": obj}
+        idea = obj.get("idea") if isinstance(obj, dict) else None
+        if not isinstance(idea, str) or not idea.strip():
+            raise BatchError(
+                f"line {lineno}: expected a string or an object with a non-empty 'idea'"
+            )
+
+        item_id = str(obj.get("id", lineno))
+        if not _SAFE_ID_RE.match(item_id):
+            raise BatchError(f"line {lineno}: id must be a plain directory name, got {item_id!r}")
+        if item_id in seen:
+            raise BatchError(f"line {lineno}: duplicate id {item_id!r}")
+        seen.add(item_id)
+        items.append(BatchItem(index=len(items), id=item_id, idea=idea))
+    return items
+
+
+def _percentile(ordered: list[float], q: float) -> float | None:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def run_batch(
+    items: list[BatchItem],
+    *,
+    out_dir: Path,
+    prompts_dir: Path,
+    strict: bool,
+    dry_run: bool = False,
+    auto_retry: bool = False,
+    concurrent: bool = False,
+    stream: bool = False,
+    validator: str = "hybrid",
+    fanout: bool = False,
+    concurrency: int = 4,
+    client: LLMClient,
+    emit: Callable[[dict], None],
+    store: BlobStore | None = None,
+) -> dict:
+    """Run generate_flow for every item on a bounded worker pool sharing one client.
+
+    ``emit`` receives one result record per item as soon as it finishes (completion order,
+    not input order). Returns aggregate throughput and latency percentiles.
+    """
+    if concurrency < 1:
+        raise BatchError("concurrency must be >= 1")
+
+    emit_lock = threading.Lock()
+
+    def run_one(item: BatchItem) -> dict:
+        started = time.perf_counter()
+        record: dict = {"id": item.id, "index": item.index, "idea": item.idea}
+        try:
+            with tracing.span("batch.item", id=item.id):
+                result = generate_flow(
+                    idea=item.idea,
+                    out_dir=out_dir / item.id,
+                    prompts_dir=prompts_dir,
+                    strict=strict,
+                    dry_run=dry_run,
+                    auto_retry=auto_retry,
+                    concurrent=concurrent,
+                    stream=stream,
+                    validator=validator,
+                    fanout=fanout,
+                    client=client,
+                    store=store,
+                )
+            record["ok"] = bool(result.get("ok", False))
+            record["result"] = result
+        except Exception as exc:  # noqa: BLE001
+            record["ok"] = False
+            record["error"] = str(exc)
+        record["elapsed_s"] = round(time.perf_counter() - started, 3)
+        with emit_lock:
+            emit(record)
+        return record
+
+    batch_started = time.perf_counter()
+    latencies: list[float] = []
+    succeeded = 0
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="aiweb-batch") as pool:
+        futures = [pool.submit(tracing.run_in_context(run_one), item) for item in items]
+        for future in as_completed(futures):
+            record = future.result()
+            latencies.append(record["elapsed_s"])
+            succeeded += 1 if record["ok"] else 0
+    wall_s = time.perf_counter() - batch_started
+
+    latencies.sort()
+    p50 = _percentile(latencies, 50)
+    p95 = _percentile(latencies, 95)
+    return {
+        "total": len(items),
+        "ok": succeeded,
+        "failed": len(items) - succeeded,
+        "concurrency": concurrency,
+        "wall_s": round(wall_s, 3),
+        "throughput_per_min": round(len(items) / wall_s * 60, 3) if wall_s > 0 else None,
+        "latency_p50_s": p50,
+        "latency_p95_s": p95,
+    }
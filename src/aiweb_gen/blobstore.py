@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import errno
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+LINK_MODES = ("hardlink", "reflink")
+# Linux FICLONE ioctl: share the source's extents copy-on-write (btrfs, XFS, bcachefs).
+_FICLONE = 0x40049409
+# Errors meaning "this filesystem (pair) cannot link or clone", not "something is broken".
+_UNSUPPORTED = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTTY, errno.EINVAL}
+_UNSUPPORTED |= {getattr(errno, n) for n in ("EOPNOTSUPP", "ENOTSUP") if hasattr(errno, n)}
+
+
+class BlobStoreError(RuntimeError):
+    pass
+
+
+@dataclass
+class BlobStats:
+    # Files materialised from a blob that was already in the store (no content written).
+    reused: int = 0
+    # Blobs written for the first time.
+    stored: int = 0
+    # Materialisations that fell back to a plain copy (other filesystem, no reflink support).
+    copied: int = 0
+    bytes_reused: int = 0
+    bytes_stored: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class StoreUsage:
+    blobs: int = 0
+    # Bytes the store occupies on disk, counted once per blob.
+    bytes: int = 0
+    # Files outside the store hardlinked to a blob, and the bytes they would take as copies.
+    linked_files: int = 0
+    linked_bytes: int = 0
+    # Blobs no file links to any more; `gc` removes them once they are older than its grace.
+    unreferenced: int = 0
+    unreferenced_bytes: int = 0
+
+    def as_dict(self) -> dict:
+        saved = self.linked_bytes - (self.bytes - self.unreferenced_bytes)
+        return {**asdict(self), "saved_bytes": max(0, saved)}
+
+
+def default_store_dir() -> Path | None:
+    raw = os.environ.get("AIWEB_BLOB_STORE", "").strip()
+    return Path(raw) if raw else None
+
+
+def _reflink(src: Path, dst: Path) -> None:
+    try:
+        import fcntl
+    except ImportError:  # Windows: no ioctl, so reflinks are unsupported like on ext4
+        raise OSError(getattr(errno, "EOPNOTSUPP", errno.EINVAL), "reflink unsupported") from None
+
+    with open(src, "rb") as fin, open(dst, "xb") as fout:
+        try:
+            fcntl.ioctl(fout.fileno(), _FICLONE, fin.fileno())
+        except OSError:
+            fout.close()
+            dst.unlink(missing_ok=True)
+            raise
+
+
+class BlobStore:
+    """Content-addressed file store that generated trees are materialised from.
+
+    Each distinct file content is stored once, as ``root/<2-char prefix>/<sha256>``, and
+    target files are hardlinks to (or, with ``link="reflink"``, copy-on-write clones of)
+    that blob. Batches of near-identical apps then cost one copy of their shared boilerplate,
+    and writing a file whose content is already stored writes no data at all.
+
+    Hardlinked files share one inode: editing one in place edits every app linked to it.
+    The pipeline's own writers (bulk_write_files, the patch engine) always replace files via
+    rename, which detaches them from the blob; use reflinks if apps are edited by hand.
+
+    A blob's link count doubles as its reference count, so ``gc`` needs no manifest: blobs
+    only the store links to are garbage. Reflinked blobs have no links and are collected
+    once they have not been used for the grace period.
+    """
+
+    def __init__(self, root: Path, *, link: str = "hardlink") -> None:
+        if link not in LINK_MODES:
+            raise BlobStoreError(f"link must be one of {', '.join(LINK_MODES)}, got {link!r}")
+        self.root = root
+        self.link = link
+        self.stats = BlobStats()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, root: Path | None = None) -> BlobStore | None:
+        """The store at root, else AIWEB_BLOB_STORE; None when neither is set."""
+        root = root or default_store_dir()
+        if root is None:
+            return None
+        return cls(root, link=os.environ.get("AIWEB_BLOB_LINK", "").strip() or "hardlink")
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def holds(self, target: Path, data: bytes) -> bool:
+        """True if target is already a hardlink to the blob of data (no content read)."""
+        try:
+            return os.path.samefile(target, self.path_for(self.digest(data)))
+        except OSError:
+            return False
+
+    def _store(self, blob: Path, data: bytes) -> bool:
+        """Write the blob unless it exists; returns True if this call stored it."""
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=blob.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.chmod(tmp, 0o644)
+            # link() instead of replace(): a concurrent writer of the same content wins and
+            # files already linked to its inode stay linked to the blob.
+            os.link(tmp, blob)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            Path(tmp).unlink(missing_ok=True)
+
+    def _link(self, blob: Path, target: Path) -> None:
+        if self.link == "hardlink":
+            os.link(blob, target)
+        else:
+            _reflink(blob, target)
+            os.utime(blob)  # reflinks leave no link count; mtime marks the blob as in use
+
+    def materialize(self, target: Path, data: bytes) -> bool:
+        """Create target (which must not exist) with content data, backed by its blob.
+
+        Returns False when no content was written because the blob already existed.
+        """
+        blob = self.path_for(self.digest(data))
+        stored = copied = False
+        for _ in range(2):
+            if not blob.exists():
+                stored = self._store(blob, data) or stored
+            try:
+                self._link(blob, target)
+            except FileNotFoundError:
+                if target.parent.exists():
+                    continue  # collected by a concurrent gc between the check and the link
+                raise
+            except OSError as exc:
+                if exc.errno not in _UNSUPPORTED:
+                    raise
+                target.write_bytes(data)
+                copied = True
+            break
+        else:
+            raise BlobStoreError(f"Blob {blob.name} keeps disappearing; is gc running?")
+        if stored:
+            self._count(stored=1, bytes_stored=len(data), copied=int(copied))
+        else:
+            self._count(reused=1, bytes_reused=len(data), copied=int(copied))
+        return stored or copied
+
+    def _count(self, **deltas: int) -> None:
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self.stats, name, getattr(self.stats, name) + delta)
+
+    def _blobs(self) -> list[tuple[Path, os.stat_result]]:
+        blobs = []
+        if not self.root.exists():
+            return blobs
+        for path in self.root.glob("??/*"):
+            if path.name.startswith("."):
+                continue
+            try:
+                blobs.append((path, path.stat()))
+            except OSError:
+                continue
+        return blobs
+
+    def usage(self) -> StoreUsage:
+        usage = StoreUsage()
+        for _, st in self._blobs():
+            usage.blobs += 1
+            usage.bytes += st.st_size
+            if st.st_nlink > 1:
+                usage.linked_files += st.st_nlink - 1
+                usage.linked_bytes += st.st_size * (st.st_nlink - 1)
+            else:
+                usage.unreferenced += 1
+                usage.unreferenced_bytes += st.st_size
+        return usage
+
+    def gc(self, *, grace_s: float = 3600, dry_run: bool = False) -> dict:
+        """Remove blobs nothing links to that have not been used for grace_s seconds.
+
+        The grace period protects blobs a concurrent write has just stored but not yet
+        linked, and reflinked blobs that are still being reused.
+        """
+        cutoff = time.time() - grace_s
+        removed = 0
+        freed = 0
+        for path, st in self._blobs():
+            if st.st_nlink > 1 or max(st.st_mtime, st.st_ctime) > cutoff:
+                continue
+            if not dry_run:
+                try:
+                    path.unlink()
+                except OSError:
+                    continue
+            removed += 1
+            freed += st.st_size
+        if not dry_run:
+            # Temp files left by writers that crashed mid-store.
+            for tmp in self.root.glob("??/.tmp-*"):
+                try:
+                    if tmp.stat().st_mtime <= cutoff:
+                        tmp.unlink()
+                except OSError:
+                    continue
+        return {"removed": removed, "bytes_freed": freed, "dry_run": dry_run}
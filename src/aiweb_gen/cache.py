@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+
+class CacheError(RuntimeError):
+    pass
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    evictions: int = 0
+    expired: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def default_cache_dir() -> Path:
+    raw = os.environ.get("AIWEB_CACHE_DIR", "").strip()
+    if raw:
+        return Path(raw)
+    return Path.home() / ".cache" / "aiweb-gen" / "responses"
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return float(raw)
+    except ValueError as exc:
+        raise CacheError(f"{name} must be a number, got {raw!r}") from exc
+
+
+class ResponseCache:
+    """On-disk, content-addressed cache of LLM responses.
+
+    Entries are keyed by a SHA-256 of the canonical request payload and stored as one JSON
+    file each under ``root/<2-char prefix>/<key>.json``. A hit bumps the file mtime, so the
+    oldest mtimes are the least recently used entries and are evicted first once the total
+    size exceeds ``max_bytes``. Writes go through a temp file + rename, so concurrent
+    readers never see a partial entry.
+
+    With ``refresh=True`` lookups always miss but fresh responses are still stored.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        *,
+        ttl_s: float = 7 * 24 * 3600,
+        max_bytes: int = 256 * 1024 * 1024,
+        refresh: bool = False,
+    ) -> None:
+        self.root = root
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.refresh = refresh
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._total_bytes: int | None = None
+
+    @classmethod
+    def from_env(cls, *, refresh: bool = False) -> ResponseCache:
+        return cls(
+            default_cache_dir(),
+            ttl_s=_env_float("AIWEB_CACHE_TTL_S", 7 * 24 * 3600),
+            max_bytes=int(_env_float("AIWEB_CACHE_MAX_MB", 256) * 1024 * 1024),
+            refresh=refresh,
+        )
+
+    @staticmethod
+    def key(payload: dict) -> str:
+        canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> str | None:
+        if self.refresh:
+            self._count("misses")
+            return None
+
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            self._count("misses")
+            return None
+
+        if time.time() - float(entry.get("created_at", 0)) > self.ttl_s:
+            self._remove(path)
+            self._count("expired")
+            self._count("misses")
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._count("hits")
+        return entry.get("content")
+
+    def put(self, key: str, content: str) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        raw = json.dumps({"created_at": time.time(), "content": content}).encode("utf-8")
+
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-", suffix=".json")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(raw)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+        with self._lock:
+            self.stats.writes += 1
+            if self._total_bytes is not None:
+                self._total_bytes += len(raw)
+        self._evict_if_needed()
+
+    def _count(self, field: str) -> None:
+        with self._lock:
+            setattr(self.stats, field, getattr(self.stats, field) + 1)
+
+    def _remove(self, path: Path) -> int:
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return 0
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes -= size
+        return size
+
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        entries: list[tuple[float, int, Path]] = []
+        if not self.root.exists():
+            return entries
+        for path in self.root.glob("??/*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _evict_if_needed(self) -> None:
+        with self._lock:
+            total = self._total_bytes
+        if total is not None and total <= self.max_bytes:
+            return
+
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        with self._lock:
+            self._total_bytes = total
+        if total <= self.max_bytes:
+            return
+
+        for _, _, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            removed = self._remove(path)
+            if removed:
+                total -= removed
+                self._count("evictions")
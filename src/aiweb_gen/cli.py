@@ -5,16 +5,101 @@ import json
 import os
 import sys
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from .flow import (
-    apply_patch_flow,
-    architect_flow,
-    generate_flow,
-)
+from . import __version__
+from .defaults import DEFAULT_CONTEXT_TOKENS, DEFAULT_DAEMON_PORT, VALIDATOR_MODES
+
+# Everything else is imported where it is used: `requests` and the flows take far longer to
+# import than argument parsing, so --help, --version, `runs` and usage errors skip them, and
+# a thin client forwarding to the daemon only loads the daemon's stdlib HTTP client.
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from typing import TextIO
+
+    from .blobstore import BlobStore
+    from .cache import ResponseCache
+    from .daemon import Job
+    from .llm import LLMClient
+    from .routing import LLMRouter
+    from .runs import Run
+    from .tracing import Tracer
+
+
+def _add_cache_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write the on-disk LLM response cache",
+    )
+    p.add_argument(
+        "--refresh-cache",
+        action="store_true",
+        help="Ignore cached responses but store the fresh ones",
+    )
+
+
+def _add_validator_arg(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--validator",
+        choices=VALIDATOR_MODES,
+        default="hybrid",
+        help="hybrid: local static checks, then CODE_VALIDATOR only if they pass; "
+        "local: static checks only; llm: CODE_VALIDATOR only",
+    )
+
+
+def _add_fanout_arg(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--fanout",
+        action="store_true",
+        help="Generate each branch as a shared skeleton plus one concurrent request per "
+        "model/router group (backend) or page (frontend)",
+    )
+
+
+def _add_blob_store_arg(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--blob-store",
+        metavar="DIR",
+        help="Store file contents once in this content-addressed store and link the generated "
+        "files to it (default: AIWEB_BLOB_STORE; unset: plain files)",
+    )
+
+
+def _add_trace_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--trace-out",
+        help="Write per-stage timing and token spans to this file",
+    )
+    p.add_argument(
+        "--trace-format",
+        choices=("chrome", "jsonl"),
+        default="chrome",
+        help="chrome: Trace Event JSON for chrome://tracing or Perfetto; jsonl: one span per line",
+    )
 
 
 def main(argv: list[str] | None = None) -> int:
+    if (sys.argv[1:] if argv is None else argv) == ["--version"]:
+        # Scripts probe this constantly; answer before even building the parser.
+        sys.stdout.write(f"aiweb-gen {__version__}\n")
+        return 0
+
     parser = argparse.ArgumentParser(prog="aiweb-gen")
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+    parser.add_argument(
+        "--daemon",
+        metavar="ADDRESS",
+        help="Run architect/generate/generate-batch/patch on a running `aiweb-gen serve` "
+        "(http://host:port or unix:PATH; default: AIWEB_DAEMON)",
+    )
+    parser.add_argument(
+        "--priority",
+        type=int,
+        default=0,
+        help="Daemon job priority; higher runs first",
+    )
     sub = parser.add_subparsers(dest="cmd", required=True)
 
     p_arch = sub.add_parser("architect", help="Idea → JSON spec")
@@ -25,10 +110,12 @@ def main(argv: list[str] | None = None) -> int:
         action="store_true",
         help="Retry once if the model output cannot be parsed/validated",
     )
+    _add_cache_args(p_arch)
+    _add_trace_args(p_arch)
 
     p_gen = sub.add_parser("generate", help="Idea → spec → backend → validate → frontend → validate")
-    p_gen.add_argument("--idea", required=True)
-    p_gen.add_argument("--out", default="generated")
+    p_gen.add_argument("--idea", help="Required unless --resume is given")
+    p_gen.add_argument("--out", help="Output folder (default: generated, or the resumed run's)")
     p_gen.add_argument("--prompts", default="prompts")
     p_gen.add_argument("--strict", action="store_true", help="Fail if CODE_VALIDATOR reports issues")
     p_gen.add_argument(
@@ -41,53 +128,167 @@ def main(argv: list[str] | None = None) -> int:
         action="store_true",
         help="Retry once if the model output cannot be parsed/validated (or fails strict validation)",
     )
+    p_gen.add_argument(
+        "--concurrent",
+        action="store_true",
+        help="Generate and validate backend and frontend in parallel",
+    )
+    p_gen.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream generator output and write files as they arrive (after validation with --strict)",
+    )
+    _add_validator_arg(p_gen)
+    _add_fanout_arg(p_gen)
+    p_gen.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Diff the new spec against <out>/<app>/spec.json and regenerate only what changed",
+    )
+    p_gen.add_argument(
+        "--resume",
+        metavar="RUN_ID",
+        help="Continue a previous run, skipping the stages it already completed",
+    )
+    p_gen.add_argument(
+        "--no-checkpoint",
+        action="store_true",
+        help="Do not save stage outputs under the runs directory",
+    )
+    p_gen.add_argument("--runs-dir", help="Checkpoint directory (default: AIWEB_RUNS_DIR or .aiweb/runs)")
+    _add_blob_store_arg(p_gen)
+    _add_cache_args(p_gen)
+    _add_trace_args(p_gen)
+
+    p_batch = sub.add_parser(
+        "generate-batch",
+        help="Run generate for every idea in a JSONL file, streaming one JSON result per line",
+    )
+    p_batch.add_argument(
+        "--input",
+        required=True,
+        help='JSONL of ideas: "idea" strings or {"idea": ..., "id": ...} objects; "-" for stdin',
+    )
+    p_batch.add_argument("--out", default="generated", help="Each idea is generated under <out>/<id>")
+    p_batch.add_argument("--prompts", default="prompts")
+    p_batch.add_argument("--concurrency", type=int, default=4, help="Ideas generated at the same time")
+    p_batch.add_argument("--strict", action="store_true", help="Fail if CODE_VALIDATOR reports issues")
+    p_batch.add_argument("--dry-run", action="store_true")
+    p_batch.add_argument("--auto-retry", action="store_true")
+    p_batch.add_argument("--concurrent", action="store_true")
+    p_batch.add_argument("--stream", action="store_true")
+    _add_validator_arg(p_batch)
+    _add_fanout_arg(p_batch)
+    _add_blob_store_arg(p_batch)
+    _add_cache_args(p_batch)
+    _add_trace_args(p_batch)
 
     p_patch = sub.add_parser("patch", help="Generate unified diff and apply it")
     p_patch.add_argument("--root", required=True, help="Root folder of the existing codebase")
     p_patch.add_argument("--request", required=True, help="Change request")
     p_patch.add_argument("--prompts", default="prompts")
     p_patch.add_argument("--dry-run", action="store_true")
+    p_patch.add_argument(
+        "--context-tokens",
+        type=int,
+        default=DEFAULT_CONTEXT_TOKENS,
+        help="Approximate token budget for the file contents sent with the request",
+    )
+    p_patch.add_argument(
+        "--no-index",
+        action="store_true",
+        help="Do not create or use the persistent file index under <root>/.aiweb",
+    )
+    p_patch.add_argument(
+        "--git-apply",
+        action="store_true",
+        help="Apply the diff with `git apply` instead of the built-in patch engine",
+    )
+    p_patch.add_argument(
+        "--plan",
+        action="store_true",
+        help="Plan the files to change first, then request each file's diff concurrently",
+    )
+    _add_cache_args(p_patch)
+    _add_trace_args(p_patch)
+
+    p_serve = sub.add_parser(
+        "serve",
+        help="Run a daemon that keeps connections and caches warm and runs jobs from a queue",
+    )
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=DEFAULT_DAEMON_PORT)
+    p_serve.add_argument("--socket", help="Listen on this Unix socket instead of a TCP port")
+    p_serve.add_argument("--workers", type=int, default=2, help="Jobs run at the same time")
+    p_serve.add_argument(
+        "--max-queue", type=int, default=64, help="Waiting jobs before submissions are refused"
+    )
+    _add_cache_args(p_serve)
+
+    p_runs = sub.add_parser("runs", help="Inspect checkpointed generate runs")
+    runs_sub = p_runs.add_subparsers(dest="runs_cmd", required=True)
+    p_runs_list = runs_sub.add_parser("list", help="List runs, newest first, as JSON")
+    p_runs_list.add_argument("--runs-dir", help="Default: AIWEB_RUNS_DIR or .aiweb/runs")
+
+    p_store = sub.add_parser("store", help="Inspect or garbage-collect the blob store")
+    store_sub = p_store.add_subparsers(dest="store_cmd", required=True)
+    p_store_stats = store_sub.add_parser("stats", help="Blob count, size and bytes saved, as JSON")
+    p_store_gc = store_sub.add_parser("gc", help="Remove blobs no generated file links to")
+    p_store_gc.add_argument(
+        "--grace-s",
+        type=float,
+        default=3600,
+        help="Keep unreferenced blobs used within this many seconds",
+    )
+    p_store_gc.add_argument("--dry-run", action="store_true")
+    for p in (p_store_stats, p_store_gc):
+        p.add_argument("--blob-store", metavar="DIR", help="Default: AIWEB_BLOB_STORE")
 
     args = parser.parse_args(argv)
+    if args.cmd == "generate" and not (args.idea or args.resume):
+        parser.error("generate: --idea is required unless --resume is given")
+    if args.cmd == "generate" and args.incremental and args.resume:
+        parser.error("generate: --incremental cannot be combined with --resume")
+
+    if args.cmd == "runs":
+        from .runs import default_runs_dir, list_runs
+
+        # Local bookkeeping only; no LLM configuration needed.
+        runs_dir = Path(args.runs_dir) if args.runs_dir else default_runs_dir()
+        sys.stdout.write(json.dumps(list_runs(runs_dir), indent=2))
+        sys.stdout.write("\n")
+        return 0
+
+    if args.cmd == "store":
+        store = _blob_store(args)
+        if store is None:
+            parser.error("store: --blob-store or AIWEB_BLOB_STORE is required")
+        if args.store_cmd == "gc":
+            result = store.gc(grace_s=args.grace_s, dry_run=args.dry_run)
+        else:
+            result = {"root": str(store.root), "link": store.link, **store.usage().as_dict()}
+        sys.stdout.write(json.dumps(result, indent=2))
+        sys.stdout.write("\n")
+        return 0
 
     try:
-        if args.cmd == "architect":
-            spec = architect_flow(
-                idea=args.idea,
-                prompts_dir=Path(args.prompts),
-                auto_retry=args.auto_retry,
-            )
-            sys.stdout.write(json.dumps(spec, indent=2))
-            sys.stdout.write("\n")
-            return 0
+        if args.cmd == "serve":
+            return _serve(args)
+        address = args.daemon or os.environ.get("AIWEB_DAEMON", "").strip()
+        if address:
+            return _forward(args, address)
 
-        if args.cmd == "generate":
-            out_dir = Path(args.out)
-            result = generate_flow(
-                idea=args.idea,
-                out_dir=out_dir,
-                prompts_dir=Path(args.prompts),
-                strict=args.strict,
-                dry_run=args.dry_run,
-                auto_retry=args.auto_retry,
-            )
-            sys.stdout.write(json.dumps(result, indent=2))
-            sys.stdout.write("\n")
-            return 0 if result.get("ok", False) else 1
-
-        if args.cmd == "patch":
-            root = Path(args.root)
-            result = apply_patch_flow(
-                root_dir=root,
-                change_request=args.request,
-                prompts_dir=Path(args.prompts),
-                dry_run=args.dry_run,
-            )
-            sys.stdout.write(json.dumps(result, indent=2))
-            sys.stdout.write("\n")
-            return 0
-
-        raise RuntimeError(f"Unknown command: {args.cmd}")
+        from .cache import ResponseCache
+        from .tracing import Tracer, use_tracer
+
+        cache = None if args.no_cache else ResponseCache.from_env(refresh=args.refresh_cache)
+        tracer = Tracer()
+        try:
+            with _build_client(args, cache) as client, use_tracer(tracer):
+                return _run(args, client, tracer, out=sys.stdout, err=sys.stderr, stdin=sys.stdin)
+        finally:
+            if args.trace_out:
+                tracer.write(Path(args.trace_out), args.trace_format)
     except KeyboardInterrupt:
         return 130
     except Exception as exc:  # noqa: BLE001
@@ -97,5 +298,299 @@ def main(argv: list[str] | None = None) -> int:
         return 1
 
 
+def _build_client(
+    args: argparse.Namespace, cache: ResponseCache | None
+) -> LLMClient | LLMRouter:
+    import dataclasses
+
+    from .llm import LLMClient, load_llm_config
+    from .routing import LLMRouter
+
+    needed = 0
+    if args.cmd == "generate-batch":
+        # Every worker needs its own keep-alive connection (two with --concurrent).
+        needed = args.concurrency * (2 if args.concurrent else 1)
+    elif args.cmd == "serve":
+        needed = args.workers * 2
+    routes = os.environ.get("AIWEB_ROUTES", "").strip()
+    if routes:
+        return LLMRouter.from_file(Path(routes), cache=cache, min_pool_maxsize=needed)
+    cfg = load_llm_config()
+    if needed:
+        cfg = dataclasses.replace(cfg, pool_maxsize=max(cfg.pool_maxsize, needed))
+    return LLMClient(cfg, cache=cache)
+
+
+def _client_stats(client: LLMClient | LLMRouter) -> dict:
+    from .routing import LLMRouter
+
+    stats = {
+        "cache": client.cache_stats(),
+        "scheduler": client.scheduler_stats(),
+        "hedging": client.hedge_stats(),
+    }
+    if isinstance(client, LLMRouter):
+        stats["routing"] = client.routing_stats()
+    return stats
+
+
+def _blob_store(args: argparse.Namespace) -> BlobStore | None:
+    from .blobstore import BlobStore
+
+    return BlobStore.from_env(Path(args.blob_store) if args.blob_store else None)
+
+
+def _prompt_manifest(args: argparse.Namespace) -> dict:
+    """Version and content hash of each prompt; llm.request trace spans carry the hash."""
+    from .prompts import get_registry
+
+    return get_registry(Path(args.prompts)).manifest()
+
+
+# Job options holding paths, resolved against the client's working directory by the daemon.
+_PATH_OPTIONS = ("prompts", "out", "root", "input", "trace_out", "runs_dir", "blob_store")
+
+
+def _serve(args: argparse.Namespace) -> int:
+    from .cache import ResponseCache
+    from .daemon import DaemonServer
+
+    cache = None if args.no_cache else ResponseCache.from_env(refresh=args.refresh_cache)
+    with _build_client(args, cache) as client:
+        server = DaemonServer(
+            _job_runner(client),
+            host=args.host,
+            port=args.port,
+            socket_path=args.socket,
+            workers=args.workers,
+            max_queue=args.max_queue,
+            extra_stats=lambda: _client_stats(client),
+        )
+        sys.stderr.write(f"aiweb-gen daemon listening on {server.address} (pid {os.getpid()})\n")
+        sys.stderr.flush()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+def _job_runner(client: LLMClient | LLMRouter) -> Callable[[Job], tuple[int, str, str]]:
+    """Run daemon jobs exactly like the CLI would, each with its own tracer and output."""
+    import io
+
+    from .runs import default_runs_dir
+    from .tracing import Tracer, use_tracer
+
+    def run(job: Job) -> tuple[int, str, str]:
+        args = argparse.Namespace(**{**job.args, "cmd": job.cmd})
+        cwd = Path(job.cwd or os.getcwd())
+        if args.cmd == "generate":
+            # Defaults that are relative paths must also resolve against the client's cwd.
+            args.runs_dir = args.runs_dir or str(default_runs_dir())
+            if not args.out and not args.resume:
+                args.out = "generated"
+        for name in _PATH_OPTIONS:
+            value = getattr(args, name, None)
+            if value and value != "-":
+                setattr(args, name, str(cwd / value))
+
+        out, err = io.StringIO(), io.StringIO()
+        tracer = Tracer()
+        try:
+            with use_tracer(tracer):
+                code = _run(
+                    args, client, tracer, out=out, err=err, stdin=io.StringIO(job.stdin or "")
+                )
+        except Exception as exc:  # noqa: BLE001
+            err.write(f"ERROR: {exc}\n")
+            code = 1
+        finally:
+            if getattr(args, "trace_out", None):
+                tracer.write(Path(args.trace_out), args.trace_format)
+        return code, out.getvalue(), err.getvalue()
+
+    return run
+
+
+def _forward(args: argparse.Namespace, address: str) -> int:
+    from .daemon import submit_job
+
+    if args.no_cache or args.refresh_cache:
+        raise ValueError(
+            "--no-cache/--refresh-cache apply to the whole daemon; pass them to `aiweb-gen serve`"
+        )
+    stdin = sys.stdin.read() if args.cmd == "generate-batch" and args.input == "-" else None
+    options = {k: v for k, v in vars(args).items() if k not in ("cmd", "daemon", "priority")}
+    job = submit_job(address, args.cmd, options, priority=args.priority, stdin=stdin)
+    sys.stdout.write(job["output"])
+    sys.stderr.write(job["errors"])
+    return int(job["exit_code"])
+
+
+def _write_json_line(out: TextIO, record: dict) -> None:
+    out.write(json.dumps(record))
+    out.write("\n")
+    out.flush()
+
+
+def _open_run(args: argparse.Namespace) -> Run | None:
+    from .runs import Run, default_runs_dir
+
+    runs_dir = Path(args.runs_dir) if args.runs_dir else default_runs_dir()
+    if args.resume:
+        run = Run.open(runs_dir, args.resume)
+        if args.idea and args.idea != run.idea:
+            raise ValueError(f"--idea does not match the idea of run {run.id}")
+        return run
+    if args.no_checkpoint:
+        return None
+    options = {
+        "out": args.out or "generated",
+        "prompts": args.prompts,
+        "strict": args.strict,
+        "validator": args.validator,
+    }
+    return Run.create(runs_dir, idea=args.idea, options=options)
+
+
+def _run(
+    args: argparse.Namespace,
+    client: LLMClient | LLMRouter,
+    tracer: Tracer,
+    *,
+    out: TextIO,
+    err: TextIO,
+    stdin: TextIO,
+) -> int:
+    if args.cmd == "architect":
+        from .flow import architect_flow
+
+        spec = architect_flow(
+            idea=args.idea,
+            prompts_dir=Path(args.prompts),
+            auto_retry=args.auto_retry,
+            client=client,
+        )
+        out.write(json.dumps(spec, indent=2))
+        out.write("\n")
+        return 0
+
+    if args.cmd == "generate" and args.incremental:
+        from .flow import incremental_generate_flow
+
+        store = _blob_store(args)
+        result = incremental_generate_flow(
+            idea=args.idea,
+            out_dir=Path(args.out or "generated"),
+            prompts_dir=Path(args.prompts),
+            strict=args.strict,
+            dry_run=args.dry_run,
+            auto_retry=args.auto_retry,
+            validator=args.validator,
+            client=client,
+            store=store,
+        )
+        result.update(_client_stats(client))
+        if store is not None:
+            result["store"] = store.stats.as_dict()
+        result["prompts"] = _prompt_manifest(args)
+        result["trace"] = tracer.summary()
+        out.write(json.dumps(result, indent=2))
+        out.write("\n")
+        return 0 if result.get("ok", False) else 1
+
+    if args.cmd == "generate":
+        from .flow import generate_flow
+
+        run = _open_run(args)
+        if run is not None:
+            err.write(f"Run {run.id} (resume with --resume {run.id})\n")
+        idea = run.idea if run is not None and args.resume else args.idea
+        saved_out = run.options.get("out") if run is not None else None
+        out_dir = args.out or saved_out or "generated"
+        store = _blob_store(args)
+        result = generate_flow(
+            idea=idea,
+            out_dir=Path(out_dir),
+            prompts_dir=Path(args.prompts),
+            strict=args.strict,
+            dry_run=args.dry_run,
+            auto_retry=args.auto_retry,
+            concurrent=args.concurrent,
+            stream=args.stream,
+            validator=args.validator,
+            fanout=args.fanout,
+            run=run,
+            client=client,
+            store=store,
+        )
+        result.update(_client_stats(client))
+        if store is not None:
+            result["store"] = store.stats.as_dict()
+        result["prompts"] = _prompt_manifest(args)
+        result["trace"] = tracer.summary()
+        out.write(json.dumps(result, indent=2))
+        out.write("\n")
+        return 0 if result.get("ok", False) else 1
+
+    if args.cmd == "generate-batch":
+        from .batch import read_batch_items, run_batch
+
+        if args.input == "-":
+            items = read_batch_items(stdin)
+        else:
+            with open(args.input, encoding="utf-8") as fh:
+                items = read_batch_items(fh)
+        store = _blob_store(args)
+        summary = run_batch(
+            items,
+            out_dir=Path(args.out),
+            prompts_dir=Path(args.prompts),
+            strict=args.strict,
+            dry_run=args.dry_run,
+            auto_retry=args.auto_retry,
+            concurrent=args.concurrent,
+            stream=args.stream,
+            validator=args.validator,
+            fanout=args.fanout,
+            concurrency=args.concurrency,
+            client=client,
+            emit=lambda record: _write_json_line(out, record),
+            store=store,
+        )
+        summary.update(_client_stats(client))
+        if store is not None:
+            summary["store"] = store.stats.as_dict()
+        summary["prompts"] = _prompt_manifest(args)
+        summary["trace"] = tracer.summary()
+        _write_json_line(out, {"summary": summary})
+        return 0 if summary["failed"] == 0 else 1
+
+    if args.cmd == "patch":
+        from .flow import apply_patch_flow
+
+        root = Path(args.root)
+        result = apply_patch_flow(
+            root_dir=root,
+            change_request=args.request,
+            prompts_dir=Path(args.prompts),
+            dry_run=args.dry_run,
+            token_budget=args.context_tokens,
+            use_index=not args.no_index,
+            use_git=True if args.git_apply else None,
+            plan=args.plan,
+            client=client,
+        )
+        result.update(_client_stats(client))
+        result["prompts"] = _prompt_manifest(args)
+        result["trace"] = tracer.summary()
+        out.write(json.dumps(result, indent=2))
+        out.write("\n")
+        return 0
+
+    raise RuntimeError(f"Unknown command: {args.cmd}")
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
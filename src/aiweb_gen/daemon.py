@@ -0,0 +1,576 @@
+from __future__ import annotations
+
+import hmac
+import http.client
+import itertools
+import json
+import os
+import queue
+import secrets
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from .defaults import DEFAULT_DAEMON_PORT as DEFAULT_PORT
+
+JOB_COMMANDS = ("architect", "generate", "generate-batch", "patch")
+
+
+class DaemonError(RuntimeError):
+    pass
+
+
+def token_path(address: str) -> Path:
+    """Where the daemon at address keeps the token its clients must send.
+
+    Next to the socket for ``unix:PATH``; otherwise ``daemon-<port>.token`` under
+    AIWEB_DAEMON_TOKEN_DIR (default ``~/.cache/aiweb-gen``).
+    """
+    if address.startswith("unix:"):
+        return Path(address[len("unix:") :] + ".token")
+    url = urlsplit(address if "://" in address else f"http://{address}")
+    raw = os.environ.get("AIWEB_DAEMON_TOKEN_DIR", "").strip()
+    directory = Path(raw) if raw else Path.home() / ".cache" / "aiweb-gen"
+    return directory / f"daemon-{url.port or DEFAULT_PORT}.token"
+
+
+def _write_token(path: Path, token: str) -> None:
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    # Recreated rather than truncated: O_CREAT's mode only applies to a new file, and a file
+    # left over from an earlier daemon may have wider permissions. On Windows the mode only
+    # controls the read-only flag; the file is as private as the directory it is in.
+    path.unlink(missing_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    try:
+        os.write(fd, token.encode("ascii"))
+    finally:
+        os.close(fd)
+
+
+def read_token(address: str) -> str | None:
+    try:
+        return token_path(address).read_text(encoding="ascii").strip() or None
+    except OSError:
+        return None
+
+
+@dataclass
+class Job:
+    id: str
+    cmd: str
+    # The command's parsed CLI options, as a JSON object.
+    args: dict
+    priority: int = 0
+    # Relative paths in args are resolved against the submitting client's directory.
+    cwd: str = ""
+    stdin: str | None = None
+    status: str = "queued"
+    exit_code: int | None = None
+    output: str = ""
+    errors: str = ""
+    submitted_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def as_dict(self) -> dict:
+        queued_until = self.started_at or self.finished_at or time.time()
+        return {
+            "id": self.id,
+            "cmd": self.cmd,
+            "priority": self.priority,
+            "status": self.status,
+            "exit_code": self.exit_code,
+            "output": self.output,
+            "errors": self.errors,
+            "queue_ms": round((queued_until - self.submitted_at) * 1000, 3),
+            "run_ms": (
+                round((self.finished_at - self.started_at) * 1000, 3)
+                if self.started_at is not None and self.finished_at is not None
+                else None
+            ),
+        }
+
+
+# Runs one job and returns (exit code, stdout text, stderr text).
+JobRunner = Callable[[Job], tuple[int, str, str]]
+
+
+@dataclass
+class QueueStats:
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    # Submissions refused because the queue was full.
+    rejected: int = 0
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    running: int = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "running": self.running,
+        }
+
+
+class JobQueue:
+    """Bounded priority queue of jobs drained by a fixed pool of worker threads.
+
+    Higher priorities run first; equal priorities run in submission order. Finished jobs
+    are kept (up to ``keep_finished``) so clients can poll for results.
+    """
+
+    def __init__(
+        self,
+        runner: JobRunner,
+        *,
+        workers: int = 2,
+        max_queue: int = 64,
+        keep_finished: int = 256,
+    ) -> None:
+        if workers < 1:
+            raise DaemonError("workers must be >= 1")
+        self.runner = runner
+        self.max_queue = max_queue
+        self.keep_finished = keep_finished
+        self.stats = QueueStats()
+        self._queue: queue.PriorityQueue[tuple[int, int, Job | None]] = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._work, name=f"aiweb-job-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(
+        self,
+        cmd: str,
+        args: dict,
+        *,
+        priority: int = 0,
+        cwd: str = "",
+        stdin: str | None = None,
+    ) -> Job:
+        if cmd not in JOB_COMMANDS:
+            raise DaemonError(f"Unknown job command: {cmd!r}")
+        job = Job(
+            id=uuid.uuid4().hex[:12],
+            cmd=cmd,
+            args=args,
+            priority=priority,
+            cwd=cwd,
+            stdin=stdin,
+        )
+        with self._lock:
+            if self._closed:
+                raise DaemonError("Daemon is shutting down")
+            if self.stats.queue_depth >= self.max_queue:
+                self.stats.rejected += 1
+                raise DaemonError(f"Job queue is full ({self.max_queue} waiting)")
+            self.stats.submitted += 1
+            self.stats.queue_depth += 1
+            self.stats.max_queue_depth = max(self.stats.max_queue_depth, self.stats.queue_depth)
+            self._jobs[job.id] = job
+            self._queue.put((-priority, next(self._seq), job))
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return self.stats.as_dict()
+
+    def _work(self) -> None:
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                self.stats.queue_depth -= 1
+                self.stats.running += 1
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                job.exit_code, job.output, job.errors = self.runner(job)
+            except Exception as exc:  # noqa: BLE001 - a job must never kill its worker
+                job.exit_code, job.errors = 1, f"ERROR: {exc}\n"
+            job.status = "done" if job.exit_code == 0 else "failed"
+            job.finished_at = time.time()
+            with self._lock:
+                self.stats.running -= 1
+                if job.exit_code == 0:
+                    self.stats.completed += 1
+                else:
+                    self.stats.failed += 1
+                self._forget_finished()
+            job.done.set()
+
+    def _forget_finished(self) -> None:
+        finished = [j for j in self._jobs.values() if j.finished_at is not None]
+        for job in finished[: max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job.id]
+
+    def close(self) -> None:
+        """Stop accepting jobs, let the queued ones finish and join the workers."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for _ in self._threads:
+            # Sorts after every real job, so workers drain the queue before they exit.
+            self._queue.put((1 << 62, next(self._seq), None))
+        for t in self._threads:
+            t.join()
+
+
+class _TCPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: _TCPServer
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        return
+
+    @property
+    def daemon(self) -> DaemonServer:
+        return self.server.daemon_server  # type: ignore[attr-defined]
+
+    def _send_json(self, status: int, body: dict) -> None:
+        raw = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _host_allowed(self) -> bool:
+        # Rejects DNS rebinding: a page on evil.example resolving to 127.0.0.1 sends its own Host.
+        url = urlsplit("//" + (self.headers.get("Host") or ""))
+        try:
+            port = url.port
+        except ValueError:
+            return False
+        return url.hostname in self.daemon.allowed_hosts and port in (None, self.daemon.port)
+
+    def _authorized(self, *, post: bool) -> bool:
+        """Answer 4xx and return False unless the request comes from a local CLI client.
+
+        Browsers attach Origin to every cross-site POST and can only send a few Content-Types
+        without a preflight; the token (readable only by the daemon's user) covers the rest.
+        """
+        if not self._host_allowed():
+            self._send_json(403, {"error": "unexpected Host header"})
+            return False
+        if self.headers.get("Origin") is not None:
+            self._send_json(403, {"error": "cross-origin requests are not allowed"})
+            return False
+        content_type = (self.headers.get("Content-Type") or "").split(";", 1)[0].strip()
+        if post and content_type.lower() != "application/json":
+            self._send_json(415, {"error": "Content-Type must be application/json"})
+            return False
+        scheme, _, token = (self.headers.get("Authorization") or "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(
+            token.strip().encode(), self.daemon.token.encode()
+        ):
+            error = f"missing or wrong token (see {self.daemon.token_file})"
+            self._send_json(401, {"error": error})
+            return False
+        return True
+
+    def do_GET(self) -> None:  # noqa: N802
+        url = urlsplit(self.path)
+        if url.path == "/health":
+            self._send_json(200, {"ok": True, "pid": os.getpid()})
+        elif not self._authorized(post=False):
+            return
+        elif url.path == "/stats":
+            self._send_json(200, self.daemon.stats())
+        elif url.path.startswith("/jobs/"):
+            job = self.daemon.jobs.get(url.path[len("/jobs/") :])
+            if job is None:
+                self._send_json(404, {"error": "unknown job"})
+                return
+            if parse_qs(url.query).get("wait") == ["1"]:
+                job.done.wait()
+            self._send_json(200, job.as_dict())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:  # noqa: N802
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if not self._authorized(post=True):
+            return
+        if self.path == "/shutdown":
+            self._send_json(200, {"ok": True})
+            threading.Thread(target=self.daemon.stop, daemon=True).start()
+            return
+        if self.path != "/jobs":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            body = json.loads(raw or b"{}")
+            if not isinstance(body, dict) or not isinstance(body.get("args"), dict):
+                raise ValueError("expected a JSON object with 'cmd' and 'args'")
+            if body.get("cmd") not in JOB_COMMANDS:
+                raise ValueError(f"Unknown job command: {body.get('cmd')!r}")
+            job = self.daemon.jobs.submit(
+                str(body.get("cmd")),
+                body["args"],
+                priority=int(body.get("priority", 0)),
+                cwd=str(body.get("cwd") or ""),
+                stdin=body.get("stdin"),
+            )
+        except (ValueError, TypeError) as exc:
+            self._send_json(400, {"error": str(exc)})
+            return
+        except DaemonError as exc:
+            self._send_json(503, {"error": str(exc)})
+            return
+        if body.get("wait", True):
+            job.done.wait()
+            self._send_json(200, job.as_dict())
+        else:
+            self._send_json(202, job.as_dict())
+
+
+class _UnixHandler(_Handler):
+    # TCP_NODELAY does not apply to Unix sockets.
+    disable_nagle_algorithm = False
+
+
+class DaemonServer:
+    """Long-running job server for ``aiweb-gen serve``.
+
+    Listens on a localhost TCP port or, with ``socket_path``, a Unix socket, and runs
+    architect/generate/patch jobs on a ``JobQueue``. Whatever ``runner`` closes over (LLM
+    client and its connection pool, response cache, prompt cache) stays warm between jobs.
+
+    ``POST /jobs`` takes ``{"cmd", "args", "priority", "cwd", "stdin", "wait"}`` and answers
+    with the finished job, or 202 and the queued job with ``"wait": false``; poll it with
+    ``GET /jobs/<id>`` (``?wait=1`` blocks). ``GET /stats``, ``GET /health`` and
+    ``POST /shutdown`` do what they say.
+
+    Every endpoint but ``/health`` requires ``Authorization: Bearer <token>``, with the token
+    the daemon writes to a 0600 file at ``token_path(address)`` (or ``token_file``) on start.
+    Requests with an Origin header, an unexpected Host or, for POST, a Content-Type other
+    than application/json are refused, so web pages cannot drive the daemon.
+    """
+
+    def __init__(
+        self,
+        runner: JobRunner,
+        *,
+        host: str = "127.0.0.1",
+        port: int = DEFAULT_PORT,
+        socket_path: str | None = None,
+        workers: int = 2,
+        max_queue: int = 64,
+        extra_stats: Callable[[], dict] | None = None,
+        token_file: Path | None = None,
+    ) -> None:
+        self.socket_path = socket_path
+        if socket_path is not None:
+            if not hasattr(socketserver, "ThreadingUnixStreamServer"):
+                raise DaemonError("Unix sockets are not supported on this platform")
+            if os.path.exists(socket_path):
+                _remove_stale_socket(socket_path)
+            self._httpd: socketserver.BaseServer = _UnixServer(socket_path, _UnixHandler)
+        else:
+            self._httpd = _TCPServer((host, port), _Handler)
+        self._httpd.daemon_server = self  # type: ignore[attr-defined]
+        if socket_path is not None:
+            self.port: int | None = None
+            self.allowed_hosts = {"localhost"}
+        else:
+            self.port = self._httpd.server_address[1]  # type: ignore[index]
+            self.allowed_hosts = {"localhost", "127.0.0.1", "::1", host}
+        self.token = secrets.token_urlsafe(32)
+        self.token_file = token_file or token_path(self.address)
+        try:
+            _write_token(self.token_file, self.token)
+        except OSError:
+            self._httpd.server_close()
+            raise
+        self.jobs = JobQueue(runner, workers=workers, max_queue=max_queue)
+        self.extra_stats = extra_stats
+        self._thread: threading.Thread | None = None
+        self._stop_lock = threading.Lock()
+        self._stopping = False
+        self._stopped = threading.Event()
+
+    @property
+    def address(self) -> str:
+        """What to put in AIWEB_DAEMON / --daemon to reach this server."""
+        if self.socket_path is not None:
+            return f"unix:{self.socket_path}"
+        host, port = self._httpd.server_address[:2]  # type: ignore[misc]
+        return f"http://{host}:{port}"
+
+    def stats(self) -> dict:
+        stats = {"jobs": self.jobs.snapshot()}
+        if self.extra_stats is not None:
+            stats.update(self.extra_stats())
+        return stats
+
+    def start(self) -> DaemonServer:
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """Stop accepting connections, finish the queued jobs, then close the listener."""
+        with self._stop_lock:
+            stopping, self._stopping = self._stopping, True
+        if stopping:
+            self._stopped.wait()
+            return
+        self._httpd.shutdown()
+        if self._thread is not None:
+            self._thread.join()
+        # Clients waiting on queued jobs still get their answers.
+        self.jobs.close()
+        self._httpd.server_close()
+        if self.socket_path is not None and os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.token_file.unlink(missing_ok=True)
+        self._stopped.set()
+
+    def __enter__(self) -> DaemonServer:
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+
+def _remove_stale_socket(path: str) -> None:
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise DaemonError(f"A daemon is already listening on {path}")
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float | None = None) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self._path)
+        self.sock = sock
+
+
+def _connect(address: str, timeout: float | None) -> http.client.HTTPConnection:
+    if address.startswith("unix:"):
+        return _UnixHTTPConnection(address[len("unix:") :], timeout=timeout)
+    url = urlsplit(address if "://" in address else f"http://{address}")
+    if url.scheme != "http" or not url.hostname:
+        raise DaemonError(f"Bad daemon address {address!r}; use http://host:port or unix:PATH")
+    return http.client.HTTPConnection(url.hostname, url.port or DEFAULT_PORT, timeout=timeout)
+
+
+def request(
+    address: str,
+    method: str,
+    path: str,
+    body: dict | None = None,
+    *,
+    timeout: float | None = None,
+    token: str | None = None,
+) -> tuple[int, dict]:
+    """One JSON request to a daemon; uses only the standard library so the client starts fast.
+
+    The token defaults to the one the daemon wrote to ``token_path(address)``.
+    """
+    token = token or read_token(address)
+    conn = _connect(address, timeout)
+    try:
+        raw = json.dumps(body).encode("utf-8") if body is not None else None
+        # Sent even without a body: the daemon refuses POSTs of any other type.
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        conn.request(method, path, body=raw, headers=headers)
+        resp = conn.getresponse()
+        data = resp.read()
+    except OSError as exc:
+        raise DaemonError(f"Cannot reach aiweb-gen daemon at {address}: {exc}") from exc
+    finally:
+        conn.close()
+    try:
+        return resp.status, json.loads(data or b"{}")
+    except ValueError as exc:
+        raise DaemonError(f"Bad response from daemon at {address}: {exc}") from exc
+
+
+def submit_job(
+    address: str,
+    cmd: str,
+    args: dict,
+    *,
+    priority: int = 0,
+    cwd: str | None = None,
+    stdin: str | None = None,
+    token: str | None = None,
+) -> dict:
+    """Run a job on the daemon and wait for it; returns the finished job as a dict."""
+    status, body = request(
+        address,
+        "POST",
+        "/jobs",
+        {
+            "cmd": cmd,
+            "args": args,
+            "priority": priority,
+            "cwd": cwd if cwd is not None else os.getcwd(),
+            "stdin": stdin,
+            "wait": True,
+        },
+        token=token,
+    )
+    if status != 200:
+        raise DaemonError(f"Daemon refused the job (HTTP {status}): {body.get('error', body)}")
+    return body
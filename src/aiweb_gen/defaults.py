@@ -0,0 +1,25 @@
+"""Defaults the CLI needs to build its argument parser, and environment overrides of limits.
+
+Kept free of everything but the standard library: ``aiweb-gen --help`` and invalid
+invocations load this module but none of the pipeline (``requests``, flows, validators).
+"""
+
+import os
+
+DEFAULT_CONTEXT_TOKENS = 48_000
+VALIDATOR_MODES = ("hybrid", "local", "llm")
+DEFAULT_DAEMON_PORT = 8765
+
+
+def env_limit(name: str, default: int) -> int:
+    """A positive integer limit (concurrency, shard size) from the environment, else default."""
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = int(raw)
+    except ValueError as exc:
+        raise ValueError(f"{name} must be an integer, got {raw!r}") from exc
+    if value < 1:
+        raise ValueError(f"{name} must be >= 1, got {value}")
+    return value
@@ -2,7 +2,8 @@ from __future__ import annotations
 
 import os
 import re
-from dataclasses import dataclass
+import tempfile
+from dataclasses import dataclass, field
 from pathlib import Path
 
 
@@ -14,13 +15,53 @@ class PatchError(RuntimeError):
 class PatchResult:
     applied_files: list[str]
     total_hunks: int
+    hunks_per_file: dict[str, int] = field(default_factory=dict)
+    # Hunks that only matched at a different line or after whitespace/context fuzzing.
+    fuzzy_hunks: int = 0
+    engine: str = "native"
 
 
-_DIFF_FILE_RE = re.compile(r"^\+\+\+\s+(?P<path>.+)$")
+@dataclass(frozen=True)
+class Hunk:
+    old_start: int
+    old_count: int
+    new_start: int
+    new_count: int
+    # (op, text) with op in " ", "-", "+"; text has no line terminator.
+    lines: list[tuple[str, str]]
+    old_no_eol: bool = False
+    new_no_eol: bool = False
+
+    @property
+    def old_lines(self) -> list[str]:
+        return [text for op, text in self.lines if op != "+"]
+
+    @property
+    def new_lines(self) -> list[str]:
+        return [text for op, text in self.lines if op != "-"]
+
+
+@dataclass(frozen=True)
+class FilePatch:
+    # None stands for /dev/null (file creation or deletion).
+    old_path: str | None
+    new_path: str | None
+    hunks: list[Hunk]
+
+    @property
+    def path(self) -> str:
+        return self.new_path or self.old_path or ""
+
+
+_HUNK_RE = re.compile(r"^@@ -(?P<os>\d+)(?:,(?P<oc>\d+))? \+(?P<ns>\d+)(?:,(?P<nc>\d+))? @@")
+# How far (in lines) a hunk may have drifted from its header position.
+_MAX_FUZZ = 2
 
 
 def _normalize_diff_path(path: str) -> str:
     p = path.strip()
+    # Strip a trailing timestamp ("path\t2024-01-01 ...") as written by diff -u.
+    p = p.split("\t", 1)[0].strip()
     if p.startswith("a/") or p.startswith("b/"):
         p = p[2:]
     if p in ("/dev/null", "dev/null"):
@@ -28,63 +69,369 @@ def _normalize_diff_path(path: str) -> str:
     return p
 
 
-def apply_unified_diff(root: Path, diff_text: str, *, dry_run: bool = False) -> PatchResult:
-    """Apply unified diff by shelling out to 'git apply' if available.
+def _is_file_header(lines: list[str], i: int) -> bool:
+    return lines[i].startswith("--- ") and i + 1 < len(lines) and lines[i + 1].startswith("+++ ")
 
-    Falls back to error if git isn't present. This is intentional: implementing a robust
-    patch engine is non-trivial, and git's patcher is reliable.
-    """
-    root = root.resolve()
-    if not root.exists():
-        raise PatchError(f"Root directory does not exist: {root}")
 
-    # Basic sanity: ensure the diff only targets paths under root.
-    applied_files: list[str] = []
-    total_hunks = diff_text.count("@@")
+def parse_unified_diff(diff_text: str) -> list[FilePatch]:
+    """Parse a unified diff into per-file hunks in a single pass.
 
-    for line in diff_text.splitlines():
-        m = _DIFF_FILE_RE.match(line)
-        if not m:
+    Hunk header counts are used to delimit hunk bodies, but model-written diffs often get
+    them wrong, so a body also ends at the next hunk/file header and is extended over
+    trailing +/-/context lines; the counts are then recomputed from the body.
+    """
+    lines = diff_text.replace("\r\n", "\n").split("\n")
+    patches: list[FilePatch] = []
+    i = 0
+    while i < len(lines):
+        if not _is_file_header(lines, i):
+            i += 1
             continue
-        p = _normalize_diff_path(m.group("path"))
-        if not p:
+
+        old_path = _normalize_diff_path(lines[i][4:]) or None
+        new_path = _normalize_diff_path(lines[i + 1][4:]) or None
+        if old_path is None and new_path is None:
+            raise PatchError("Diff file header has /dev/null on both sides")
+        i += 2
+
+        hunks: list[Hunk] = []
+        while i < len(lines) and lines[i].startswith("@@"):
+            hunk, i = _parse_hunk(lines, i)
+            hunks.append(hunk)
+        if not hunks:
+            raise PatchError(f"No hunks for {new_path or old_path}")
+        patches.append(FilePatch(old_path=old_path, new_path=new_path, hunks=hunks))
+
+    if not patches:
+        raise PatchError("No file changes found in diff")
+    return patches
+
+
+def _parse_hunk(lines: list[str], i: int) -> tuple[Hunk, int]:
+    m = _HUNK_RE.match(lines[i])
+    if not m:
+        raise PatchError(f"Malformed hunk header: {lines[i]!r}")
+    old_remaining = int(m.group("oc") or 1)
+    new_remaining = int(m.group("nc") or 1)
+    i += 1
+
+    body: list[tuple[str, str]] = []
+    old_no_eol = new_no_eol = False
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith("@@") or line.startswith("diff --git") or _is_file_header(lines, i):
+            break
+        counts_done = old_remaining <= 0 and new_remaining <= 0
+        if line.startswith("\\"):
+            if body:
+                op = body[-1][0]
+                old_no_eol = old_no_eol or op in " -"
+                new_no_eol = new_no_eol or op in " +"
+            i += 1
             continue
-        if p.startswith("/") or ":" in p:
-            raise PatchError(f"Absolute/drive path in diff not allowed: {p}")
-        target = (root / p).resolve()
-        if root not in target.parents and target != root:
-            raise PatchError(f"Path traversal in diff not allowed: {p}")
-        applied_files.append(os.path.relpath(str(target), str(root)))
-
-    # Use git apply for correctness.
+        if line == "" and counts_done:
+            break
+        op = line[:1] if line[:1] in (" ", "-", "+") else " "
+        if op == " " and line[:1] != " " and line != "":
+            # Not a diff body line at all (e.g. trailing prose).
+            break
+        text = line[1:] if line[:1] in (" ", "-", "+") else ""
+        body.append((op, text))
+        if op != "+":
+            old_remaining -= 1
+        if op != "-":
+            new_remaining -= 1
+        i += 1
+
+    # Drop blank lines that were swallowed as context at the very end of the diff.
+    while body and body[-1] == (" ", "") and i >= len(lines):
+        body.pop()
+
+    old_count = sum(1 for op, _ in body if op != "+")
+    new_count = sum(1 for op, _ in body if op != "-")
+    hunk = Hunk(
+        old_start=int(m.group("os")),
+        old_count=old_count,
+        new_start=int(m.group("ns")),
+        new_count=new_count,
+        lines=body,
+        old_no_eol=old_no_eol,
+        new_no_eol=new_no_eol,
+    )
+    return hunk, i
+
+
+@dataclass
+class _FileText:
+    lines: list[str]
+    final_newline: bool
+    crlf: bool
+
+    @classmethod
+    def parse(cls, text: str) -> _FileText:
+        crlf = "\r\n" in text
+        parts = text.replace("\r\n", "\n").split("\n")
+        final_newline = parts[-1] == ""
+        if final_newline:
+            parts.pop()
+        return cls(lines=parts, final_newline=final_newline or not parts, crlf=crlf)
+
+    def render(self) -> str:
+        if not self.lines:
+            return ""
+        sep = "\r\n" if self.crlf else "\n"
+        return sep.join(self.lines) + (sep if self.final_newline else "")
+
+
+def _matches(haystack: list[str], at: int, needle: list[str], *, loose: bool) -> bool:
+    if at < 0 or at + len(needle) > len(haystack):
+        return False
+    if loose:
+        return all(
+            " ".join(a.split()) == " ".join(b.split())
+            for a, b in zip(haystack[at : at + len(needle)], needle)
+        )
+    return haystack[at : at + len(needle)] == needle
+
+
+def _locate(haystack: list[str], needle: list[str], expected: int, lower: int) -> int | None:
+    """Nearest position >= lower where needle matches, exact before whitespace-insensitive."""
+    last = len(haystack) - len(needle)
+    if last < lower:
+        return None
+    expected = min(max(expected, lower), last)
+    for loose in (False, True):
+        for delta in range(0, max(expected - lower, last - expected) + 1):
+            for pos in (expected - delta, expected + delta):
+                if lower <= pos <= last and _matches(haystack, pos, needle, loose=loose):
+                    return pos
+    return None
+
+
+def _apply_hunks(path: str, text: _FileText, hunks: list[Hunk]) -> int:
+    """Apply hunks to text in place; return how many needed offset or fuzz."""
+    fuzzy = 0
+    offset = 0
+    lower = 0
+    for n, hunk in enumerate(hunks, start=1):
+        old = hunk.old_lines
+        new = hunk.new_lines
+        # Header line numbers are 1-based; "-N,0" means "insert after line N".
+        expected = (hunk.old_start - 1 if old else hunk.old_start) + offset
+        expected = max(lower, expected)
+
+        pos: int | None
+        trim_head = trim_tail = 0
+        if not old:
+            pos = min(expected, len(text.lines))
+        else:
+            pos = _locate(text.lines, old, expected, lower)
+            # Like patch(1): retry with up to _MAX_FUZZ leading/trailing context lines dropped.
+            fuzz = 0
+            while pos is None and fuzz < _MAX_FUZZ:
+                fuzz += 1
+                trim_head = _leading_context(hunk, fuzz)
+                trim_tail = _trailing_context(hunk, fuzz)
+                core = old[trim_head : len(old) - trim_tail]
+                if not core:
+                    break
+                found = _locate(text.lines, core, expected + trim_head, lower)
+                pos = None if found is None else found - trim_head
+            if pos is None:
+                raise PatchError(
+                    f"Hunk #{n} does not apply to {path} (expected near line {expected + 1})"
+                )
+
+        exact = _matches(text.lines, pos, old, loose=False)
+        if pos != expected or trim_head or trim_tail or not exact:
+            fuzzy += 1
+
+        start = pos + trim_head
+        stop = pos + len(old) - trim_tail
+        replacement = new[trim_head : len(new) - trim_tail] if (trim_head or trim_tail) else new
+        touches_end = stop >= len(text.lines)
+        text.lines[start:stop] = replacement
+        if touches_end and (hunk.new_no_eol or hunk.old_no_eol):
+            text.final_newline = not hunk.new_no_eol
+        offset += len(replacement) - (stop - start)
+        lower = start + len(replacement)
+    return fuzzy
+
+
+def _leading_context(hunk: Hunk, limit: int) -> int:
+    count = 0
+    for op, _ in hunk.lines:
+        if op != " " or count >= limit:
+            break
+        count += 1
+    return count
+
+
+def _trailing_context(hunk: Hunk, limit: int) -> int:
+    count = 0
+    for op, _ in reversed(hunk.lines):
+        if op != " " or count >= limit:
+            break
+        count += 1
+    return count
+
+
+def _safe_target(root: Path, rel: str) -> Path:
+    if rel.startswith("/") or ":" in rel:
+        raise PatchError(f"Absolute/drive path in diff not allowed: {rel}")
+    target = (root / rel).resolve()
+    if root not in target.parents and target != root:
+        raise PatchError(f"Path traversal in diff not allowed: {rel}")
+    return target
+
+
+def _commit(writes: dict[Path, str], deletes: list[Path]) -> None:
+    """Write every new file to a sibling temp file first, then rename them all into place.
+
+    If a rename fails, files already replaced are restored from their original content, so
+    the tree ends up either fully patched or unchanged.
+    """
+    staged: list[tuple[Path, str]] = []
+    try:
+        for target, content in writes.items():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(
+                dir=target.parent, prefix=f".{target.name}.", suffix=".tmp"
+            )
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as fh:
+                fh.write(content)
+            staged.append((target, tmp))
+    except BaseException:
+        for _, tmp in staged:
+            Path(tmp).unlink(missing_ok=True)
+        raise
+
+    originals: dict[Path, bytes | None] = {}
+    for target in [*writes, *deletes]:
+        originals[target] = target.read_bytes() if target.exists() else None
+
+    done: list[Path] = []
+    try:
+        for target, tmp in staged:
+            os.replace(tmp, target)
+            done.append(target)
+        for target in deletes:
+            target.unlink()
+            done.append(target)
+    except BaseException:
+        for _, tmp in staged:
+            Path(tmp).unlink(missing_ok=True)
+        for target in done:
+            original = originals[target]
+            if original is None:
+                target.unlink(missing_ok=True)
+            else:
+                target.write_bytes(original)
+        raise
+
+
+def _apply_with_git(
+    root: Path, diff_text: str, patches: list[FilePatch], *, dry_run: bool
+) -> PatchResult:
     import subprocess  # noqa: PLC0415
 
-    cmd = ["git", "apply"]
+    cmd = ["git", "apply", "--recount"]
     if dry_run:
         cmd.append("--check")
-
-    proc = subprocess.run(
-        cmd,
-        input=diff_text,
-        text=True,
-        cwd=str(root),
-        capture_output=True,
-    )
+    proc = subprocess.run(cmd, input=diff_text, text=True, cwd=str(root), capture_output=True)
     if proc.returncode != 0:
         raise PatchError((proc.stderr or proc.stdout or "git apply failed").strip())
+    hunks_per_file = {p.path: len(p.hunks) for p in patches}
+    return PatchResult(
+        applied_files=sorted(hunks_per_file),
+        total_hunks=sum(hunks_per_file.values()),
+        hunks_per_file=hunks_per_file,
+        engine="git",
+    )
 
-    if dry_run:
-        return PatchResult(applied_files=sorted(set(applied_files)), total_hunks=total_hunks)
-
-    # Now apply for real (we already checked):
-    proc2 = subprocess.run(
-        ["git", "apply"],
-        input=diff_text,
-        text=True,
-        cwd=str(root),
-        capture_output=True,
+
+def apply_unified_diff(
+    root: Path,
+    diff_text: str,
+    *,
+    dry_run: bool = False,
+    use_git: bool | None = None,
+) -> PatchResult:
+    """Apply a unified diff under root with the built-in patch engine.
+
+    The diff is parsed once, every hunk is validated against the current files in memory
+    (with offset and whitespace/context fuzzing), and only then are the results written,
+    atomically per file via temp file + rename with rollback on failure. Nothing is written
+    when any hunk fails, or with dry_run=True.
+
+    use_git=True (or AIWEB_PATCH_ENGINE=git) delegates to a single `git apply` instead.
+    """
+    root = root.resolve()
+    if not root.exists():
+        raise PatchError(f"Root directory does not exist: {root}")
+
+    patches = parse_unified_diff(diff_text)
+    for patch in patches:
+        for rel in (patch.old_path, patch.new_path):
+            if rel:
+                _safe_target(root, rel)
+
+    if use_git is None:
+        use_git = os.environ.get("AIWEB_PATCH_ENGINE", "").strip().lower() == "git"
+    if use_git:
+        return _apply_with_git(root, diff_text, patches, dry_run=dry_run)
+
+    # Validate everything in memory; later patches to the same file see earlier results.
+    pending: dict[Path, _FileText | None] = {}
+    hunks_per_file: dict[str, int] = {}
+    fuzzy = 0
+    for patch in patches:
+        source = _safe_target(root, patch.old_path) if patch.old_path else None
+        target = _safe_target(root, patch.new_path) if patch.new_path else None
+
+        if source is None:
+            if (target in pending and pending[target] is not None) or (
+                target not in pending and target.exists()
+            ):
+                raise PatchError(f"Cannot create {patch.new_path}: file already exists")
+            text = _FileText(lines=[], final_newline=True, crlf=False)
+        elif source in pending:
+            current = pending[source]
+            if current is None:
+                raise PatchError(f"Cannot patch {patch.old_path}: deleted earlier in this diff")
+            text = _FileText(list(current.lines), current.final_newline, current.crlf)
+        else:
+            if not source.is_file():
+                raise PatchError(f"Cannot patch {patch.old_path}: file does not exist")
+            # newline="" keeps \r\n, so CRLF files are written back with CRLF.
+            with open(source, encoding="utf-8", newline="") as fh:
+                text = _FileText.parse(fh.read())
+
+        fuzzy += _apply_hunks(patch.path, text, patch.hunks)
+
+        if target is None:
+            if text.lines:
+                raise PatchError(f"Deleting {patch.old_path} would leave content behind")
+            pending[source] = None
+        else:
+            if source is not None and source != target:
+                pending[source] = None  # rename
+            pending[target] = text
+        hunks_per_file[patch.path] = hunks_per_file.get(patch.path, 0) + len(patch.hunks)
+
+    applied_files = sorted(
+        {os.path.relpath(str(p), str(root)).replace(os.sep, "/") for p in pending}
     )
-    if proc2.returncode != 0:
-        raise PatchError((proc2.stderr or proc2.stdout or "git apply failed").strip())
+    result = PatchResult(
+        applied_files=applied_files,
+        total_hunks=sum(hunks_per_file.values()),
+        hunks_per_file=hunks_per_file,
+        fuzzy_hunks=fuzzy,
+    )
+    if dry_run:
+        return result
 
-    return PatchResult(applied_files=sorted(set(applied_files)), total_hunks=total_hunks)
+    writes = {p: t.render() for p, t in pending.items() if t is not None}
+    deletes = [p for p, t in pending.items() if t is None and p.exists()]
+    _commit(writes, deletes)
+    return result
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass, field
+
+from .parsing import FileBlock
+
+DEFAULT_FANOUT_CONCURRENCY = 6
+
+# Files the shared-skeleton request owns; unit requests import from these fixed paths.
+SKELETON_PATHS = {
+    "backend": [
+        "requirements.txt",
+        "app/__init__.py",
+        "app/main.py",
+        "app/config.py",
+        "app/database.py",
+        "app/auth.py",
+        "app/models/__init__.py",
+        "app/schemas/__init__.py",
+        "app/routers/__init__.py",
+    ],
+    "frontend": [
+        "package.json",
+        "vite.config.js",
+        "index.html",
+        "src/main.jsx",
+        "src/App.jsx",
+        "src/api.js",
+        "src/auth.js",
+    ],
+}
+
+_SLUG_RE = re.compile(r"[^a-z0-9]+")
+_CAMEL_BOUNDARY_RE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+_VERSION_RE = re.compile(r"^v\d+$")
+
+
+def _slug(text: str) -> str:
+    text = _CAMEL_BOUNDARY_RE.sub("_", str(text))
+    return _SLUG_RE.sub("_", text.lower()).strip("_") or "item"
+
+
+def _pascal(slug: str) -> str:
+    return "".join(part.capitalize() for part in slug.split("_")) or "Item"
+
+
+def _singular(word: str) -> str:
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def _router_group(endpoint: object) -> str:
+    """First meaningful path segment: /api/v1/tasks/{id} -> tasks."""
+    path = str(endpoint.get("path", "")) if isinstance(endpoint, dict) else str(endpoint)
+    for segment in path.strip("/").split("/"):
+        if not segment or segment == "api" or _VERSION_RE.match(segment):
+            continue
+        if segment.startswith(("{", ":", "<")):
+            continue
+        return _slug(segment)
+    return "root"
+
+
+@dataclass(frozen=True)
+class Unit:
+    """One independently generated slice of a branch and the files it owns."""
+
+    name: str
+    kind: str
+    spec: dict
+    paths: list[str] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return {"name": self.name, "kind": self.kind, "spec": self.spec, "paths": self.paths}
+
+
+def backend_units(spec: dict) -> list[Unit]:
+    """One unit per database model (with the router group named after it), then one per
+    remaining router group."""
+    groups: dict[str, list] = {}
+    for endpoint in spec.get("api_endpoints") or []:
+        groups.setdefault(_router_group(endpoint), []).append(endpoint)
+
+    units: list[Unit] = []
+    taken: set[str] = set()
+    for model in spec.get("database_models") or []:
+        name = _slug(model.get("name", "") if isinstance(model, dict) else model)
+        if name in taken:
+            continue
+        taken.add(name)
+        group = next((g for g in groups if _singular(g) == _singular(name)), None)
+        endpoints = groups.pop(group) if group is not None else []
+        paths = [f"app/models/{name}.py", f"app/schemas/{name}.py"]
+        if group is not None:
+            paths.append(f"app/routers/{group}.py")
+        units.append(
+            Unit(
+                name=name,
+                kind="model",
+                spec={"database_model": model, "api_endpoints": endpoints},
+                paths=paths,
+            )
+        )
+    for group, endpoints in groups.items():
+        if group in taken:
+            group = f"{group}_api"
+        taken.add(group)
+        units.append(
+            Unit(
+                name=group,
+                kind="router",
+                spec={"api_endpoints": endpoints},
+                paths=[f"app/routers/{group}.py", f"app/schemas/{group}.py"],
+            )
+        )
+    return units
+
+
+def frontend_units(spec: dict) -> list[Unit]:
+    """One unit per page; shared components, routing and the API client are skeleton files."""
+    units: list[Unit] = []
+    taken: set[str] = set()
+    for page in spec.get("pages") or []:
+        if isinstance(page, dict):
+            label = page.get("name") or page.get("title") or page.get("route") or "page"
+        else:
+            label = page
+        name = base = _slug(label)
+        n = 2
+        while name in taken:
+            name = f"{base}_{n}"
+            n += 1
+        taken.add(name)
+        units.append(
+            Unit(
+                name=name,
+                kind="page",
+                spec={"page": page},
+                paths=[f"src/pages/{_pascal(name)}.jsx"],
+            )
+        )
+    return units
+
+
+def plan_units(spec: dict, branch: str) -> list[Unit]:
+    """The shared-skeleton unit followed by the branch's independent units."""
+    if branch == "backend":
+        units = backend_units(spec)
+    elif branch == "frontend":
+        units = frontend_units(spec)
+    else:
+        raise ValueError(f"Unknown branch: {branch}")
+    skeleton = Unit(name="skeleton", kind="skeleton", spec={}, paths=SKELETON_PATHS[branch])
+    return [skeleton, *units]
+
+
+def unit_request(spec: dict, unit: Unit, units: list[Unit]) -> dict:
+    """User message for one fan-out request.
+
+    What every unit shares comes first, so all requests of a branch start with the same
+    prefix and provider-side prompt caching can reuse it.
+    """
+    return {
+        "spec": spec,
+        # Every request sees the whole layout so imports and route registration line up.
+        "layout": {u.name: u.paths for u in units},
+        "unit": unit.as_dict(),
+    }
+
+
+def render_unit_request(spec: dict, unit: Unit, units: list[Unit]) -> tuple[str, int]:
+    """unit_request as JSON text, and the length of the prefix it shares with other units."""
+    text = json.dumps(unit_request(spec, unit, units))
+    # The text ends with the unit object and the closing brace.
+    return text, len(text) - len(json.dumps(unit.as_dict())) - 1
+
+
+@dataclass(frozen=True)
+class Collision:
+    path: str
+    # Units that produced the path, in merge order; the first one's content is kept.
+    units: list[str]
+
+    def as_issue(self) -> dict:
+        return {
+            "file": self.path,
+            "severity": "high",
+            "description": "Generated by several fan-out units with different content: "
+            + ", ".join(self.units),
+        }
+
+
+def merge_unit_outputs(
+    outputs: list[tuple[str, list[FileBlock]]],
+) -> tuple[list[FileBlock], list[Collision]]:
+    """Merge per-unit file blocks in order; identical duplicates are dropped silently and
+    differing ones are reported as collisions (the earliest unit's version is kept)."""
+    merged: dict[str, FileBlock] = {}
+    owners: dict[str, list[str]] = {}
+    conflicting: set[str] = set()
+    for unit_name, blocks in outputs:
+        for block in blocks:
+            current = merged.get(block.path)
+            if current is None:
+                merged[block.path] = block
+                owners[block.path] = [unit_name]
+                continue
+            if unit_name not in owners[block.path]:
+                owners[block.path].append(unit_name)
+            if current.content != block.content:
+                if owners[block.path][0] == unit_name:
+                    # A unit repeating its own file: last version wins, as in a single response.
+                    merged[block.path] = block
+                else:
+                    conflicting.add(block.path)
+    collisions = [Collision(path, owners[path]) for path in merged if path in conflicting]
+    return list(merged.values()), collisions
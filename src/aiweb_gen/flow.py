@@ -1,24 +1,88 @@
 from __future__ import annotations
 
 import json
+import threading
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from . import tracing
+from .blobstore import BlobStore
+from .defaults import VALIDATOR_MODES, env_limit
 from .diffapply import apply_unified_diff
-from .fsops import safe_write_files
-from .llm import chat_completion
-from .parsing import ParseError, parse_file_blocks, parse_json_strict
+from .fanout import (
+    DEFAULT_FANOUT_CONCURRENCY,
+    Collision,
+    Unit,
+    merge_unit_outputs,
+    plan_units,
+    render_unit_request,
+)
+from .fsops import (
+    WriteReport,
+    bulk_write_files,
+    delete_files,
+    resolve_targets,
+    safe_write_files,
+)
+from .index import RepoIndex
+from .llm import LLMClient, get_default_client
+from .patchplan import (
+    DEFAULT_PATCH_CONCURRENCY,
+    FileChange,
+    merge_file_diffs,
+    parse_patch_plan,
+    render_file_request,
+)
+from .parsing import (
+    FileBlock,
+    ParseError,
+    format_file_blocks,
+    iter_file_blocks,
+    parse_file_blocks,
+    parse_json,
+    split_deletions,
+)
 from .prompts import load_prompt
+from .runs import Run
+from .specdiff import SpecDiff, diff_specs
+from .selector import (
+    DEFAULT_CONTEXT_TOKENS,
+    format_file_context,
+    iter_candidate_files,
+    select_files,
+)
+from .sharding import shard_blocks, shard_limits_from_env
+from .static_validate import merge_reports, validate_blocks
 
 
-def architect_flow(*, idea: str, prompts_dir: Path, auto_retry: bool = False) -> dict:
+def architect_flow(
+    *,
+    idea: str,
+    prompts_dir: Path,
+    auto_retry: bool = False,
+    refresh_cache: bool = False,
+    client: LLMClient | None = None,
+) -> dict:
+    client = client or get_default_client()
     system = load_prompt(prompts_dir, "ARCHITECT_MODE")
 
     last_err: Exception | None = None
     attempts = 2 if auto_retry else 1
-    for _ in range(attempts):
+    for attempt in range(attempts):
         try:
-            out = chat_completion(system=system, user=idea, temperature=0.0)
-            spec = parse_json_strict(out)
+            with tracing.span("architect", attempt=attempt):
+                out = client.chat_completion(
+                    system=system,
+                    user=idea,
+                    temperature=0.0,
+                    refresh_cache=refresh_cache or attempt > 0,
+                    prompt="ARCHITECT_MODE",
+                    json_output=True,
+                )
+                repairs: list[str] = []
+                spec = parse_json(out, repairs=repairs)
+                _record_repairs(repairs)
 
             required = [
                 "app_name",
@@ -40,15 +104,34 @@ def architect_flow(*, idea: str, prompts_dir: Path, auto_retry: bool = False) ->
     raise ValueError(f"Failed to produce a valid spec: {last_err}")
 
 
-def validate_code_flow(*, code_bundle_text: str, prompts_dir: Path, auto_retry: bool = False) -> dict:
+def validate_code_flow(
+    *,
+    code_bundle_text: str,
+    prompts_dir: Path,
+    auto_retry: bool = False,
+    refresh_cache: bool = False,
+    stage: str = "validate",
+    client: LLMClient | None = None,
+) -> dict:
+    client = client or get_default_client()
     system = load_prompt(prompts_dir, "CODE_VALIDATOR")
 
     last_err: Exception | None = None
     attempts = 2 if auto_retry else 1
-    for _ in range(attempts):
+    for attempt in range(attempts):
         try:
-            out = chat_completion(system=system, user=code_bundle_text, temperature=0.0)
-            report = parse_json_strict(out)
+            with tracing.span(stage, attempt=attempt):
+                out = client.chat_completion(
+                    system=system,
+                    user=code_bundle_text,
+                    temperature=0.0,
+                    refresh_cache=refresh_cache or attempt > 0,
+                    prompt="CODE_VALIDATOR",
+                    json_output=True,
+                )
+                repairs: list[str] = []
+                report = parse_json(out, repairs=repairs)
+                _record_repairs(repairs)
             if "valid" not in report or "issues" not in report:
                 raise ValueError("Validator output missing required keys")
             return report
@@ -58,54 +141,410 @@ def validate_code_flow(*, code_bundle_text: str, prompts_dir: Path, auto_retry:
     raise ValueError(f"Failed to parse validator output: {last_err}")
 
 
-def backend_flow(*, spec: dict, prompts_dir: Path, auto_retry: bool = False) -> tuple[list[tuple[str, str]], dict]:
-    system = load_prompt(prompts_dir, "BACKEND_GENERATOR")
+def _record_repairs(repairs: list[str]) -> None:
+    if repairs:
+        tracing.record(output_repairs=len(repairs))
 
-    last_err: Exception | None = None
-    attempts = 2 if auto_retry else 1
-    for _ in range(attempts):
-        try:
-            out = chat_completion(system=system, user=json.dumps(spec), temperature=0.0)
-            blocks = parse_file_blocks(out)
 
-            code_bundle_for_validator = out
-            report = validate_code_flow(
-                code_bundle_text=code_bundle_for_validator,
-                prompts_dir=prompts_dir,
-                auto_retry=auto_retry,
+def validate_bundle_flow(
+    *,
+    blocks: list[FileBlock],
+    code_bundle_text: str,
+    prompts_dir: Path,
+    auto_retry: bool = False,
+    refresh_cache: bool = False,
+    stage: str = "validate",
+    max_shard_tokens: int | None = None,
+    max_concurrency: int | None = None,
+    client: LLMClient | None = None,
+) -> dict:
+    """Run CODE_VALIDATOR over a bundle, split into shards when it is too large for one call.
+
+    Shards (see sharding.shard_blocks) are validated concurrently, at most max_concurrency
+    at a time, and merged into one report with duplicate file-level issues removed. Limits
+    default to AIWEB_VALIDATOR_SHARD_TOKENS / AIWEB_VALIDATOR_CONCURRENCY.
+    """
+    client = client or get_default_client()
+    env_tokens, env_concurrency = shard_limits_from_env()
+    shards = shard_blocks(blocks, max_tokens=max_shard_tokens or env_tokens)
+    common = {
+        "prompts_dir": prompts_dir,
+        "auto_retry": auto_retry,
+        "refresh_cache": refresh_cache,
+        "stage": stage,
+        "client": client,
+    }
+    if len(shards) <= 1:
+        # The unsplit bundle goes out exactly as generated, keeping cache keys stable.
+        return validate_code_flow(code_bundle_text=code_bundle_text, **common)
+
+    workers = min(max_concurrency or env_concurrency, len(shards))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aiweb-validate") as pool:
+        futures = [
+            pool.submit(
+                tracing.run_in_context(validate_code_flow),
+                code_bundle_text=format_file_blocks(shard),
+                **common,
             )
+            for shard in shards
+        ]
+        reports = [f.result() for f in futures]
+    return {**merge_reports(*reports), "shards": len(shards)}
 
-            files = [(b.path, b.content) for b in blocks]
-            return files, report
-        except (ParseError, ValueError) as exc:
-            last_err = exc
 
-    raise ValueError(f"Backend generation failed: {last_err}")
+def _validate_generated(
+    *,
+    blocks: list[FileBlock],
+    code_bundle_text: str,
+    prompts_dir: Path,
+    auto_retry: bool,
+    refresh_cache: bool,
+    stage: str,
+    validator: str,
+    known_paths: Iterable[str],
+    client: LLMClient,
+) -> dict:
+    # Local checks take milliseconds; in hybrid mode a bundle that already fails them does
+    # not need the CODE_VALIDATOR round trip.
+    local_report: dict | None = None
+    if validator != "llm":
+        with tracing.span(f"{stage}.static_validate", files=len(blocks)):
+            local_report = validate_blocks(blocks, known_paths=known_paths)
+    if local_report is not None and (validator == "local" or not local_report["valid"]):
+        return {**local_report, "validator": "local"}
+
+    report = validate_bundle_flow(
+        blocks=blocks,
+        code_bundle_text=code_bundle_text,
+        prompts_dir=prompts_dir,
+        auto_retry=auto_retry,
+        refresh_cache=refresh_cache,
+        stage=f"{stage}.validate",
+        client=client,
+    )
+    if local_report is not None:
+        report = {**merge_reports(report, local_report), "validator": "hybrid"}
+    return report
+
+
+def _fanout_generate(
+    *,
+    branch: str,
+    spec: dict,
+    system: str,
+    prompt_name: str,
+    refresh_cache: bool,
+    stage: str,
+    repairs: list[str],
+    client: LLMClient,
+) -> tuple[list[FileBlock], list[Collision]]:
+    """Generate a branch as a shared skeleton plus one request per unit, all concurrently."""
+    units = plan_units(spec, branch)
+    limit = env_limit("AIWEB_FANOUT_CONCURRENCY", DEFAULT_FANOUT_CONCURRENCY)
+
+    def generate_unit(unit: Unit) -> list[FileBlock]:
+        user, shared = render_unit_request(spec, unit, units)
+        with tracing.span(f"{stage}.unit", unit=unit.name, kind=unit.kind):
+            out = client.chat_completion(
+                system=system,
+                user=user,
+                temperature=0.0,
+                refresh_cache=refresh_cache,
+                prompt=prompt_name,
+                stable_prefix=shared,
+            )
+            return parse_file_blocks(out, repairs=repairs)
+
+    workers = min(limit, len(units))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aiweb-fanout") as pool:
+        futures = [pool.submit(tracing.run_in_context(generate_unit), unit) for unit in units]
+        outputs = [(unit.name, future.result()) for unit, future in zip(units, futures)]
+    return merge_unit_outputs(outputs)
 
 
-def frontend_flow(*, spec: dict, prompts_dir: Path, auto_retry: bool = False) -> tuple[list[tuple[str, str]], dict]:
-    system = load_prompt(prompts_dir, "FRONTEND_GENERATOR")
+def _code_generation_flow(
+    *,
+    prompt_name: str,
+    label: str,
+    user: str,
+    prompts_dir: Path,
+    auto_retry: bool,
+    refresh_cache: bool,
+    stream: bool,
+    on_block: Callable[[FileBlock], None] | None,
+    validator: str,
+    client: LLMClient | None,
+    known_paths: Iterable[str] = (),
+    fanout_spec: dict | None = None,
+    deletions: list[str] | None = None,
+) -> tuple[list[tuple[str, str]], dict]:
+    # With deletions, '=== DELETE: <path> ===' markers are accepted (non-streamed output
+    # only) and the paths they name are collected into it.
+    if validator not in VALIDATOR_MODES:
+        raise ValueError(f"Unknown validator mode: {validator}")
+    client = client or get_default_client()
+    system = load_prompt(prompts_dir, prompt_name)
+    stage = label.lower()
 
     last_err: Exception | None = None
     attempts = 2 if auto_retry else 1
-    for _ in range(attempts):
+    for attempt in range(attempts):
         try:
-            out = chat_completion(system=system, user=json.dumps(spec), temperature=0.0)
-            blocks = parse_file_blocks(out)
+            request = {
+                "system": system,
+                "user": user,
+                "temperature": 0.0,
+                "refresh_cache": refresh_cache or attempt > 0,
+                "prompt": prompt_name,
+            }
+            collisions: list[Collision] = []
+            repairs: list[str] = []
+            known = list(known_paths)
+            with tracing.span(f"{stage}.generate", attempt=attempt, stream=stream):
+                if fanout_spec is not None:
+                    blocks, collisions = _fanout_generate(
+                        branch=stage,
+                        spec=fanout_spec,
+                        system=system,
+                        prompt_name=prompt_name,
+                        refresh_cache=request["refresh_cache"],
+                        stage=stage,
+                        repairs=repairs,
+                        client=client,
+                    )
+                    code_bundle_for_validator = format_file_blocks(blocks)
+                elif stream:
+                    blocks = []
+                    chunks = client.stream_chat_completion(**request)
+                    for block in iter_file_blocks(chunks, repairs=repairs):
+                        blocks.append(block)
+                        if on_block is not None:
+                            on_block(block)
+                    code_bundle_for_validator = format_file_blocks(blocks)
+                else:
+                    out = client.chat_completion(**request)
+                    deleted: list[str] = []
+                    if deletions is not None:
+                        out, deleted = split_deletions(out)
+                        deletions[:] = deleted
+                        known = [p for p in known if p not in deleted]
+                    if deleted and not out.strip():
+                        blocks = []
+                    else:
+                        blocks = parse_file_blocks(out, repairs=repairs)
+                    # The raw text keeps validator cache keys stable; repaired output is
+                    # re-rendered so the validator does not flag the damage we removed.
+                    code_bundle_for_validator = format_file_blocks(blocks) if repairs else out
+                _record_repairs(repairs)
 
-            code_bundle_for_validator = out
-            report = validate_code_flow(
+            report = _validate_generated(
+                blocks=blocks,
                 code_bundle_text=code_bundle_for_validator,
                 prompts_dir=prompts_dir,
                 auto_retry=auto_retry,
+                refresh_cache=refresh_cache or attempt > 0,
+                stage=stage,
+                validator=validator,
+                known_paths=known,
+                client=client,
             )
-
+            if collisions:
+                collision_report = {"valid": False, "issues": [c.as_issue() for c in collisions]}
+                report = {
+                    **report,
+                    **merge_reports(report, collision_report),
+                    "collisions": [c.path for c in collisions],
+                }
+            if repairs:
+                report = {**report, "repairs": repairs}
             files = [(b.path, b.content) for b in blocks]
             return files, report
         except (ParseError, ValueError) as exc:
             last_err = exc
 
-    raise ValueError(f"Frontend generation failed: {last_err}")
+    raise ValueError(f"{label} generation failed: {last_err}")
+
+
+def backend_flow(
+    *,
+    spec: dict,
+    prompts_dir: Path,
+    auto_retry: bool = False,
+    refresh_cache: bool = False,
+    stream: bool = False,
+    on_block: Callable[[FileBlock], None] | None = None,
+    validator: str = "hybrid",
+    fanout: bool = False,
+    client: LLMClient | None = None,
+) -> tuple[list[tuple[str, str]], dict]:
+    return _code_generation_flow(
+        prompt_name="BACKEND_FANOUT" if fanout else "BACKEND_GENERATOR",
+        label="Backend",
+        user=json.dumps(spec),
+        prompts_dir=prompts_dir,
+        auto_retry=auto_retry,
+        refresh_cache=refresh_cache,
+        stream=stream,
+        on_block=on_block,
+        validator=validator,
+        client=client,
+        fanout_spec=spec if fanout else None,
+    )
+
+
+def frontend_flow(
+    *,
+    spec: dict,
+    prompts_dir: Path,
+    auto_retry: bool = False,
+    refresh_cache: bool = False,
+    stream: bool = False,
+    on_block: Callable[[FileBlock], None] | None = None,
+    validator: str = "hybrid",
+    fanout: bool = False,
+    client: LLMClient | None = None,
+) -> tuple[list[tuple[str, str]], dict]:
+    return _code_generation_flow(
+        prompt_name="FRONTEND_FANOUT" if fanout else "FRONTEND_GENERATOR",
+        label="Frontend",
+        user=json.dumps(spec),
+        prompts_dir=prompts_dir,
+        auto_retry=auto_retry,
+        refresh_cache=refresh_cache,
+        stream=stream,
+        on_block=on_block,
+        validator=validator,
+        client=client,
+        fanout_spec=spec if fanout else None,
+    )
+
+
+class GenerationCancelled(RuntimeError):
+    """A concurrent branch stopped because the other branch already decided the outcome."""
+
+
+class _CancellableClient:
+    """Client proxy that starts no new request once its branch has been cancelled."""
+
+    def __init__(self, client: LLMClient, check: Callable[[], None]) -> None:
+        self._client = client
+        self._check = check
+
+    def chat_completion(self, **kwargs: object) -> str:
+        self._check()
+        return self._client.chat_completion(**kwargs)
+
+    def stream_chat_completion(self, **kwargs: object) -> Iterable[str]:
+        self._check()
+        return self._client.stream_chat_completion(**kwargs)
+
+    def __getattr__(self, name: str) -> object:
+        return getattr(self._client, name)
+
+
+class _StreamingWriter:
+    """on_block callback that writes each generated file as soon as it is parsed."""
+
+    def __init__(self, root: Path, *, dry_run: bool, store: BlobStore | None = None) -> None:
+        self.root = root
+        self.dry_run = dry_run
+        self.store = store
+        self._written: dict[str, str] = {}
+        self._report = WriteReport()
+        self._lock = threading.Lock()
+
+    def __call__(self, block: FileBlock) -> None:
+        report = bulk_write_files(
+            self.root, [(block.path, block.content)], dry_run=self.dry_run, store=self.store
+        )
+        tracing.record(bytes_written=report.bytes_written)
+        with self._lock:
+            self._written[block.path] = block.content
+            self._report.merge(report)
+
+    def finish(self, files: list[tuple[str, str]]) -> WriteReport:
+        """Write whatever the stream did not already write; report covers all of files."""
+        with self._lock:
+            pending = [(p, c) for p, c in files if self._written.get(p) != c]
+            report = self._report
+        rest = bulk_write_files(self.root, pending, dry_run=self.dry_run, store=self.store)
+        tracing.record(bytes_written=rest.bytes_written)
+        report.merge(rest)
+        # Files streamed by an earlier, discarded attempt are not part of the result.
+        report.written = list(resolve_targets(self.root, files))
+        return report
+
+
+def _write_stage(
+    stage: str,
+    root: Path,
+    files: list[tuple[str, str]],
+    *,
+    dry_run: bool,
+    writer: _StreamingWriter | None = None,
+    store: BlobStore | None = None,
+) -> WriteReport:
+    with tracing.span(stage, files=len(files)):
+        if writer is not None:
+            return writer.finish(files)
+        report = bulk_write_files(root, files, dry_run=dry_run, store=store)
+        tracing.record(bytes_written=report.bytes_written, bytes_deduped=report.bytes_deduped)
+        return report
+
+
+def _generate_branch(
+    flow_fn: Callable[..., tuple[list[tuple[str, str]], dict]],
+    *,
+    spec: dict,
+    prompts_dir: Path,
+    strict: bool,
+    auto_retry: bool,
+    stream: bool,
+    on_block: Callable[[FileBlock], None] | None,
+    validator: str,
+    fanout: bool,
+    client: LLMClient,
+    run: Run | None,
+    checkpoint: str,
+    cancelled: threading.Event | None = None,
+) -> tuple[list[tuple[str, str]], dict]:
+    # A request already in flight runs to completion; cancelled is checked before each new
+    # request (generation, fan-out unit, validation, retry) and each streamed block's write.
+    def check() -> None:
+        if cancelled is not None and cancelled.is_set():
+            raise GenerationCancelled(f"{checkpoint} generation cancelled")
+
+    check()
+    if run is not None:
+        saved = run.load(checkpoint)
+        if saved is not None:
+            return [(path, content) for path, content in saved["files"]], saved["report"]
+
+    emit = on_block
+    if cancelled is not None:
+        client = _CancellableClient(client, check)
+        if on_block is not None:
+
+            def emit(block: FileBlock) -> None:
+                check()
+                on_block(block)
+
+    common = {
+        "spec": spec,
+        "prompts_dir": prompts_dir,
+        "stream": stream,
+        "on_block": emit,
+        "validator": validator,
+        "fanout": fanout,
+        "client": client,
+    }
+    files, report = flow_fn(auto_retry=auto_retry, **common)
+    if strict and not report.get("valid", False) and auto_retry:
+        files, report = flow_fn(auto_retry=False, refresh_cache=True, **common)
+    # A branch that failed strict validation is not checkpointed, so a resume redoes it.
+    if run is not None and (not strict or report.get("valid", False)):
+        run.save(checkpoint, {"files": files, "report": report})
+    return files, report
 
 
 def generate_flow(
@@ -116,47 +555,199 @@ def generate_flow(
     strict: bool,
     dry_run: bool = False,
     auto_retry: bool = False,
+    concurrent: bool = False,
+    stream: bool = False,
+    validator: str = "hybrid",
+    fanout: bool = False,
+    run: Run | None = None,
+    client: LLMClient | None = None,
+    store: BlobStore | None = None,
 ) -> dict:
-    spec = architect_flow(idea=idea, prompts_dir=prompts_dir, auto_retry=auto_retry)
+    """Idea → spec → backend and frontend (each generated + validated) → files on disk.
+
+    With concurrent=True the backend and frontend branches, which only depend on the spec,
+    run in parallel and are joined before anything is written. Outcomes match the serial
+    pipeline: a backend failure is reported (or raised) first and nothing is written; a
+    frontend strict failure is reported after the backend files have been written. Once the
+    backend has failed, the frontend starts no further request and is not waited for.
+
+    With stream=True generator output is parsed while it streams in. Without strict, nothing
+    gates the writes, so each file is written as soon as its block is complete; with strict,
+    writes still wait for the validator.
+
+    validator picks how each branch is checked: "llm" sends the bundle to CODE_VALIDATOR,
+    "local" only runs the static checks in static_validate, and "hybrid" runs the static
+    checks first and only asks the LLM when they pass.
+
+    With fanout=True each branch is generated as a shared-skeleton request plus one request
+    per model/router group (backend) or page (frontend), run concurrently and merged; paths
+    produced by several units with different content are reported as validator issues.
+
+    With a Run, the spec and each branch's files and validator report are checkpointed as
+    they complete, and stages already completed in that run are loaded instead of redone.
+
+    With a BlobStore, files are materialised as links to its content-addressed blobs, so
+    content shared between apps is stored once.
+    """
+    kwargs = {
+        "idea": idea,
+        "out_dir": out_dir,
+        "prompts_dir": prompts_dir,
+        "strict": strict,
+        "dry_run": dry_run,
+        "auto_retry": auto_retry,
+        "concurrent": concurrent,
+        "stream": stream,
+        "validator": validator,
+        "fanout": fanout,
+        "run": run,
+        "client": client or get_default_client(),
+        "store": store,
+    }
+    if run is None:
+        return _generate(**kwargs)
+
+    run.update(status="running", error=None)
+    try:
+        result = _generate(**kwargs)
+    except Exception as exc:
+        run.update(status="failed", error=str(exc))
+        raise
+    run.update(
+        status="completed" if result.get("ok") else "failed",
+        error=None if result.get("ok") else result.get("stage"),
+    )
+    result["run_id"] = run.id
+    return result
+
+
+def _generate(
+    *,
+    idea: str,
+    out_dir: Path,
+    prompts_dir: Path,
+    strict: bool,
+    dry_run: bool,
+    auto_retry: bool,
+    concurrent: bool,
+    stream: bool,
+    validator: str,
+    run: Run | None,
+    client: LLMClient,
+    fanout: bool = False,
+    spec: dict | None = None,
+    store: BlobStore | None = None,
+) -> dict:
+    if spec is None and run is not None:
+        spec = run.load("spec")
+    if spec is None:
+        spec = architect_flow(
+            idea=idea, prompts_dir=prompts_dir, auto_retry=auto_retry, client=client
+        )
+        if run is not None:
+            run.save("spec", spec)
     app_name = str(spec.get("app_name", "app")).strip() or "app"
 
     root = out_dir / app_name
     backend_root = root / "backend"
     frontend_root = root / "frontend"
 
-    backend_files, backend_report = backend_flow(spec=spec, prompts_dir=prompts_dir, auto_retry=auto_retry)
-    if strict and not backend_report.get("valid", False) and auto_retry:
-        backend_files, backend_report = backend_flow(spec=spec, prompts_dir=prompts_dir, auto_retry=False)
-    if strict and not backend_report.get("valid", False):
+    def failed(stage: str, report: dict) -> dict:
         return {
             "ok": False,
-            "stage": "backend_validation_failed",
+            "stage": stage,
             "dry_run": dry_run,
             "app_root": str(root),
             "backend_root": str(backend_root),
             "frontend_root": str(frontend_root),
-            "report": backend_report,
+            "report": report,
         }
 
-    written_backend = safe_write_files(backend_root, backend_files, dry_run=dry_run)
+    early_writes = stream and not strict
+    backend_writer = frontend_writer = None
+    if early_writes:
+        backend_writer = _StreamingWriter(backend_root, dry_run=dry_run, store=store)
+        frontend_writer = _StreamingWriter(frontend_root, dry_run=dry_run, store=store)
+    branch_kwargs = {
+        "spec": spec,
+        "prompts_dir": prompts_dir,
+        "strict": strict,
+        "auto_retry": auto_retry,
+        "stream": stream,
+        "validator": validator,
+        "fanout": fanout,
+        "client": client,
+        "run": run,
+    }
+
+    if concurrent:
+        cancelled = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="aiweb-gen")
+        try:
+            # Each branch runs in a copy of this context so its spans land on the caller's tracer.
+            backend_future = pool.submit(
+                tracing.run_in_context(_generate_branch),
+                backend_flow,
+                on_block=backend_writer,
+                checkpoint="backend",
+                cancelled=cancelled,
+                **branch_kwargs,
+            )
+            frontend_future = pool.submit(
+                tracing.run_in_context(_generate_branch),
+                frontend_flow,
+                on_block=frontend_writer,
+                checkpoint="frontend",
+                cancelled=cancelled,
+                **branch_kwargs,
+            )
+            backend_files, backend_report = backend_future.result()
+            if strict and not backend_report.get("valid", False):
+                # Serially the frontend would never have run; its result is not needed.
+                cancelled.set()
+            else:
+                frontend_files, frontend_report = frontend_future.result()
+        except BaseException:
+            cancelled.set()
+            raise
+        finally:
+            # Once cancelled, the frontend stops at its next step and nothing waits for it.
+            pool.shutdown(wait=not cancelled.is_set(), cancel_futures=True)
+    else:
+        backend_files, backend_report = _generate_branch(
+            backend_flow, on_block=backend_writer, checkpoint="backend", **branch_kwargs
+        )
+
+    if strict and not backend_report.get("valid", False):
+        return failed("backend_validation_failed", backend_report)
+
+    backend_write = _write_stage(
+        "backend.write",
+        backend_root,
+        backend_files,
+        dry_run=dry_run,
+        writer=backend_writer,
+        store=store,
+    )
 
-    frontend_files, frontend_report = frontend_flow(spec=spec, prompts_dir=prompts_dir, auto_retry=auto_retry)
-    if strict and not frontend_report.get("valid", False) and auto_retry:
-        frontend_files, frontend_report = frontend_flow(spec=spec, prompts_dir=prompts_dir, auto_retry=False)
+    if not concurrent:
+        frontend_files, frontend_report = _generate_branch(
+            frontend_flow, on_block=frontend_writer, checkpoint="frontend", **branch_kwargs
+        )
     if strict and not frontend_report.get("valid", False):
-        return {
-            "ok": False,
-            "stage": "frontend_validation_failed",
-            "dry_run": dry_run,
-            "app_root": str(root),
-            "backend_root": str(backend_root),
-            "frontend_root": str(frontend_root),
-            "report": frontend_report,
-        }
+        return failed("frontend_validation_failed", frontend_report)
 
-    written_frontend = safe_write_files(frontend_root, frontend_files, dry_run=dry_run)
+    frontend_write = _write_stage(
+        "frontend.write",
+        frontend_root,
+        frontend_files,
+        dry_run=dry_run,
+        writer=frontend_writer,
+        store=store,
+    )
 
-    safe_write_files(root, [("spec.json", json.dumps(spec, indent=2) + "\n")], dry_run=dry_run)
+    with tracing.span("spec.write"):
+        safe_write_files(root, [("spec.json", json.dumps(spec, indent=2) + "\n")], dry_run=dry_run)
 
     return {
         "ok": True,
@@ -164,48 +755,337 @@ def generate_flow(
         "app_root": str(root),
         "backend": {
             "root": str(backend_root),
-            "files_written": written_backend,
+            "files_written": backend_write.written,
+            "write": backend_write.as_dict(),
             "validator": backend_report,
         },
         "frontend": {
             "root": str(frontend_root),
-            "files_written": written_frontend,
+            "files_written": frontend_write.written,
+            "write": frontend_write.as_dict(),
             "validator": frontend_report,
         },
     }
 
 
-def apply_patch_flow(*, root_dir: Path, change_request: str, prompts_dir: Path, dry_run: bool) -> dict:
-    system = load_prompt(prompts_dir, "PATCH_MODE")
+def _incremental_branch(
+    *,
+    branch: str,
+    prompt_name: str,
+    branch_root: Path,
+    spec: dict,
+    diff: SpecDiff,
+    prompts_dir: Path,
+    strict: bool,
+    auto_retry: bool,
+    validator: str,
+    token_budget: int,
+    client: LLMClient,
+) -> tuple[list[tuple[str, str]], list[str], dict, dict]:
+    existing = [rel for rel, _ in iter_candidate_files(branch_root)] if branch_root.is_dir() else []
+    # Only the files most related to the changed entries go along as context.
+    selection = select_files(
+        branch_root, " ".join(diff.changed_names(branch)), token_budget=token_budget
+    )
+    user = json.dumps(
+        {
+            "spec": spec,
+            "changes": diff.for_branch(branch),
+            "existing_paths": existing,
+            "existing_files": {f.path: f.content for f in selection.files},
+        }
+    )
+    deleted: list[str] = []
+    common = {
+        "prompt_name": prompt_name,
+        "label": branch.capitalize(),
+        "user": user,
+        "prompts_dir": prompts_dir,
+        "stream": False,
+        "on_block": None,
+        "validator": validator,
+        "client": client,
+        "known_paths": existing,
+        "deletions": deleted,
+    }
+    files, report = _code_generation_flow(auto_retry=auto_retry, refresh_cache=False, **common)
+    if strict and not report.get("valid", False) and auto_retry:
+        files, report = _code_generation_flow(auto_retry=False, refresh_cache=True, **common)
+    # A file that is both rewritten and deleted was replaced, not removed.
+    rewritten = {path for path, _ in files}
+    deleted = [path for path in deleted if path not in rewritten]
+    return files, deleted, report, selection.report()
+
 
-    # For PATCH_MODE we need "current file content". Keep it simple: pack all text files.
-    # This is intentionally conservative; for larger repos, you would add a file selector.
-    file_blobs: list[str] = []
-    for path in root_dir.rglob("*"):
-        if not path.is_file():
-            continue
-        if path.name.startswith("."):
-            continue
-        if path.suffix.lower() in {".png", ".jpg", ".jpeg", ".gif", ".ico", ".pdf", ".zip"}:
-            continue
-        try:
-            rel = path.relative_to(root_dir).as_posix()
-            content = path.read_text(encoding="utf-8")
-        except Exception:  # noqa: BLE001
+def incremental_generate_flow(
+    *,
+    idea: str,
+    out_dir: Path,
+    prompts_dir: Path,
+    strict: bool,
+    dry_run: bool = False,
+    auto_retry: bool = False,
+    validator: str = "hybrid",
+    token_budget: int = DEFAULT_CONTEXT_TOKENS // 2,
+    client: LLMClient | None = None,
+    store: BlobStore | None = None,
+) -> dict:
+    """Regenerate only what changed since the spec.json of the previous generate run.
+
+    The new spec is diffed against the stored one entry by entry (see specdiff). Each branch
+    whose sections changed gets one request with the changed entries and its most related
+    existing files, and returns only the files to create or replace, plus '=== DELETE ==='
+    markers for files that only served removed entries; those are validated (imports into
+    the existing tree count as resolved, except into deleted files), written over the
+    existing tree, and the marked files removed.
+    Without a previous spec, or when app_name/tech_stack changed, this is a full generate.
+    """
+    client = client or get_default_client()
+    spec = architect_flow(idea=idea, prompts_dir=prompts_dir, auto_retry=auto_retry, client=client)
+    app_name = str(spec.get("app_name", "app")).strip() or "app"
+    root = out_dir / app_name
+
+    try:
+        previous = json.loads((root / "spec.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        previous = None
+    diff = diff_specs(previous, spec) if isinstance(previous, dict) else None
+
+    if diff is None or diff.full_rebuild:
+        result = _generate(
+            idea=idea,
+            out_dir=out_dir,
+            prompts_dir=prompts_dir,
+            strict=strict,
+            dry_run=dry_run,
+            auto_retry=auto_retry,
+            concurrent=False,
+            stream=False,
+            validator=validator,
+            run=None,
+            client=client,
+            spec=spec,
+            store=store,
+        )
+        result["mode"] = "full"
+        if diff is None:
+            result["reason"] = "no previous spec.json"
+        else:
+            result["reason"] = f"changed: {', '.join(diff.global_changes)}"
+        return result
+
+    result: dict = {
+        "ok": True,
+        "mode": "incremental",
+        "dry_run": dry_run,
+        "app_root": str(root),
+        "diff": diff.summary(),
+    }
+    for branch, prompt_name in (
+        ("backend", "BACKEND_INCREMENTAL"),
+        ("frontend", "FRONTEND_INCREMENTAL"),
+    ):
+        branch_root = root / branch
+        if not diff.affects(branch):
+            result[branch] = {"root": str(branch_root), "regenerated": False}
             continue
-        file_blobs.append(f"=== FILE: {rel} ===\n{content}\n")
+        files, deleted, report, context = _incremental_branch(
+            branch=branch,
+            prompt_name=prompt_name,
+            branch_root=branch_root,
+            spec=spec,
+            diff=diff,
+            prompts_dir=prompts_dir,
+            strict=strict,
+            auto_retry=auto_retry,
+            validator=validator,
+            token_budget=token_budget,
+            client=client,
+        )
+        if strict and not report.get("valid", False):
+            return {
+                **result,
+                "ok": False,
+                "stage": f"{branch}_validation_failed",
+                "report": report,
+            }
+        write = _write_stage(f"{branch}.write", branch_root, files, dry_run=dry_run, store=store)
+        with tracing.span(f"{branch}.delete", files=len(deleted)):
+            removed = delete_files(branch_root, deleted, dry_run=dry_run)
+        result[branch] = {
+            "root": str(branch_root),
+            "regenerated": True,
+            "files_written": write.written,
+            "files_deleted": removed,
+            "write": write.as_dict(),
+            "validator": report,
+            "context": context,
+        }
+
+    with tracing.span("spec.write"):
+        safe_write_files(root, [("spec.json", json.dumps(spec, indent=2) + "\n")], dry_run=dry_run)
+    return result
+
+
+def apply_patch_flow(
+    *,
+    root_dir: Path,
+    change_request: str,
+    prompts_dir: Path,
+    dry_run: bool,
+    token_budget: int = DEFAULT_CONTEXT_TOKENS,
+    use_index: bool = True,
+    use_git: bool | None = None,
+    plan: bool = False,
+    client: LLMClient | None = None,
+) -> dict:
+    """Change request → unified diff → applied to root_dir in one transaction.
+
+    With plan=True a PATCH_PLANNER call first lists the files to change with a short intent
+    each; every file's diff is then requested concurrently, with only that file and the
+    context files the planner named, and the diffs are merged and applied together. Latency
+    then follows the largest single-file diff instead of the whole change.
+    """
+    client = client or get_default_client()
+    system = load_prompt(prompts_dir, "PATCH_PLANNER" if plan else "PATCH_MODE")
 
-    user = "CURRENT CODEBASE FILES:\n" + "\n".join(file_blobs) + "\n\nCHANGE REQUEST:\n" + change_request
-    diff_text = chat_completion(system=system, user=user, temperature=0.0)
+    # PATCH_MODE needs "current file content". Rank files by relevance to the request and
+    # pack the best ones into the token budget instead of sending the whole tree. The
+    # persistent index under <root>/.aiweb only re-reads files that changed since last run;
+    # a dry run uses it without writing it back.
+    index_stats: dict | None = None
+    with tracing.span("patch.context", index=use_index):
+        if use_index:
+            with RepoIndex(root_dir, persist=not dry_run) as index:
+                index_stats = index.refresh().as_dict()
+                selection = index.select(change_request, token_budget=token_budget)
+        else:
+            selection = select_files(root_dir, change_request, token_budget=token_budget)
+    context = selection.report()
+    if index_stats is not None:
+        context["index"] = index_stats
+    file_blobs = [format_file_context(f.path, f.content) for f in selection.files]
+
+    # The file context goes first: it is the part repeated requests against the same tree share.
+    context_text = "CURRENT CODEBASE FILES:\n" + "\n".join(file_blobs)
+    changes: list[FileChange] | None = None
+    if plan:
+        if selection.omitted:
+            context_text += "\n\nOTHER FILES (content not shown):\n" + "\n".join(selection.omitted)
+        context_text += "\n\nCHANGE REQUEST:\n"
+        with tracing.span("patch.plan"):
+            changes = _plan_patch(system, context_text + change_request, client=client)
+        if not changes:
+            return {
+                "ok": True,
+                "changed": False,
+                "reason": "Planner found no files to change",
+                "plan": [],
+                "context": context,
+            }
+        with tracing.span("patch.generate", files=len(changes)):
+            diff_text = _fan_out_patch(
+                root_dir,
+                change_request,
+                changes,
+                known={f.path: f.content for f in selection.files},
+                prompts_dir=prompts_dir,
+                client=client,
+            )
+    else:
+        context_text += "\n\nCHANGE REQUEST:\n"
+        with tracing.span("patch.generate"):
+            diff_text = client.chat_completion(
+                system=system,
+                user=context_text + change_request,
+                temperature=0.0,
+                prompt="PATCH_MODE",
+                stable_prefix=len(context_text),
+            )
 
+    planned = {} if changes is None else {"plan": [c.as_dict() for c in changes]}
     if not diff_text.strip():
-        return {"ok": True, "changed": False, "reason": "Model returned empty diff"}
+        return {
+            "ok": True,
+            "changed": False,
+            "reason": "Model returned empty diff",
+            **planned,
+            "context": context,
+        }
 
-    result = apply_unified_diff(root_dir, diff_text, dry_run=dry_run)
+    with tracing.span("patch.apply", dry_run=dry_run):
+        result = apply_unified_diff(root_dir, diff_text, dry_run=dry_run, use_git=use_git)
     return {
         "ok": True,
         "changed": True,
         "dry_run": dry_run,
         "applied_files": result.applied_files,
         "total_hunks": result.total_hunks,
+        "hunks_per_file": result.hunks_per_file,
+        "fuzzy_hunks": result.fuzzy_hunks,
+        "engine": result.engine,
+        **planned,
+        "context": context,
     }
+
+
+def _plan_patch(system: str, user: str, *, client: LLMClient) -> list[FileChange]:
+    out = client.chat_completion(
+        system=system,
+        user=user,
+        temperature=0.0,
+        prompt="PATCH_PLANNER",
+        json_output=True,
+    )
+    repairs: list[str] = []
+    changes = parse_patch_plan(parse_json(out, repairs=repairs))
+    _record_repairs(repairs)
+    tracing.record(files=len(changes))
+    return changes
+
+
+def _fan_out_patch(
+    root_dir: Path,
+    change_request: str,
+    changes: list[FileChange],
+    *,
+    known: dict[str, str],
+    prompts_dir: Path,
+    client: LLMClient,
+) -> str:
+    """One diff request per planned file, run concurrently and merged in plan order."""
+    system = load_prompt(prompts_dir, "PATCH_FILE")
+    limit = env_limit("AIWEB_PATCH_CONCURRENCY", DEFAULT_PATCH_CONCURRENCY)
+    paths = dict.fromkeys(p for c in changes for p in (c.path, *c.context))
+    contents = {path: _read_text(root_dir, path, known) for path in paths}
+
+    def generate_file(change: FileChange) -> str:
+        context_files = {p: contents[p] for p in change.context if contents[p] is not None}
+        user, shared = render_file_request(
+            change_request, changes, change, contents[change.path], context_files
+        )
+        with tracing.span("patch.file", path=change.path):
+            return client.chat_completion(
+                system=system,
+                user=user,
+                temperature=0.0,
+                prompt="PATCH_FILE",
+                stable_prefix=shared,
+            )
+
+    workers = min(limit, len(changes))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aiweb-patch") as pool:
+        futures = [pool.submit(tracing.run_in_context(generate_file), c) for c in changes]
+        diffs = [(change, future.result()) for change, future in zip(changes, futures)]
+    return merge_file_diffs(diffs)
+
+
+def _read_text(root_dir: Path, path: str, known: dict[str, str]) -> str | None:
+    """Content of a planned path: from the selected context if there, else from disk."""
+    if path in known:
+        return known[path]
+    target, _ = next(iter(resolve_targets(root_dir, [(path, "")]).values()))
+    try:
+        return target.read_text(encoding="utf-8")
+    except (OSError, UnicodeDecodeError):
+        return None
@@ -1,31 +1,228 @@
 from __future__ import annotations
 
+import hashlib
 import os
+import shutil
+import uuid
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import TYPE_CHECKING, TypeVar
+
+if TYPE_CHECKING:
+    from .blobstore import BlobStore
+
+T = TypeVar("T")
+R = TypeVar("R")
 
 
 class WriteError(RuntimeError):
     pass
 
 
-def safe_write_files(root: Path, files: list[tuple[str, str]], *, dry_run: bool = False) -> list[str]:
-    """Write files under root, preventing path traversal.
+@dataclass
+class WriteReport:
+    # Every target path relative to root, in input order (duplicates collapsed).
+    written: list[str] = field(default_factory=list)
+    # Subset of written whose content actually changed on disk.
+    changed: list[str] = field(default_factory=list)
+    # Subset of written whose content on disk already matched.
+    skipped: list[str] = field(default_factory=list)
+    bytes_written: int = 0
+    bytes_skipped: int = 0
+    # Part of bytes_written linked from a blob store instead of written (see blobstore).
+    bytes_deduped: int = 0
 
-    If dry_run=True, validates paths and returns the list of files that would be written
-    without creating directories or writing content.
+    def merge(self, other: WriteReport) -> None:
+        for rel in other.written:
+            if rel not in self.written:
+                self.written.append(rel)
+        self.changed.extend(other.changed)
+        self.skipped.extend(other.skipped)
+        self.bytes_written += other.bytes_written
+        self.bytes_skipped += other.bytes_skipped
+        self.bytes_deduped += other.bytes_deduped
+
+    def as_dict(self) -> dict:
+        return {
+            "files": len(self.written),
+            "changed": len(self.changed),
+            "skipped": len(self.skipped),
+            "bytes_written": self.bytes_written,
+            "bytes_skipped": self.bytes_skipped,
+            "bytes_deduped": self.bytes_deduped,
+        }
+
+
+def resolve_targets(root: Path, files: list[tuple[str, str]]) -> dict[str, tuple[Path, str]]:
+    """Map each relative path to (absolute target, content), rejecting paths outside root.
+
+    Later entries for the same path win, as they would with sequential writes.
     """
-    written: list[str] = []
     root = root.resolve()
-    if not dry_run:
-        root.mkdir(parents=True, exist_ok=True)
-
+    targets: dict[str, tuple[Path, str]] = {}
     for rel_path, content in files:
         target = (root / rel_path).resolve()
         if root not in target.parents and target != root:
             raise WriteError(f"Refusing to write outside root: {rel_path}")
-        if not dry_run:
-            target.parent.mkdir(parents=True, exist_ok=True)
-            target.write_text(content, encoding="utf-8", newline="\n")
-        written.append(os.path.relpath(str(target), str(root)))
+        rel = os.path.relpath(str(target), str(root))
+        targets.pop(rel, None)
+        targets[rel] = (target, content)
+    return targets
+
+
+def _unchanged(target: Path, data: bytes) -> bool:
+    try:
+        if target.stat().st_size != len(data):
+            return False
+        existing = target.read_bytes()
+    except OSError:
+        return False
+    return hashlib.sha256(existing).digest() == hashlib.sha256(data).digest()
+
+
+def _default_workers() -> int:
+    return min(16, (os.cpu_count() or 1) * 4)
+
+
+def _run_all(fn: Callable[[T], R], items: list[T], workers: int) -> list[R]:
+    # Thread start-up costs more than a single small write; only fan out for real batches.
+    if len(items) <= 1 or workers <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="aiweb-write") as pool:
+        return list(pool.map(fn, items))
+
+
+def bulk_write_files(
+    root: Path,
+    files: list[tuple[str, str]],
+    *,
+    dry_run: bool = False,
+    max_workers: int | None = None,
+    store: BlobStore | None = None,
+) -> WriteReport:
+    """Write many files under root concurrently and without redundant work.
+
+    Files whose content already matches the disk are skipped. Changed files are written by a
+    thread pool into a hidden staging directory next to root, creating each directory once.
+    If root does not exist yet the staging directory is renamed into place in one step, so
+    the new tree appears complete or not at all. Otherwise each staged file is renamed over
+    its target: no file is ever half-written, but the batch as a whole is not atomic, and a
+    crash part-way leaves some files new and the rest old. Re-running the write repairs that
+    (unchanged files are skipped).
+
+    With a store, each file is staged as a link to its content's blob instead of being
+    written, so content already in the store costs no data I/O, and a target that is
+    already linked to the right blob is recognised as unchanged without reading it.
+    """
+    root = root.resolve()
+    targets = resolve_targets(root, files)
+    encoded = {rel: (target, content.encode("utf-8")) for rel, (target, content) in targets.items()}
+    workers = max_workers or _default_workers()
 
-    return written
+    report = WriteReport(written=list(encoded))
+    root_exists = root.exists()
+    if root_exists and not root.is_dir():
+        raise WriteError(f"Output root exists and is not a directory: {root}")
+
+    def unchanged(target: Path, data: bytes) -> bool:
+        return (store is not None and store.holds(target, data)) or _unchanged(target, data)
+
+    if root_exists:
+        checks = _run_all(lambda v: unchanged(*v), list(encoded.values()), workers)
+        same = dict(zip(encoded, checks))
+    else:
+        same = dict.fromkeys(encoded, False)
+
+    pending: dict[str, tuple[Path, bytes]] = {}
+    for rel, (target, data) in encoded.items():
+        if same[rel]:
+            report.skipped.append(rel)
+            report.bytes_skipped += len(data)
+        else:
+            report.changed.append(rel)
+            report.bytes_written += len(data)
+            pending[rel] = (target, data)
+
+    if dry_run:
+        return report
+    if not pending and root_exists:
+        return report
+
+    root.parent.mkdir(parents=True, exist_ok=True)
+    # Plain mkdir (not mkdtemp) so the directory that may become root gets default permissions.
+    staging = root.parent / f".{root.name}.staging-{uuid.uuid4().hex[:12]}"
+    staging.mkdir()
+    try:
+        staged = {rel: staging / rel for rel in pending}
+        for directory in sorted({p.parent for p in staged.values()}):
+            directory.mkdir(parents=True, exist_ok=True)
+
+        def write(rel: str) -> int:
+            data = pending[rel][1]
+            if store is None:
+                staged[rel].write_bytes(data)
+            elif not store.materialize(staged[rel], data):
+                return len(data)
+            return 0
+
+        report.bytes_deduped = sum(_run_all(write, list(pending), workers))
+
+        if not root_exists:
+            os.rename(staging, root)
+            return report
+
+        for directory in sorted({target.parent for target, _ in pending.values()}):
+            directory.mkdir(parents=True, exist_ok=True)
+        for rel, (target, _) in pending.items():
+            os.replace(staged[rel], target)
+    finally:
+        if staging.exists():
+            shutil.rmtree(staging, ignore_errors=True)
+
+    return report
+
+
+def safe_write_files(
+    root: Path,
+    files: list[tuple[str, str]],
+    *,
+    dry_run: bool = False,
+    store: BlobStore | None = None,
+) -> list[str]:
+    """Write files under root, preventing path traversal.
+
+    If dry_run=True, validates paths and returns the list of files that would be written
+    without creating directories or writing content. With a store, files are materialised
+    from the content-addressed blob store (see bulk_write_files).
+    """
+    if dry_run:
+        return list(resolve_targets(root, files))
+    return bulk_write_files(root, files, store=store).written
+
+
+def delete_files(root: Path, paths: list[str], *, dry_run: bool = False) -> list[str]:
+    """Remove the files at paths under root, preventing path traversal.
+
+    Returns the paths that existed (and, unless dry_run, were removed). Directories the
+    removal leaves empty are removed too, up to root.
+    """
+    root = root.resolve()
+    targets = resolve_targets(root, [(rel, "") for rel in paths])
+    removed: list[str] = []
+    for rel, (target, _) in targets.items():
+        if not target.is_file():
+            continue
+        removed.append(rel)
+        if dry_run:
+            continue
+        target.unlink()
+        parent = target.parent
+        while parent != root:
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+            parent = parent.parent
+    return removed
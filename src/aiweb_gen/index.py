@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path, PurePosixPath
+
+from .selector import (
+    DEFAULT_CONTEXT_TOKENS,
+    Document,
+    Selection,
+    build_document,
+    decode_text,
+    extract_symbols,
+    iter_candidate_files,
+    pack_documents,
+    rank_documents,
+    read_text_file,
+    tokenize,
+)
+
+INDEX_DIR = ".aiweb"
+INDEX_FILE = "index.db"
+# Bump when the schema or the tokenizer changes; older indexes are rebuilt from scratch.
+INDEX_VERSION = "1"
+
+_LANGUAGES = {
+    ".py": "python",
+    ".ts": "typescript",
+    ".tsx": "typescript",
+    ".js": "javascript",
+    ".jsx": "javascript",
+    ".mjs": "javascript",
+    ".cjs": "javascript",
+    ".json": "json",
+    ".toml": "toml",
+    ".yaml": "yaml",
+    ".yml": "yaml",
+    ".md": "markdown",
+    ".html": "html",
+    ".css": "css",
+    ".scss": "css",
+    ".sql": "sql",
+    ".sh": "shell",
+    ".ps1": "powershell",
+    ".ini": "ini",
+    ".txt": "text",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    language TEXT,
+    symbols TEXT NOT NULL,
+    chars INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    is_text INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    path TEXT NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_by_path ON postings (path);
+"""
+
+
+def detect_language(path: str) -> str | None:
+    return _LANGUAGES.get(PurePosixPath(path).suffix.lower())
+
+
+@dataclass
+class IndexStats:
+    scanned: int = 0
+    reindexed: int = 0
+    removed: int = 0
+    elapsed_ms: float = 0.0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class RepoIndex:
+    """Persistent, incrementally updated file index for a codebase, stored in SQLite.
+
+    ``refresh()`` walks the tree with stat() only and re-reads just the files whose mtime or
+    size changed (a touched file with an unchanged hash only gets its mtime updated). Each
+    file's BM25 terms live in an inverted ``postings`` table, so ranking a change request
+    only loads the rows for the request's own terms instead of every file.
+
+    With persist=False nothing is written under root: the index is refreshed in memory,
+    starting from a copy of the stored one when there is one.
+    """
+
+    def __init__(
+        self, root: Path, *, db_path: Path | None = None, persist: bool = True
+    ) -> None:
+        self.root = root.resolve()
+        self.db_path = db_path or self.root / INDEX_DIR / INDEX_FILE
+        if persist:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path)
+        else:
+            self._conn = sqlite3.connect(":memory:")
+            if self.db_path.is_file():
+                stored = sqlite3.connect(f"{self.db_path.resolve().as_uri()}?mode=ro", uri=True)
+                try:
+                    stored.backup(self._conn)
+                finally:
+                    stored.close()
+        self._conn.executescript(_SCHEMA)
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != INDEX_VERSION:
+            with self._conn:
+                self._conn.execute("DELETE FROM files")
+                self._conn.execute("DELETE FROM postings")
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)",
+                    (INDEX_VERSION,),
+                )
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> RepoIndex:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def refresh(self) -> IndexStats:
+        started = time.perf_counter()
+        stats = IndexStats()
+        known = {
+            path: (mtime_ns, size, sha)
+            for path, mtime_ns, size, sha in self._conn.execute(
+                "SELECT path, mtime_ns, size, sha256 FROM files"
+            )
+        }
+        seen: set[str] = set()
+
+        with self._conn:
+            for rel, path in iter_candidate_files(self.root):
+                stats.scanned += 1
+                seen.add(rel)
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                previous = known.get(rel)
+                if previous is not None and previous[:2] == (st.st_mtime_ns, st.st_size):
+                    continue
+                try:
+                    raw = path.read_bytes()
+                except OSError:
+                    continue
+                sha = hashlib.sha256(raw).hexdigest()
+                if previous is not None and previous[2] == sha:
+                    self._conn.execute(
+                        "UPDATE files SET mtime_ns = ?, size = ? WHERE path = ?",
+                        (st.st_mtime_ns, st.st_size, rel),
+                    )
+                    continue
+                self._store(rel, st.st_mtime_ns, st.st_size, sha, decode_text(raw))
+                stats.reindexed += 1
+
+            for rel in known.keys() - seen:
+                self._conn.execute("DELETE FROM files WHERE path = ?", (rel,))
+                self._conn.execute("DELETE FROM postings WHERE path = ?", (rel,))
+                stats.removed += 1
+
+        stats.elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
+        return stats
+
+    def _store(self, rel: str, mtime_ns: int, size: int, sha: str, content: str | None) -> None:
+        self._conn.execute("DELETE FROM postings WHERE path = ?", (rel,))
+        if content is None:
+            doc = Document(path=rel, chars=0, terms={}, length=0)
+            symbols: list[str] = []
+        else:
+            doc = build_document(rel, content)
+            symbols = extract_symbols(content)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO files "
+            "(path, mtime_ns, size, sha256, language, symbols, chars, length, is_text) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                rel,
+                mtime_ns,
+                size,
+                sha,
+                detect_language(rel),
+                json.dumps(symbols),
+                doc.chars,
+                doc.length,
+                int(content is not None),
+            ),
+        )
+        self._conn.executemany(
+            "INSERT INTO postings (term, path, tf) VALUES (?, ?, ?)",
+            [(term, rel, tf) for term, tf in doc.terms.items()],
+        )
+
+    def documents(self, query: str) -> list[Document]:
+        """Text files as Documents whose term maps are restricted to the query's terms."""
+        query_terms = sorted(set(tokenize(query)))
+        terms_by_path: dict[str, dict[str, int]] = {}
+        if query_terms:
+            placeholders = ",".join("?" * len(query_terms))
+            for term, path, tf in self._conn.execute(
+                f"SELECT term, path, tf FROM postings WHERE term IN ({placeholders})",
+                query_terms,
+            ):
+                terms_by_path.setdefault(path, {})[term] = tf
+        return [
+            Document(path=path, chars=chars, terms=terms_by_path.get(path, {}), length=length)
+            for path, chars, length in self._conn.execute(
+                "SELECT path, chars, length FROM files WHERE is_text = 1"
+            )
+        ]
+
+    def entry(self, rel: str) -> dict | None:
+        row = self._conn.execute(
+            "SELECT path, mtime_ns, size, sha256, language, symbols FROM files WHERE path = ?",
+            (rel,),
+        ).fetchone()
+        if row is None:
+            return None
+        path, mtime_ns, size, sha, language, symbols = row
+        return {
+            "path": path,
+            "mtime_ns": mtime_ns,
+            "size": size,
+            "sha256": sha,
+            "language": language,
+            "symbols": json.loads(symbols),
+        }
+
+    def select(self, query: str, *, token_budget: int = DEFAULT_CONTEXT_TOKENS) -> Selection:
+        ranked = rank_documents(self.documents(query), query)
+        return pack_documents(
+            ranked,
+            token_budget=token_budget,
+            load=lambda rel: read_text_file(self.root / rel),
+        )
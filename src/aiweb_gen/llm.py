@@ -1,11 +1,23 @@
 from __future__ import annotations
 
+import email.utils
 import json
 import os
+import random
+import re
+import threading
 import time
-from dataclasses import dataclass
+from collections import deque
+from collections.abc import Callable, Iterator, Mapping
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from . import tracing
+from .cache import ResponseCache
+from .prompts import prompt_hash
 
 
 @dataclass(frozen=True)
@@ -15,12 +27,83 @@ class LLMConfig:
     model: str
     timeout_s: int = 120
     max_retries: int = 2
+    # Number of distinct hosts kept in the session's pool cache.
+    pool_connections: int = 4
+    # Maximum keep-alive connections per host.
+    pool_maxsize: int = 8
+    # Block (instead of opening extra throwaway connections) once a host hits pool_maxsize.
+    pool_block: bool = False
+    # Client-side budgets shared by every caller of one client; 0 disables the limit.
+    requests_per_minute: int = 0
+    tokens_per_minute: int = 0
+    # Retry delay is uniform in [0, min(backoff_max_s, backoff_base_s * 2**attempt)].
+    backoff_base_s: float = 1.0
+    backoff_max_s: float = 30.0
+    # Consecutive server/network failures that open the circuit, and how long it stays open.
+    breaker_threshold: int = 5
+    breaker_reset_s: float = 30.0
+    # Hedging of temperature-0 calls: once a call has run longer than this percentile of the
+    # recent latencies of its prompt, a duplicate is sent and the first answer wins.
+    # 0 disables hedging.
+    hedge_percentile: float = 0.0
+    # Duplicates may be at most this fraction of the requests sent.
+    hedge_budget: float = 0.1
+    # Where duplicates go; empty means base_url.
+    hedge_base_url: str = ""
+    # Send response_format={"type": "json_object"} on calls that expect JSON. Only for
+    # providers that support OpenAI's JSON mode.
+    json_mode: bool = False
+    # Provider prompt-caching hints: "openai" sends a prompt_cache_key per prompt revision so
+    # requests sharing a prefix land on the same cache; "anthropic" marks the system prompt
+    # and any stable user prefix with cache_control breakpoints. "" sends no hints.
+    prompt_cache: str = ""
+
+
+PROMPT_CACHE_MODES = ("", "openai", "anthropic")
 
 
 class LLMError(RuntimeError):
     pass
 
 
+class LLMHTTPError(LLMError):
+    def __init__(self, status: int, message: str, retry_after: float | None = None) -> None:
+        super().__init__(message)
+        self.status = status
+        # Seconds the server asked us to wait (Retry-After and friends), if it said.
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(LLMError):
+    pass
+
+
+def _env_int(name: str, default: int, *, low: int = 1) -> int:
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = int(raw)
+    except ValueError as exc:
+        raise LLMError(f"{name} must be an integer, got {raw!r}") from exc
+    if value < low:
+        raise LLMError(f"{name} must be >= {low}, got {value}")
+    return value
+
+
+def _env_float(name: str, default: float, *, low: float, high: float) -> float:
+    raw = os.environ.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        value = float(raw)
+    except ValueError as exc:
+        raise LLMError(f"{name} must be a number, got {raw!r}") from exc
+    if not low <= value <= high:
+        raise LLMError(f"{name} must be between {low:g} and {high:g}, got {value:g}")
+    return value
+
+
 def load_llm_config() -> LLMConfig:
     api_key = os.environ.get("OPENAI_API_KEY", "").strip()
     if not api_key:
@@ -28,39 +111,876 @@ def load_llm_config() -> LLMConfig:
 
     base_url = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1").strip().rstrip("/")
     model = os.environ.get("OPENAI_MODEL", "gpt-5.2-mini").strip()
-    return LLMConfig(api_key=api_key, base_url=base_url, model=model)
+    return LLMConfig(
+        api_key=api_key,
+        base_url=base_url,
+        model=model,
+        pool_connections=_env_int("AIWEB_HTTP_POOL_CONNECTIONS", 4),
+        pool_maxsize=_env_int("AIWEB_HTTP_POOL_MAXSIZE", 8),
+        pool_block=os.environ.get("AIWEB_HTTP_POOL_BLOCK") == "1",
+        # 0 disables the budget.
+        requests_per_minute=_env_int("AIWEB_LLM_RPM", 0, low=0),
+        tokens_per_minute=_env_int("AIWEB_LLM_TPM", 0, low=0),
+        breaker_threshold=_env_int("AIWEB_LLM_BREAKER_THRESHOLD", 5),
+        hedge_percentile=_env_float("AIWEB_HEDGE_PERCENTILE", 0.0, low=0.0, high=99.9),
+        hedge_budget=_env_float("AIWEB_HEDGE_BUDGET", 0.1, low=0.0, high=1.0),
+        hedge_base_url=os.environ.get("AIWEB_HEDGE_BASE_URL", "").strip().rstrip("/"),
+        json_mode=os.environ.get("AIWEB_JSON_MODE") == "1",
+        prompt_cache=_env_prompt_cache(),
+    )
+
+
+def _env_prompt_cache() -> str:
+    mode = os.environ.get("AIWEB_PROMPT_CACHE", "").strip().lower()
+    if mode not in PROMPT_CACHE_MODES:
+        raise LLMError(f"AIWEB_PROMPT_CACHE must be openai or anthropic, got {mode!r}")
+    return mode
+
+
+def is_retryable_status(status: int) -> bool:
+    """Timeouts, conflicts, rate limits and server errors; other 4xx will fail again."""
+    return status in (408, 409, 425, 429) or status >= 500
+
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def _parse_duration(value: str) -> float | None:
+    """OpenAI-style reset durations: "20ms", "1.5s", "6m0s"."""
+    parts = _DURATION_RE.findall(value.strip())
+    if not parts:
+        return None
+    return sum(float(n) * _DURATION_UNITS[unit] for n, unit in parts)
+
+
+def retry_after_seconds(headers: Mapping[str, str]) -> float | None:
+    """How long the server asked us to back off, from standard or provider headers."""
+    raw = headers.get("retry-after-ms")
+    if raw:
+        try:
+            return max(0.0, float(raw) / 1000)
+        except ValueError:
+            pass
+    raw = headers.get("retry-after")
+    if raw:
+        try:
+            return max(0.0, float(raw))
+        except ValueError:
+            try:
+                when = email.utils.parsedate_to_datetime(raw)
+            except (TypeError, ValueError):
+                when = None
+            if when is not None:
+                return max(0.0, when.timestamp() - time.time())
+    resets = [
+        _parse_duration(headers.get(name) or "")
+        for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+    ]
+    resets = [r for r in resets if r is not None]
+    return max(resets) if resets else None
+
+
+def _exhausted_reset(headers: Mapping[str, str]) -> float | None:
+    """Reset delay when a success response says a provider budget is already used up."""
+    delays = []
+    for kind in ("requests", "tokens"):
+        if (headers.get(f"x-ratelimit-remaining-{kind}") or "").strip() == "0":
+            delay = _parse_duration(headers.get(f"x-ratelimit-reset-{kind}") or "")
+            if delay is not None:
+                delays.append(delay)
+    return max(delays) if delays else None
+
+
+class TokenBucket:
+    """Refills continuously at ``per_minute`` up to one minute's worth of tokens.
+
+    ``reserve`` always takes the tokens, letting the level go negative, and returns how long
+    the caller must wait for them; concurrent callers therefore queue up in order instead
+    of polling.
+    """
+
+    def __init__(self, per_minute: float, *, clock: Callable[[], float] = time.monotonic) -> None:
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self._clock = clock
+        self._stamp = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def reserve(self, amount: float) -> float:
+        self._refill()
+        # A single request larger than the whole budget waits for a full bucket, not forever.
+        self.level -= min(amount, self.capacity)
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def adjust(self, amount: float) -> None:
+        """Charge (or refund, if negative) tokens after the fact."""
+        self._refill()
+        self.level = min(self.capacity, self.level - amount)
+
+
+@dataclass
+class SchedulerStats:
+    requests: int = 0
+    # Callers currently waiting in acquire(), and the most seen at once.
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    throttled: int = 0
+    throttle_s: float = 0.0
+    rate_limited: int = 0
+    backoff_s: float = 0.0
+    circuit_opened: int = 0
+    circuit_rejected: int = 0
+
+    def as_dict(self) -> dict:
+        return {k: round(v, 3) if isinstance(v, float) else v for k, v in asdict(self).items()}
+
+
+class RequestScheduler:
+    """Admission control shared by every request of one LLMClient.
+
+    Requests wait for both the requests-per-minute and the tokens-per-minute bucket, and for
+    any pause imposed by a 429 (Retry-After applies to every caller, not just the one that
+    got it). Failed attempts get exponential backoff with full jitter. A run of consecutive
+    server or network failures opens a circuit breaker: requests then fail fast with
+    CircuitOpenError until ``breaker_reset_s`` has passed and a single probe succeeds.
+    """
+
+    def __init__(
+        self,
+        *,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        backoff_base_s: float = 1.0,
+        backoff_max_s: float = 30.0,
+        breaker_threshold: int = 5,
+        breaker_reset_s: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        rand: Callable[[], float] = random.random,
+    ) -> None:
+        self.rpm = TokenBucket(requests_per_minute, clock=clock) if requests_per_minute else None
+        self.tpm = TokenBucket(tokens_per_minute, clock=clock) if tokens_per_minute else None
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset_s = breaker_reset_s
+        self.stats = SchedulerStats()
+        self._clock = clock
+        self._sleep = sleep
+        self._rand = rand
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._failures = 0
+        self._open_until: float | None = None
+        self._probing = False
+
+    @classmethod
+    def from_config(cls, cfg: LLMConfig) -> RequestScheduler:
+        return cls(
+            requests_per_minute=cfg.requests_per_minute,
+            tokens_per_minute=cfg.tokens_per_minute,
+            backoff_base_s=cfg.backoff_base_s,
+            backoff_max_s=cfg.backoff_max_s,
+            breaker_threshold=cfg.breaker_threshold,
+            breaker_reset_s=cfg.breaker_reset_s,
+        )
+
+    @property
+    def circuit_state(self) -> str:
+        if self._open_until is None:
+            return "closed"
+        return "half-open" if self._probing or self._clock() >= self._open_until else "open"
+
+    @property
+    def queue_depth(self) -> int:
+        """Requests currently waiting for admission."""
+        with self._lock:
+            return self.stats.queue_depth
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats.as_dict(), "circuit": self.circuit_state}
+
+    def _admit(self) -> bool:
+        """Raise while the circuit is open; return True if this request is the half-open probe."""
+        if self._open_until is None:
+            return False
+        if self._probing or self._clock() < self._open_until:
+            self.stats.circuit_rejected += 1
+            remaining = max(0.0, self._open_until - self._clock())
+            raise CircuitOpenError(
+                f"LLM circuit open after {self._failures} consecutive failures; "
+                f"retry in {remaining:.1f}s"
+            )
+        # Half-open: let exactly one request through to test the endpoint.
+        self._probing = True
+        return True
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Block until a request of ~tokens may be sent; return the seconds spent waiting."""
+        return self.admit(tokens)[0]
+
+    def admit(self, tokens: int = 0) -> tuple[float, bool]:
+        """Like acquire, but also return whether this request is the half-open probe.
+
+        A probe must end in on_success, on_failure or release_probe, or the circuit stays
+        half-open and rejects every later request.
+        """
+        with self._lock:
+            probe = self._admit()
+            self.stats.requests += 1
+            delay = max(0.0, self._paused_until - self._clock())
+            if self.rpm is not None:
+                delay = max(delay, self.rpm.reserve(1))
+            if self.tpm is not None and tokens:
+                delay = max(delay, self.tpm.reserve(tokens))
+            if delay <= 0:
+                return 0.0, probe
+            self.stats.throttled += 1
+            self.stats.throttle_s += delay
+            self.stats.queue_depth += 1
+            self.stats.max_queue_depth = max(self.stats.max_queue_depth, self.stats.queue_depth)
+        try:
+            self._sleep(delay)
+        except BaseException:
+            if probe:
+                self.release_probe()
+            raise
+        finally:
+            with self._lock:
+                self.stats.queue_depth -= 1
+        return delay, probe
+
+    def release_probe(self) -> None:
+        """Give up the half-open probe without an outcome (e.g. the caller went away)."""
+        with self._lock:
+            self._probing = False
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """Correct the token budget once the real usage of a request is known."""
+        if self.tpm is None or not actual:
+            return
+        with self._lock:
+            self.tpm.adjust(actual - estimated)
+
+    def backoff(self, attempt: int) -> float:
+        ceiling = min(self.backoff_max_s, self.backoff_base_s * (2**attempt))
+        return ceiling * self._rand()
+
+    def _pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def on_success(self, headers: Mapping[str, str] | None = None) -> None:
+        with self._lock:
+            self._failures = 0
+            self._open_until = None
+            self._probing = False
+            delay = _exhausted_reset(headers) if headers is not None else None
+            if delay:
+                self._pause(delay)
+
+    def on_failure(self, exc: Exception, attempt: int) -> float | None:
+        """Record a failed attempt; return the delay before retrying, or None to give up."""
+        status = getattr(exc, "status", None)
+        retry_after = getattr(exc, "retry_after", None)
+        with self._lock:
+            if status is not None and status < 500:
+                # The endpoint answered, so it is healthy as far as the breaker is concerned.
+                self._failures = 0
+                self._open_until = None
+                self._probing = False
+                if not is_retryable_status(status):
+                    return None
+                if status == 429:
+                    self.stats.rate_limited += 1
+                    # Every caller waits this out in acquire(); no extra sleep for this one.
+                    self._pause(retry_after if retry_after is not None else self.backoff(attempt))
+                    return 0.0
+            else:
+                self._failures += 1
+                if self._probing or self._failures >= self.breaker_threshold:
+                    if not self._probing:
+                        self.stats.circuit_opened += 1
+                    self._open_until = self._clock() + self.breaker_reset_s
+                    self._probing = False
+            delay = retry_after if retry_after is not None else self.backoff(attempt)
+            self.stats.backoff_s += delay
+            return delay
+
+    def wait(self, seconds: float) -> None:
+        if seconds > 0:
+            self._sleep(seconds)
+
+
+@dataclass
+class HedgeStats:
+    requests: int = 0
+    hedged: int = 0
+    hedge_wins: int = 0
+    over_budget: int = 0
 
+    def as_dict(self) -> dict:
+        return asdict(self)
 
-def chat_completion(*, system: str, user: str, temperature: float = 0.0) -> str:
-    cfg = load_llm_config()
-    url = f"{cfg.base_url}/chat/completions"
 
-    payload = {
-        "model": cfg.model,
-        "temperature": temperature,
-        "messages": [
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
-    }
+class Hedger:
+    """Per-prompt latency history and the spend cap for hedged (duplicate) requests.
 
-    headers = {
-        "Authorization": f"Bearer {cfg.api_key}",
-        "Content-Type": "application/json",
-    }
+    A prompt only gets hedged once ``min_samples`` latencies have been seen for it; the hedge
+    fires at the ``percentile`` of the last ``window`` of them.
+    """
 
-    last_err: Exception | None = None
-    for attempt in range(cfg.max_retries + 1):
+    def __init__(
+        self, *, percentile: float, budget: float, window: int = 200, min_samples: int = 10
+    ) -> None:
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.stats = HedgeStats()
+        self._window = window
+        self._latencies: dict[str, deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, prompt: str, seconds: float) -> None:
+        with self._lock:
+            history = self._latencies.setdefault(prompt, deque(maxlen=self._window))
+            history.append(seconds)
+
+    def delay(self, prompt: str) -> float | None:
+        """Seconds to wait before hedging a call of this prompt, or None if not warmed up."""
+        with self._lock:
+            history = sorted(self._latencies.get(prompt, ()))
+        if len(history) < self.min_samples:
+            return None
+        # Nearest-rank percentile.
+        rank = max(1, -(-len(history) * self.percentile // 100))
+        return history[int(rank) - 1]
+
+    def note_request(self) -> None:
+        with self._lock:
+            self.stats.requests += 1
+
+    def try_hedge(self) -> bool:
+        with self._lock:
+            if self.stats.hedged + 1 > self.budget * self.stats.requests:
+                self.stats.over_budget += 1
+                return False
+            self.stats.hedged += 1
+            return True
+
+    def note_win(self) -> None:
+        with self._lock:
+            self.stats.hedge_wins += 1
+
+
+def _estimate_tokens(payload: dict) -> int:
+    # Same 4-chars-per-token rule as the rest of the package; settle() corrects it from usage.
+    chars = sum(len(str(m.get("content", ""))) for m in payload.get("messages") or [])
+    return -(-chars // 4)
+
+
+def _build_session(cfg: LLMConfig) -> requests.Session:
+    session = requests.Session()
+    # Retries are handled in LLMClient so urllib3 must not retry on its own.
+    adapter = HTTPAdapter(
+        pool_connections=cfg.pool_connections,
+        pool_maxsize=cfg.pool_maxsize,
+        pool_block=cfg.pool_block,
+        max_retries=0,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(
+        {
+            "Authorization": f"Bearer {cfg.api_key}",
+            "Content-Type": "application/json",
+        }
+    )
+    return session
+
+
+class LLMClient:
+    """OpenAI-compatible chat client backed by a pooled keep-alive session.
+
+    Share one instance across every call of a run: the config is read once and consecutive
+    requests reuse warm connections instead of paying a new TCP+TLS handshake each time.
+    The underlying requests.Session is safe to share between worker threads as long as
+    pool_maxsize is at least the number of concurrent callers.
+
+    When a ResponseCache is attached, temperature-0 requests are served from it and
+    successful responses are stored; sampled (temperature > 0) requests always go out.
+
+    Every request that goes out passes through the client's RequestScheduler, so the
+    rate limits, backoff and circuit breaker apply across all threads sharing the client.
+
+    With ``hedge_percentile`` set, slow temperature-0 calls are hedged: see Hedger. The
+    losing request cannot be interrupted mid-flight; it stops retrying and its response is
+    dropped (never cached) when it arrives.
+    """
+
+    def __init__(
+        self,
+        config: LLMConfig,
+        *,
+        session: requests.Session | None = None,
+        cache: ResponseCache | None = None,
+        scheduler: RequestScheduler | None = None,
+    ) -> None:
+        self.config = config
+        self.session = session or _build_session(config)
+        self.cache = cache
+        self.scheduler = scheduler or RequestScheduler.from_config(config)
+        self.hedger: Hedger | None = None
+        if config.hedge_percentile > 0:
+            self.hedger = Hedger(percentile=config.hedge_percentile, budget=config.hedge_budget)
+        self._hedge_pool: ThreadPoolExecutor | None = None
+        self._hedge_pool_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, *, cache: ResponseCache | None = None) -> LLMClient:
+        return cls(load_llm_config(), cache=cache)
+
+    def cache_stats(self) -> dict:
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats.as_dict()}
+
+    def scheduler_stats(self) -> dict:
+        return self.scheduler.snapshot()
+
+    def hedge_stats(self) -> dict:
+        if self.hedger is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.hedger.stats.as_dict()}
+
+    def close(self) -> None:
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+    def __enter__(self) -> LLMClient:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def _payload(
+        self, system: str, user: str, temperature: float, json_output: bool = False
+    ) -> dict:
+        payload = {
+            "model": self.config.model,
+            "temperature": temperature,
+            "messages": [
+                {"role": "system", "content": system},
+                {"role": "user", "content": user},
+            ],
+        }
+        if json_output and self.config.json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        return payload
+
+    def _wire_payload(
+        self, payload: dict, prompt: str | None, system_hash: str, stable_prefix: int
+    ) -> dict:
+        """Add the provider prompt-caching hints to a payload (see LLMConfig.prompt_cache)."""
+        mode = self.config.prompt_cache
+        if mode == "openai":
+            return {**payload, "prompt_cache_key": f"aiweb-{prompt or 'default'}-{system_hash}"}
+        if mode != "anthropic":
+            return payload
+        ephemeral = {"type": "ephemeral"}
+        system, user = (m["content"] for m in payload["messages"])
+        user_blocks = [{"type": "text", "text": user}]
+        if 0 < stable_prefix < len(user):
+            user_blocks = [
+                {"type": "text", "text": user[:stable_prefix], "cache_control": ephemeral},
+                {"type": "text", "text": user[stable_prefix:]},
+            ]
+        messages = [
+            {
+                "role": "system",
+                "content": [{"type": "text", "text": system, "cache_control": ephemeral}],
+            },
+            {"role": "user", "content": user_blocks},
+        ]
+        return {**payload, "messages": messages}
+
+    def _cache_key(self, payload: dict, system_hash: str) -> str | None:
+        if self.cache is None or payload["temperature"] != 0.0:
+            return None
+        # The endpoint is part of the key: the same model name may differ between providers.
+        # Keyed on the payload before provider hints, which do not change the answer.
+        return ResponseCache.key(
+            {"base_url": self.config.base_url, "prompt_hash": system_hash, **payload}
+        )
+
+    def chat_completion(
+        self,
+        *,
+        system: str,
+        user: str,
+        temperature: float = 0.0,
+        refresh_cache: bool = False,
+        prompt: str | None = None,
+        json_output: bool = False,
+        stable_prefix: int = 0,
+    ) -> str:
+        """Return the assistant message for one system+user exchange.
+
+        refresh_cache skips the cache lookup (the fresh response still replaces the stored
+        one); flows set it on retries so a rejected output is not served back again.
+        prompt names the system prompt (ARCHITECT_MODE, ...); latency history for hedging
+        is kept per prompt name. json_output marks calls that expect a JSON object, which
+        use the provider's JSON mode when config.json_mode is on. stable_prefix is the length
+        of the start of user that other requests share (the spec every fan-out unit sees);
+        with anthropic prompt caching it gets its own cache breakpoint.
+        """
+        system_hash = prompt_hash(system)
+        with tracing.span(
+            "llm.request",
+            model=self.config.model,
+            stream=False,
+            prompt=prompt,
+            prompt_hash=system_hash,
+        ):
+            return self._chat_completion(
+                system,
+                user,
+                temperature,
+                refresh_cache,
+                prompt,
+                json_output,
+                system_hash,
+                stable_prefix,
+            )
+
+    def _begin_attempt(
+        self, attempt: int, body: str, tokens: int, record: Callable[..., None]
+    ) -> bool:
+        """Wait for the scheduler; return True if this attempt is the circuit's probe."""
+        if attempt:
+            record(http_retries=1)
+        waited, probe = self.scheduler.admit(tokens)
+        if waited:
+            record(throttle_ms=round(waited * 1000))
+        record(request_bytes=len(body))
+        return probe
+
+    def _check_status(self, resp: requests.Response, record: Callable[..., None]) -> None:
+        if resp.status_code < 400:
+            return
+        record(response_bytes=len(resp.content))
+        if resp.status_code == 429:
+            record(rate_limited=1)
+        raise LLMHTTPError(
+            resp.status_code,
+            f"HTTP {resp.status_code}: {resp.text[:2000]}",
+            retry_after=retry_after_seconds(resp.headers),
+        )
+
+    def _chat_completion(
+        self,
+        system: str,
+        user: str,
+        temperature: float,
+        refresh_cache: bool,
+        prompt: str | None,
+        json_output: bool,
+        system_hash: str,
+        stable_prefix: int,
+    ) -> str:
+        payload = self._payload(system, user, temperature, json_output)
+        cache_key = self._cache_key(payload, system_hash)
+        tracing.record(llm_calls=1)
+        if cache_key is not None and not refresh_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                tracing.record(cache_hits=1)
+                return cached
+        if cache_key is not None:
+            tracing.record(cache_misses=1)
+
+        body = json.dumps(self._wire_payload(payload, prompt, system_hash, stable_prefix))
+        tokens = _estimate_tokens(payload)
+        if self.hedger is not None and temperature == 0.0:
+            content = self._hedged_post(prompt or "default", body, tokens)
+        else:
+            content, _ = self._post(self.config.base_url, body, tokens)
+        if cache_key is not None:
+            self.cache.put(cache_key, content)
+        return content
+
+    def _post(
+        self,
+        base_url: str,
+        body: str,
+        tokens: int,
+        cancelled: threading.Event | None = None,
+    ) -> tuple[str, float]:
+        """Send one completion request with retries; return the content and its latency."""
+        cfg = self.config
+        url = f"{base_url}/chat/completions"
+        last_err: Exception | None = None
+        for attempt in range(cfg.max_retries + 1):
+            if cancelled is not None and cancelled.is_set():
+                raise LLMError("LLM request cancelled: a hedged duplicate answered first")
+            probe = self._begin_attempt(attempt, body, tokens, tracing.record)
+            started = time.perf_counter()
+            try:
+                resp = self.session.post(url, data=body, timeout=cfg.timeout_s)
+                self._check_status(resp, tracing.record)
+                tracing.record(response_bytes=len(resp.content))
+                data = resp.json()
+                content = data["choices"][0]["message"]["content"]
+            except Exception as exc:  # noqa: BLE001
+                last_err = exc
+                delay = self.scheduler.on_failure(exc, attempt)
+                if delay is None or attempt >= cfg.max_retries:
+                    break
+                self.scheduler.wait(delay)
+                continue
+            except BaseException:
+                if probe:
+                    self.scheduler.release_probe()
+                raise
+
+            self.scheduler.on_success(resp.headers)
+            self.scheduler.settle(tokens, _record_usage(data.get("usage")))
+            return content, time.perf_counter() - started
+
+        raise LLMError(f"LLM request failed: {last_err}")
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._hedge_pool_lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(
+                    max_workers=2 * self.config.pool_maxsize, thread_name_prefix="aiweb-hedge"
+                )
+            return self._hedge_pool
+
+    def _hedged_post(self, prompt: str, body: str, tokens: int) -> str:
+        hedger = self.hedger
+        assert hedger is not None
+        hedger.note_request()
+        delay = hedger.delay(prompt)
+        if delay is None:
+            content, latency = self._post(self.config.base_url, body, tokens)
+            hedger.observe(prompt, latency)
+            return content
+
+        cancelled = threading.Event()
+        # One context copy per leg: a Context cannot be entered by two threads at once.
+        primary = self._pool().submit(
+            tracing.run_in_context(self._post), self.config.base_url, body, tokens, cancelled
+        )
+        legs: list[Future] = [primary]
+        done, _ = wait(legs, timeout=delay)
+        # Hedging while the scheduler is already queueing requests would only add to the queue.
+        if not done and not self.scheduler.queue_depth and hedger.try_hedge():
+            tracing.record(hedged_requests=1)
+            hedge_url = self.config.hedge_base_url or self.config.base_url
+            hedge = tracing.run_in_context(self._post)
+            legs.append(self._pool().submit(hedge, hedge_url, body, tokens, cancelled))
+
+        pending = set(legs)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for leg in done:
+                if leg.exception() is not None:
+                    continue
+                cancelled.set()
+                content, latency = leg.result()
+                hedger.observe(prompt, latency)
+                if leg is not primary:
+                    hedger.note_win()
+                return content
+        raise primary.exception()
+
+    def stream_chat_completion(
+        self,
+        *,
+        system: str,
+        user: str,
+        temperature: float = 0.0,
+        refresh_cache: bool = False,
+        prompt: str | None = None,
+    ) -> Iterator[str]:
+        """Like chat_completion, but yield content deltas as the server streams them (SSE).
+
+        Connection errors are retried only until the first chunk has been yielded; after that
+        a failure raises LLMError because the caller has already consumed partial output.
+        A cache hit yields the stored response as a single chunk. Streams are never hedged.
+        """
+        # A generator must not set the current span (it would leak into the consumer between
+        # yields), so counters go straight onto a detached span.
+        system_hash = prompt_hash(system)
+        span = tracing.start_span(
+            "llm.request",
+            model=self.config.model,
+            stream=True,
+            prompt=prompt,
+            prompt_hash=system_hash,
+        )
         try:
-            resp = requests.post(url, headers=headers, data=json.dumps(payload), timeout=cfg.timeout_s)
-            if resp.status_code >= 400:
-                raise LLMError(f"HTTP {resp.status_code}: {resp.text[:2000]}")
-            data = resp.json()
-            return data["choices"][0]["message"]["content"]
-        except Exception as exc:  # noqa: BLE001
-            last_err = exc
-            if attempt >= cfg.max_retries:
-                break
-            time.sleep(1.5 * (attempt + 1))
-
-    raise LLMError(f"LLM request failed: {last_err}")
+            yield from self._stream_chat_completion(
+                system, user, temperature, refresh_cache, prompt, system_hash, span
+            )
+        except Exception as exc:
+            if span is not None:
+                span.attrs["error"] = type(exc).__name__
+            raise
+        finally:
+            if span is not None:
+                span.finish()
+
+    def _stream_chat_completion(
+        self,
+        system: str,
+        user: str,
+        temperature: float,
+        refresh_cache: bool,
+        prompt: str | None,
+        system_hash: str,
+        span: tracing.Span | None,
+    ) -> Iterator[str]:
+        cfg = self.config
+        url = f"{cfg.base_url}/chat/completions"
+        record = span.add if span is not None else _ignore
+        payload = self._payload(system, user, temperature)
+        cache_key = self._cache_key(payload, system_hash)
+        record(llm_calls=1)
+        if cache_key is not None and not refresh_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                record(cache_hits=1)
+                yield cached
+                return
+        if cache_key is not None:
+            record(cache_misses=1)
+
+        # include_usage asks for a final chunk carrying the usage block.
+        wire = self._wire_payload(payload, prompt, system_hash, 0)
+        body = json.dumps({**wire, "stream": True, "stream_options": {"include_usage": True}})
+        tokens = _estimate_tokens(payload)
+        # Only retained when the full response has to be written to the cache.
+        parts: list[str] | None = [] if cache_key is not None else None
+
+        last_err: Exception | None = None
+        for attempt in range(cfg.max_retries + 1):
+            probe = self._begin_attempt(attempt, body, tokens, record)
+            started = False
+            stats: dict = {}
+            try:
+                with self.session.post(url, data=body, timeout=cfg.timeout_s, stream=True) as resp:
+                    self._check_status(resp, record)
+                    headers = resp.headers
+                    try:
+                        for delta in _iter_sse_deltas(resp, stats):
+                            started = True
+                            if parts is not None:
+                                parts.append(delta)
+                            yield delta
+                    finally:
+                        record(response_bytes=stats.get("bytes", 0))
+            except Exception as exc:  # noqa: BLE001
+                if started:
+                    self.scheduler.on_failure(exc, attempt)
+                    raise LLMError(f"LLM stream interrupted: {exc}") from exc
+                last_err = exc
+                delay = self.scheduler.on_failure(exc, attempt)
+                if delay is None or attempt >= cfg.max_retries:
+                    break
+                self.scheduler.wait(delay)
+                continue
+            except BaseException:
+                # GeneratorExit when the consumer stops reading early, KeyboardInterrupt, ...
+                if probe:
+                    self.scheduler.release_probe()
+                raise
+
+            self.scheduler.on_success(headers)
+            self.scheduler.settle(tokens, _record_usage(stats.get("usage"), record))
+            if cache_key is not None and parts is not None:
+                self.cache.put(cache_key, "".join(parts))
+            return
+
+        raise LLMError(f"LLM request failed: {last_err}")
+
+
+def _ignore(**_counters: int) -> None:
+    return
+
+
+def _record_usage(usage: object, record: Callable[..., None] = tracing.record) -> int:
+    """Record a usage block; return its total token count (0 when absent)."""
+    if not isinstance(usage, dict):
+        return 0
+    prompt_tokens = int(usage.get("prompt_tokens") or 0)
+    completion_tokens = int(usage.get("completion_tokens") or 0)
+    record(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    return prompt_tokens + completion_tokens
+
+
+def _iter_sse_deltas(resp: requests.Response, stats: dict | None = None) -> Iterator[str]:
+    """Yield content deltas; stats (if given) receives the byte count and final usage block."""
+    stats = stats if stats is not None else {}
+    stats.setdefault("bytes", 0)
+    # text/event-stream usually has no charset; without one iter_lines would yield bytes.
+    resp.encoding = resp.encoding or "utf-8"
+    for line in resp.iter_lines(decode_unicode=True):
+        stats["bytes"] += len(line.encode("utf-8")) + 1
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:") :].strip()
+        if data == "[DONE]":
+            return
+        event = json.loads(data)
+        if event.get("usage"):
+            stats["usage"] = event["usage"]
+        choices = event.get("choices") or []
+        if not choices:
+            continue
+        delta = (choices[0].get("delta") or {}).get("content")
+        if delta:
+            yield delta
+
+
+_default_client: LLMClient | None = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client() -> LLMClient:
+    """Return the process-wide client, creating it from the environment on first use."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = LLMClient.from_env()
+        return _default_client
+
+
+def chat_completion(
+    *,
+    system: str,
+    user: str,
+    temperature: float = 0.0,
+    refresh_cache: bool = False,
+    prompt: str | None = None,
+    json_output: bool = False,
+    stable_prefix: int = 0,
+    client: LLMClient | None = None,
+) -> str:
+    return (client or get_default_client()).chat_completion(
+        system=system,
+        user=user,
+        temperature=temperature,
+        refresh_cache=refresh_cache,
+        prompt=prompt,
+        json_output=json_output,
+        stable_prefix=stable_prefix,
+    )
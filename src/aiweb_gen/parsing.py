@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import json
 import re
+from collections.abc import Iterable, Iterator
 from dataclasses import dataclass
 
 
@@ -17,7 +18,158 @@ def parse_json_strict(text: str) -> dict:
         raise ParseError(f"Invalid JSON output: {exc}") from exc
 
 
+# A truncated object is closed after dropping at most this many trailing members.
+_MAX_TRUNCATION_TRIMS = 8
+_JSON_FENCE_RE = re.compile(r"```[A-Za-z0-9_-]*[ \t]*\r?\n(?P<body>.*?)(?:```|\Z)", re.DOTALL)
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _note(repairs: list[str] | None, name: str) -> None:
+    if repairs is not None and name not in repairs:
+        repairs.append(name)
+
+
+def _scan(text: str) -> tuple[int | None, list[str], int | None]:
+    """String-aware bracket scan of text starting at an opening brace.
+
+    Returns the index just past the matching close (None if the text ends first), the
+    closers still owed at the end, and where the unterminated string the text ends in
+    starts (None if it does not end inside a string).
+    """
+    stack: list[str] = []
+    string_start: int | None = None
+    escaped = False
+    for i, ch in enumerate(text):
+        if string_start is not None:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                string_start = None
+        elif ch == '"':
+            string_start = i
+        elif ch in _CLOSERS:
+            stack.append(_CLOSERS[ch])
+        elif ch in "}]" and stack:
+            stack.pop()
+            if not stack:
+                return i + 1, [], None
+    return None, stack, string_start
+
+
+def _strip_trailing_commas(text: str) -> str:
+    out: list[str] = []
+    in_string = escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "," and text[i + 1 :].lstrip()[:1] in ("}", "]"):
+            continue
+        out.append(ch)
+    return "".join(out)
+
+
+def _loads(text: str) -> object | None:
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return None
+
+
+def _close_truncated(text: str) -> object | None:
+    """Close the brackets a truncated object still owes.
+
+    A cut-off string is dropped rather than closed (a half-written value is worse than a
+    missing one), and so is each incomplete trailing member until the result parses.
+    """
+    for _ in range(_MAX_TRUNCATION_TRIMS):
+        _, stack, string_start = _scan(text)
+        if string_start is not None:
+            text = text[:string_start]
+            continue
+        closed = text.rstrip().rstrip(",:").rstrip()
+        value = _loads(_strip_trailing_commas(closed + "".join(reversed(stack))))
+        if value is not None:
+            return value
+        # Drop the last (incomplete) member, or the partial first member of the innermost
+        # open container, and try again. A container that is itself the incomplete member
+        # goes entirely rather than being closed empty.
+        comma = text.rfind(",")
+        opener = max(text.rfind("{"), text.rfind("["))
+        if opener > comma and text[comma + 1 : opener].strip():
+            trimmed = text[: opener + 1]
+        else:
+            trimmed = text[: max(comma, 0)]
+        if not trimmed or trimmed == text:
+            return None
+        text = trimmed
+    return None
+
+
+def parse_json(text: str, *, repairs: list[str] | None = None) -> dict:
+    """Parse the JSON object in a model response, repairing common damage before giving up.
+
+    Output that is not plain JSON gets, in order: the body of a ``` fence, the outermost
+    {...} with any prose around it dropped, trailing commas removed, and a truncated object
+    closed (dropping a few incomplete trailing members). The names of the repairs that were
+    needed are appended to ``repairs``. Raises ParseError only when all of that fails.
+    """
+    text = text.strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as exc:
+        error = exc
+
+    applied: list[str] = []
+    fence = _JSON_FENCE_RE.search(text)
+    if fence is not None:
+        text = fence.group("body").strip()
+        applied.append("code_fence")
+    start = text.find("{")
+    if start < 0:
+        raise ParseError(f"Invalid JSON output: {error}")
+    end, _, _ = _scan(text[start:])
+    body = text[start : start + end] if end is not None else text[start:]
+    if start > 0 or (end is not None and text[start + end :].strip()):
+        applied.append("surrounding_text")
+
+    value = _loads(body)
+    if value is None:
+        fixed = _strip_trailing_commas(body)
+        if fixed != body:
+            value = _loads(fixed)
+            if value is not None:
+                applied.append("trailing_commas")
+    if value is None and end is None:
+        value = _close_truncated(body)
+        if value is not None:
+            applied.append("truncated_object")
+    if not isinstance(value, dict):
+        raise ParseError(f"Invalid JSON output: {error}")
+    for name in applied:
+        _note(repairs, name)
+    return value
+
+
 _FILE_HEADER_RE = re.compile(r"^=== FILE: (?P<path>[^=\n\r]+) ===\s*$")
+# Header variants models drift into: other '=' counts, missing colon or closing run,
+# different case ("==== File: x ====", "=== FILE x", "===FILE: x==="). Only trusted until a
+# strict header shows the model keeps to the format, and only for paths that look like files,
+# so a line like "=== File: notes ===" inside a file's content stays content.
+_LOOSE_FILE_HEADER_RE = re.compile(
+    r"^={3,}\s*file\b\s*:?\s*(?P<path>[^=\n\r]+?)\s*(?:={2,}\s*)?$", re.IGNORECASE
+)
+_PATH_QUOTES = "`'\"*"
+# Incremental generation names files to remove with their own marker line.
+_DELETE_HEADER_RE = re.compile(r"^=== DELETE: (?P<path>[^=\n\r]+) ===\s*$")
 
 
 @dataclass(frozen=True)
@@ -26,35 +178,153 @@ class FileBlock:
     content: str
 
 
-def parse_file_blocks(text: str) -> list[FileBlock]:
-    lines = text.splitlines()
-    blocks: list[FileBlock] = []
+def _check_block_path(block: FileBlock) -> None:
+    if not block.path or block.path.startswith("/") or ":" in block.path:
+        raise ParseError(f"Invalid relative paths in file blocks: {[block.path]}")
+
+
+def _looks_like_file(path: str) -> bool:
+    return "/" in path or "." in path.rsplit("/", 1)[-1].strip(".")
+
+
+def _header_path(
+    line: str, repairs: list[str] | None, *, loose: bool
+) -> tuple[str, bool] | None:
+    """The path of a file header line and whether it was strict, or None for content."""
+    m = _FILE_HEADER_RE.match(line)
+    strict = m is not None
+    if m is None:
+        m = _LOOSE_FILE_HEADER_RE.match(line) if loose else None
+        if m is None:
+            return None
+    path = m.group("path").strip()
+    unquoted = path.strip(_PATH_QUOTES).strip()
+    if not strict and not _looks_like_file(unquoted):
+        return None
+    if not strict or unquoted != path:
+        _note(repairs, "header_variant")
+    return unquoted, strict
+
+
+def _is_fence(line: str) -> bool:
+    return line.lstrip().startswith("```")
+
+
+def _unfence(path: str, lines: list[str], repairs: list[str] | None) -> list[str]:
+    """Drop markdown fences a model wrapped around a file's content."""
+    while lines and not lines[-1].strip():
+        lines = lines[:-1]
+    start = 0
+    while start < len(lines) and not lines[start].strip():
+        start += 1
+    if not lines or lines[-1].strip() != "```":
+        return lines
+    if start < len(lines) - 1 and _is_fence(lines[start]) and not path.endswith(".md"):
+        _note(repairs, "content_fence")
+        return lines[start + 1 : -1]
+    if sum(_is_fence(line) for line in lines) % 2:
+        # An unpaired closing fence: the whole response was fenced and this is its end.
+        _note(repairs, "trailing_fence")
+        return lines[:-1]
+    return lines
+
+
+def iter_file_blocks(
+    chunks: Iterable[str], *, repairs: list[str] | None = None
+) -> Iterator[FileBlock]:
+    """Incrementally parse '=== FILE: <path> ===' sections from a stream of text chunks.
+
+    Each block is yielded as soon as the header of the next one (or the end of the stream)
+    arrives, so callers can act on early files while the model is still generating. Only the
+    block currently being assembled is held in memory. Line handling matches splitlines().
+
+    Common header variants and markdown fences around file contents are accepted; the
+    repairs that were needed are appended to ``repairs``.
+    """
+    pending = ""
     current_path: str | None = None
     current_lines: list[str] = []
+    seen_any = False
+    seen_strict = False
 
-    def flush() -> None:
+    def handle(line: str) -> FileBlock | None:
+        nonlocal current_path, current_lines, seen_strict
+        header = _header_path(line.strip(), repairs, loose=not seen_strict)
+        if header is not None:
+            done = flush()
+            current_path, strict = header
+            seen_strict = seen_strict or strict
+            return done
+        if current_path is not None:
+            current_lines.append(line)
+        return None
+
+    def flush() -> FileBlock | None:
         nonlocal current_path, current_lines
         if current_path is None:
-            return
-        blocks.append(FileBlock(path=current_path.strip(), content="\n".join(current_lines).rstrip() + "\n"))
+            return None
+        lines = _unfence(current_path, current_lines, repairs)
+        block = FileBlock(path=current_path, content="\n".join(lines).rstrip() + "\n")
         current_path = None
         current_lines = []
+        _check_block_path(block)
+        return block
 
-    for line in lines:
-        m = _FILE_HEADER_RE.match(line.strip())
-        if m:
-            flush()
-            current_path = m.group("path")
+    for chunk in chunks:
+        if not chunk:
             continue
-        if current_path is not None:
-            current_lines.append(line)
+        pending += chunk
+        lines = pending.splitlines(keepends=True)
+        # Keep the unterminated tail (and a lone trailing '\r' that may be half of '\r\n').
+        if lines and (lines[-1].splitlines()[0] == lines[-1] or lines[-1].endswith("\r")):
+            pending = lines.pop()
+        else:
+            pending = ""
+        for raw in lines:
+            block = handle(raw.splitlines()[0])
+            if block is not None:
+                seen_any = True
+                yield block
+
+    for raw in pending.splitlines():
+        block = handle(raw)
+        if block is not None:
+            seen_any = True
+            yield block
+    block = flush()
+    if block is not None:
+        seen_any = True
+        yield block
 
-    flush()
-    if not blocks:
+    if not seen_any:
         raise ParseError("No file blocks found. Expected one or more '=== FILE: <path> ===' sections.")
 
-    bad = [b.path for b in blocks if not b.path or b.path.startswith("/") or ":" in b.path]
-    if bad:
-        raise ParseError(f"Invalid relative paths in file blocks: {bad}")
 
-    return blocks
+def parse_file_blocks(text: str, *, repairs: list[str] | None = None) -> list[FileBlock]:
+    return list(iter_file_blocks([text], repairs=repairs))
+
+
+def split_deletions(text: str) -> tuple[str, list[str]]:
+    """Take '=== DELETE: <path> ===' lines out of text; returns the rest and their paths.
+
+    Markers may sit anywhere between file blocks; the remaining text parses as if they had
+    never been there. Paths are checked like file block paths.
+    """
+    kept: list[str] = []
+    deleted: list[str] = []
+    for line in text.splitlines(keepends=True):
+        m = _DELETE_HEADER_RE.match(line.strip())
+        if m is None:
+            kept.append(line)
+            continue
+        path = m.group("path").strip().strip(_PATH_QUOTES).strip()
+        if not path or path.startswith("/") or ":" in path:
+            raise ParseError(f"Invalid relative path in delete marker: {path!r}")
+        if path not in deleted:
+            deleted.append(path)
+    return "".join(kept), deleted
+
+
+def format_file_blocks(blocks: Iterable[FileBlock]) -> str:
+    """Render blocks back into the '=== FILE: <path> ===' bundle format."""
+    return "\n".join(f"=== FILE: {b.path} ===\n{b.content}" for b in blocks)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import posixpath
+from dataclasses import dataclass, field
+
+from .diffapply import PatchError, parse_unified_diff
+from .selector import format_file_context
+
+DEFAULT_PATCH_CONCURRENCY = 6
+# Context files the planner may name per changed file; more would defeat the point.
+MAX_CONTEXT_FILES = 3
+
+
+class PlanError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class FileChange:
+    path: str
+    intent: str
+    # Other files the change to path must stay consistent with (sent read-only).
+    context: list[str] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return {"path": self.path, "intent": self.intent, "context": list(self.context)}
+
+
+def _clean_path(raw: object) -> str:
+    if not isinstance(raw, str) or not raw.strip():
+        raise PlanError(f"Plan entry has no valid path: {raw!r}")
+    path = posixpath.normpath(raw.strip().replace("\\", "/"))
+    if path.startswith("/") or path == ".." or path.startswith("../"):
+        raise PlanError(f"Plan path is outside the codebase: {raw}")
+    return path
+
+
+def parse_patch_plan(data: object) -> list[FileChange]:
+    """Validate PATCH_PLANNER output: {"files": [{"path", "intent", "context"?}]}.
+
+    Paths are normalised; a file listed twice is planned once with both intents.
+    """
+    files = data.get("files") if isinstance(data, dict) else None
+    if not isinstance(files, list):
+        raise PlanError('Plan must be a JSON object with a "files" list')
+
+    changes: dict[str, FileChange] = {}
+    for entry in files:
+        if not isinstance(entry, dict):
+            raise PlanError(f"Plan entry must be an object: {entry!r}")
+        path = _clean_path(entry.get("path"))
+        intent = str(entry.get("intent") or "").strip()
+        raw_context = entry.get("context") or []
+        if not isinstance(raw_context, list):
+            raise PlanError(f"Plan context for {path} must be a list")
+        context = [p for p in map(_clean_path, raw_context) if p != path]
+        previous = changes.get(path)
+        if previous is not None:
+            intent = "; ".join(filter(None, [previous.intent, intent]))
+            context = previous.context + [p for p in context if p not in previous.context]
+        changes[path] = FileChange(path, intent, context[:MAX_CONTEXT_FILES])
+    return list(changes.values())
+
+
+def render_file_request(
+    change_request: str,
+    plan: list[FileChange],
+    change: FileChange,
+    content: str | None,
+    context_files: dict[str, str],
+) -> tuple[str, int]:
+    """User message for one per-file diff request, and the length of its shared prefix.
+
+    The change request and the whole plan come first; they are identical for every file of
+    the plan, so provider-side prompt caching can reuse them across the concurrent requests.
+    """
+    shared = (
+        "CHANGE REQUEST:\n"
+        + change_request
+        + "\n\nPLAN (each file is changed by a separate request):\n"
+        + "".join(f"- {c.path}: {c.intent}\n" for c in plan)
+        + "\n"
+    )
+    parts = [shared]
+    if context_files:
+        parts.append("CONTEXT FILES (read-only):\n")
+        parts.extend(format_file_context(p, text) for p, text in context_files.items())
+        parts.append("\n")
+    parts.append(f"FILE TO CHANGE: {change.path}\nINTENT: {change.intent}\n")
+    if content is None:
+        parts.append("This file does not exist yet; create it.\n")
+    else:
+        parts.append("CURRENT CONTENT:\n" + format_file_context(change.path, content))
+    return "".join(parts), len(shared)
+
+
+def merge_file_diffs(diffs: list[tuple[FileChange, str]]) -> str:
+    """Join per-file diffs into one diff, in plan order, for a single apply.
+
+    Each diff must only touch its own file: a request that also rewrote another planned
+    file would race with that file's own request, so it is rejected rather than guessed at.
+    Empty diffs (no change needed after all) are dropped.
+    """
+    merged: list[str] = []
+    for change, diff_text in diffs:
+        if not diff_text.strip():
+            continue
+        try:
+            patches = parse_unified_diff(diff_text)
+        except PatchError as exc:
+            raise PatchError(f"Diff for {change.path}: {exc}") from exc
+        for patch in patches:
+            paths = (patch.old_path, patch.new_path)
+            touched = {posixpath.normpath(p) for p in paths if p is not None}
+            if touched != {change.path}:
+                raise PatchError(f"Diff for {change.path} touches {', '.join(sorted(touched))}")
+        merged.append(diff_text if diff_text.endswith("\n") else diff_text + "\n")
+    return "".join(merged)
@@ -1,5 +1,9 @@
 from __future__ import annotations
 
+import hashlib
+import re
+import threading
+from dataclasses import dataclass
 from pathlib import Path
 
 
@@ -7,8 +11,154 @@ class PromptError(RuntimeError):
     pass
 
 
-def load_prompt(prompts_dir: Path, name: str) -> str:
-    path = prompts_dir / f"{name}.txt"
-    if not path.exists():
-        raise PromptError(f"Missing prompt file: {path}")
-    return path.read_text(encoding="utf-8")
+_VARIABLE_RE = re.compile(r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}")
+_FRONT_MATTER_KEYS = {"version"}
+
+
+def prompt_hash(text: str) -> str:
+    """Short content hash of a prompt; the LLM client records it per request."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class Prompt:
+    name: str
+    # Template text without the front matter. Without variables this is exactly what is sent.
+    text: str
+    version: str
+    sha256: str
+    variables: frozenset[str]
+
+    def render(self, **values: object) -> str:
+        """Fill the ``{{name}}`` placeholders; every variable must be given, and nothing else."""
+        missing = self.variables - values.keys()
+        unknown = values.keys() - self.variables
+        if missing or unknown:
+            raise PromptError(
+                f"Prompt {self.name}: missing variables {sorted(missing)}, "
+                f"unknown variables {sorted(unknown)}"
+            )
+        if not self.variables:
+            return self.text
+        return _VARIABLE_RE.sub(lambda m: str(values[m.group(1)]), self.text)
+
+    def as_dict(self) -> dict:
+        return {
+            "version": self.version,
+            "sha256": self.sha256,
+            "variables": sorted(self.variables),
+        }
+
+
+def parse_prompt(name: str, raw: str) -> Prompt:
+    """Parse a prompt file: an optional ``---`` front matter block, then the template.
+
+    Front matter holds ``key: value`` lines; ``version`` (default "1") is reported with the
+    prompt's hash so runs can be traced back to the prompt revision that produced them.
+    """
+    meta: dict[str, str] = {}
+    text = raw
+    lines = raw.splitlines(keepends=True)
+    if lines and lines[0].strip() == "---":
+        end = next((i for i in range(1, len(lines)) if lines[i].strip() == "---"), None)
+        if end is None:
+            raise PromptError(f"Prompt {name}: unterminated front matter")
+        for line in lines[1:end]:
+            if not line.strip():
+                continue
+            key, sep, value = line.partition(":")
+            key = key.strip()
+            if not sep or key not in _FRONT_MATTER_KEYS:
+                raise PromptError(f"Prompt {name}: bad front matter line {line.strip()!r}")
+            meta[key] = value.strip()
+        text = "".join(lines[end + 1 :])
+    if not text.strip():
+        raise PromptError(f"Prompt {name} is empty")
+    # A "{{" that is not a well-formed placeholder is almost always a typo in a variable.
+    if text.count("{{") != len(_VARIABLE_RE.findall(text)):
+        raise PromptError(f"Prompt {name}: malformed {{{{variable}}}} placeholder")
+    return Prompt(
+        name=name,
+        text=text,
+        version=meta.get("version") or "1",
+        sha256=prompt_hash(text),
+        variables=frozenset(_VARIABLE_RE.findall(text)),
+    )
+
+
+class PromptRegistry:
+    """Every prompt of one directory, parsed and validated once, reloaded when its mtime changes.
+
+    The first lookup loads the whole directory so a broken prompt fails the run before any
+    tokens are spent. Later lookups cost one stat() each, which matters because flows look
+    their prompt up on every attempt and long-running batches and the daemon make many.
+    """
+
+    def __init__(self, prompts_dir: Path) -> None:
+        self.prompts_dir = prompts_dir
+        self._prompts: dict[str, tuple[int, Prompt]] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _read(self, path: Path) -> tuple[int, Prompt]:
+        mtime_ns = path.stat().st_mtime_ns
+        return mtime_ns, parse_prompt(path.stem, path.read_text(encoding="utf-8"))
+
+    def load_all(self) -> dict[str, Prompt]:
+        prompts: dict[str, tuple[int, Prompt]] = {}
+        errors: list[str] = []
+        for path in sorted(self.prompts_dir.glob("*.txt")):
+            try:
+                prompts[path.stem] = self._read(path)
+            except PromptError as exc:
+                errors.append(str(exc))
+        if errors:
+            raise PromptError("Invalid prompts: " + "; ".join(errors))
+        with self._lock:
+            self._prompts = prompts
+            self._loaded = True
+        return {name: prompt for name, (_, prompt) in prompts.items()}
+
+    def get(self, name: str) -> Prompt:
+        if not self._loaded:
+            self.load_all()
+        path = self.prompts_dir / f"{name}.txt"
+        try:
+            mtime_ns = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            raise PromptError(f"Missing prompt file: {path}") from None
+
+        with self._lock:
+            cached = self._prompts.get(name)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+
+        entry = self._read(path)
+        with self._lock:
+            self._prompts[name] = entry
+        return entry[1]
+
+    def manifest(self) -> dict[str, dict]:
+        """Version and hash of every prompt, for run reports."""
+        if not self._loaded:
+            self.load_all()
+        with self._lock:
+            return {name: prompt.as_dict() for name, (_, prompt) in sorted(self._prompts.items())}
+
+
+# Registries keyed by absolute directory, shared by every flow in the process.
+_registries: dict[str, PromptRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(prompts_dir: Path) -> PromptRegistry:
+    key = str(prompts_dir.absolute())
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = _registries[key] = PromptRegistry(prompts_dir)
+        return registry
+
+
+def load_prompt(prompts_dir: Path, name: str, **values: object) -> str:
+    return get_registry(prompts_dir).get(name).render(**values)
@@ -0,0 +1,325 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+import os
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .cache import ResponseCache
+from .llm import LLMClient, LLMConfig, LLMError
+
+DEFAULT_ROUTE = "default"
+# Per-endpoint keys handled by the router rather than passed on to LLMConfig.
+_ROUTER_KEYS = {"base_url", "model", "api_key_env", "weight", "max_concurrency"}
+_CONFIG_FIELDS = {f.name for f in dataclasses.fields(LLMConfig)} - {"api_key", "base_url", "model"}
+
+
+class RoutingError(LLMError):
+    pass
+
+
+@dataclass
+class EndpointStats:
+    requests: int = 0
+    failures: int = 0
+    # Calls this endpoint answered after an earlier endpoint of the route had failed.
+    failovers: int = 0
+    in_flight: int = 0
+
+    def as_dict(self) -> dict:
+        return dataclasses.asdict(self)
+
+
+class Endpoint:
+    """One base_url + model with its own client (session, scheduler, breaker) and slot limit."""
+
+    def __init__(
+        self, name: str, client: LLMClient, *, weight: int = 1, max_concurrency: int = 0
+    ) -> None:
+        self.name = name
+        self.client = client
+        self.weight = weight
+        self.max_concurrency = max_concurrency
+        self.stats = EndpointStats()
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self._lock = threading.Lock()
+
+    @property
+    def healthy(self) -> bool:
+        # An open breaker would reject the call immediately; half-open may take a probe.
+        return self.client.scheduler.circuit_state != "open"
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        if self._slots is not None:
+            self._slots.acquire()
+        with self._lock:
+            self.stats.requests += 1
+            self.stats.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.stats.in_flight -= 1
+            if self._slots is not None:
+                self._slots.release()
+
+    def note(self, *, failed: bool = False, failover: bool = False) -> None:
+        with self._lock:
+            self.stats.failures += failed
+            self.stats.failovers += failover
+
+
+@dataclass
+class RouteEntry:
+    endpoint: Endpoint
+    # 0 makes the entry failover-only.
+    weight: int
+    current: int = 0
+
+
+@dataclass
+class Route:
+    entries: list[RouteEntry] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def order(self) -> list[Endpoint]:
+        """Endpoints to try for one call: a weighted pick among the healthy entries, then the
+        remaining healthy entries in configured order, then the unhealthy ones."""
+        healthy = [e for e in self.entries if e.endpoint.healthy]
+        with self._lock:
+            # Smooth weighted round-robin (as in nginx): deterministic and evenly interleaved.
+            weighted = [e for e in healthy if e.weight > 0]
+            first = None
+            if weighted:
+                total = sum(e.weight for e in weighted)
+                for e in weighted:
+                    e.current += e.weight
+                first = max(weighted, key=lambda e: e.current)
+                first.current -= total
+        ordered = [first] if first is not None else []
+        ordered += [e for e in healthy if e is not first]
+        ordered += [e for e in self.entries if e not in healthy]
+        return [e.endpoint for e in ordered]
+
+
+class LLMRouter:
+    """Drop-in for LLMClient that sends each prompt to its own endpoints and models.
+
+    Routes map a prompt name (``CODE_VALIDATOR``, ``BACKEND_GENERATOR``, ...) to an ordered
+    list of endpoints. Calls are spread across the entries by weight; when an endpoint fails
+    (after its own retries) or its circuit breaker is open, the next one in the list is
+    tried. Prompts without a route use the ``default`` route, or every endpoint in
+    declaration order when there is none.
+    """
+
+    def __init__(
+        self,
+        endpoints: dict[str, Endpoint],
+        routes: dict[str, list[tuple[str, int | None]]],
+        *,
+        cache: ResponseCache | None = None,
+    ) -> None:
+        if not endpoints:
+            raise RoutingError("Routing config defines no endpoints")
+        self.endpoints = endpoints
+        self.cache = cache
+        self.routes: dict[str, Route] = {}
+        for prompt, entries in routes.items():
+            if not entries:
+                raise RoutingError(f"Route {prompt!r} lists no endpoints")
+            route = Route()
+            for name, weight in entries:
+                if name not in endpoints:
+                    raise RoutingError(f"Route {prompt!r} uses unknown endpoint {name!r}")
+                ep = endpoints[name]
+                route.entries.append(RouteEntry(ep, ep.weight if weight is None else weight))
+            self.routes[prompt] = route
+        if DEFAULT_ROUTE not in self.routes:
+            self.routes[DEFAULT_ROUTE] = Route(
+                [RouteEntry(ep, ep.weight) for ep in endpoints.values()]
+            )
+
+    @classmethod
+    def from_dict(
+        cls, data: dict, *, cache: ResponseCache | None = None, min_pool_maxsize: int = 0
+    ) -> LLMRouter:
+        """Build from ``{"endpoints": {name: {...}}, "routes": {prompt: [...]}}``.
+
+        An endpoint takes base_url, model, api_key_env (default OPENAI_API_KEY), weight,
+        max_concurrency and any other LLMConfig field. A route entry is an endpoint name or
+        ``{"endpoint": name, "weight": n}``.
+        """
+        raw_endpoints = data.get("endpoints")
+        if not isinstance(raw_endpoints, dict):
+            raise RoutingError("Routing config needs an 'endpoints' object")
+        endpoints: dict[str, Endpoint] = {}
+        for name, spec in raw_endpoints.items():
+            endpoints[name] = _build_endpoint(name, spec, cache, min_pool_maxsize)
+
+        routes: dict[str, list[tuple[str, int | None]]] = {}
+        for prompt, entries in (data.get("routes") or {}).items():
+            if not isinstance(entries, list):
+                raise RoutingError(f"Route {prompt!r} must be a list")
+            parsed: list[tuple[str, int | None]] = []
+            for entry in entries:
+                if isinstance(entry, str):
+                    parsed.append((entry, None))
+                elif isinstance(entry, dict) and isinstance(entry.get("endpoint"), str):
+                    parsed.append((entry["endpoint"], _non_negative(entry, "weight", None)))
+                else:
+                    raise RoutingError(f"Bad entry in route {prompt!r}: {entry!r}")
+            routes[prompt] = parsed
+        return cls(endpoints, routes, cache=cache)
+
+    @classmethod
+    def from_file(
+        cls, path: Path, *, cache: ResponseCache | None = None, min_pool_maxsize: int = 0
+    ) -> LLMRouter:
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            raise RoutingError(f"Cannot read routing config {path}: {exc}") from exc
+        if not isinstance(data, dict):
+            raise RoutingError(f"Routing config {path} must be a JSON object")
+        return cls.from_dict(data, cache=cache, min_pool_maxsize=min_pool_maxsize)
+
+    def route(self, prompt: str | None) -> Route:
+        return self.routes.get(prompt or DEFAULT_ROUTE) or self.routes[DEFAULT_ROUTE]
+
+    def chat_completion(
+        self,
+        *,
+        system: str,
+        user: str,
+        temperature: float = 0.0,
+        refresh_cache: bool = False,
+        prompt: str | None = None,
+        json_output: bool = False,
+        stable_prefix: int = 0,
+    ) -> str:
+        last_err: LLMError | None = None
+        for i, ep in enumerate(self.route(prompt).order()):
+            try:
+                with ep.slot():
+                    out = ep.client.chat_completion(
+                        system=system,
+                        user=user,
+                        temperature=temperature,
+                        refresh_cache=refresh_cache,
+                        prompt=prompt,
+                        json_output=json_output,
+                        stable_prefix=stable_prefix,
+                    )
+            except LLMError as exc:
+                ep.note(failed=True)
+                last_err = exc
+                continue
+            ep.note(failover=i > 0)
+            return out
+        raise LLMError(f"All endpoints failed for {prompt or DEFAULT_ROUTE}: {last_err}")
+
+    def stream_chat_completion(
+        self,
+        *,
+        system: str,
+        user: str,
+        temperature: float = 0.0,
+        refresh_cache: bool = False,
+        prompt: str | None = None,
+    ) -> Iterator[str]:
+        """Fails over like chat_completion, but only until the first chunk has been yielded."""
+        last_err: LLMError | None = None
+        for i, ep in enumerate(self.route(prompt).order()):
+            started = False
+            try:
+                with ep.slot():
+                    for chunk in ep.client.stream_chat_completion(
+                        system=system,
+                        user=user,
+                        temperature=temperature,
+                        refresh_cache=refresh_cache,
+                        prompt=prompt,
+                    ):
+                        started = True
+                        yield chunk
+            except LLMError as exc:
+                ep.note(failed=True)
+                if started:
+                    raise
+                last_err = exc
+                continue
+            ep.note(failover=i > 0)
+            return
+        raise LLMError(f"All endpoints failed for {prompt or DEFAULT_ROUTE}: {last_err}")
+
+    def cache_stats(self) -> dict:
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats.as_dict()}
+
+    def scheduler_stats(self) -> dict:
+        return {name: ep.client.scheduler_stats() for name, ep in self.endpoints.items()}
+
+    def hedge_stats(self) -> dict:
+        return {name: ep.client.hedge_stats() for name, ep in self.endpoints.items()}
+
+    def routing_stats(self) -> dict:
+        return {
+            name: {**ep.stats.as_dict(), "healthy": ep.healthy}
+            for name, ep in self.endpoints.items()
+        }
+
+    def close(self) -> None:
+        for ep in self.endpoints.values():
+            ep.client.close()
+
+    def __enter__(self) -> LLMRouter:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+def _non_negative(spec: dict, key: str, default: int | None) -> int | None:
+    value = spec.get(key, default)
+    if value is None:
+        return None
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        raise RoutingError(f"{key} must be a non-negative integer, got {value!r}")
+    return value
+
+
+def _build_endpoint(
+    name: str, spec: object, cache: ResponseCache | None, min_pool_maxsize: int
+) -> Endpoint:
+    if not isinstance(spec, dict):
+        raise RoutingError(f"Endpoint {name!r} must be an object")
+    unknown = set(spec) - _ROUTER_KEYS - _CONFIG_FIELDS
+    if unknown:
+        raise RoutingError(f"Endpoint {name!r} has unknown keys: {', '.join(sorted(unknown))}")
+    if not spec.get("base_url") or not spec.get("model"):
+        raise RoutingError(f"Endpoint {name!r} needs base_url and model")
+    key_env = spec.get("api_key_env", "OPENAI_API_KEY")
+    api_key = os.environ.get(key_env, "").strip()
+    if not api_key:
+        raise RoutingError(f"Endpoint {name!r}: {key_env} is required")
+
+    config = LLMConfig(
+        api_key=api_key,
+        base_url=str(spec["base_url"]).rstrip("/"),
+        model=str(spec["model"]),
+        **{k: v for k, v in spec.items() if k in _CONFIG_FIELDS},
+    )
+    if config.pool_maxsize < min_pool_maxsize:
+        config = dataclasses.replace(config, pool_maxsize=min_pool_maxsize)
+    return Endpoint(
+        name,
+        LLMClient(config, cache=cache),
+        weight=_non_negative(spec, "weight", 1) or 0,
+        max_concurrency=_non_negative(spec, "max_concurrency", 0) or 0,
+    )
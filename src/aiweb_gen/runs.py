@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any
+
+RUN_FILE = "run.json"
+_RUN_ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,127}$")
+
+
+class RunError(RuntimeError):
+    pass
+
+
+def default_runs_dir() -> Path:
+    override = os.environ.get("AIWEB_RUNS_DIR", "").strip()
+    return Path(override) if override else Path(".aiweb") / "runs"
+
+
+def new_run_id() -> str:
+    return time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+
+
+def _write_json(path: Path, data: Any) -> None:
+    # Temp file + rename so an interrupted run never leaves a truncated checkpoint behind.
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    tmp.write_text(json.dumps(data, indent=2) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class Run:
+    """Checkpoint directory for one generate run: ``<runs_dir>/<run_id>``.
+
+    ``run.json`` holds the idea, the options, the status and the completed stages; every
+    stage's output is stored next to it as ``<stage>.json``. A resumed run loads completed
+    stages instead of repeating their LLM calls.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.id = root.name
+        self.meta: dict = json.loads((root / RUN_FILE).read_text(encoding="utf-8"))
+        # Backend and frontend may finish at the same time under --concurrent.
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(
+        cls, runs_dir: Path, *, idea: str, options: dict, run_id: str | None = None
+    ) -> Run:
+        run_id = run_id or new_run_id()
+        if not _RUN_ID_RE.match(run_id):
+            raise RunError(f"Invalid run id: {run_id!r}")
+        root = runs_dir / run_id
+        try:
+            root.mkdir(parents=True)
+        except FileExistsError as exc:
+            raise RunError(f"Run already exists: {run_id}") from exc
+        now = time.time()
+        meta = {
+            "id": run_id,
+            "created": now,
+            "updated": now,
+            "status": "running",
+            "idea": idea,
+            "options": options,
+            "stages": {},
+        }
+        _write_json(root / RUN_FILE, meta)
+        return cls(root)
+
+    @classmethod
+    def open(cls, runs_dir: Path, run_id: str) -> Run:
+        if not _RUN_ID_RE.match(run_id):
+            raise RunError(f"Invalid run id: {run_id!r}")
+        root = runs_dir / run_id
+        if not (root / RUN_FILE).is_file():
+            raise RunError(f"Unknown run: {run_id} (looked in {runs_dir})")
+        return cls(root)
+
+    @property
+    def idea(self) -> str:
+        return str(self.meta.get("idea", ""))
+
+    @property
+    def options(self) -> dict:
+        return dict(self.meta.get("options") or {})
+
+    def completed(self, stage: str) -> bool:
+        return stage in self.meta.get("stages", {}) and (self.root / f"{stage}.json").is_file()
+
+    def load(self, stage: str) -> Any | None:
+        """The saved output of a completed stage, or None."""
+        if not self.completed(stage):
+            return None
+        return json.loads((self.root / f"{stage}.json").read_text(encoding="utf-8"))
+
+    def save(self, stage: str, data: Any) -> None:
+        _write_json(self.root / f"{stage}.json", data)
+        with self._lock:
+            self.meta.setdefault("stages", {})[stage] = time.time()
+            self._flush()
+
+    def update(self, **fields: Any) -> None:
+        with self._lock:
+            self.meta.update(fields)
+            self._flush()
+
+    def _flush(self) -> None:
+        self.meta["updated"] = time.time()
+        _write_json(self.root / RUN_FILE, self.meta)
+
+
+def list_runs(runs_dir: Path) -> list[dict]:
+    """Summaries of every run under runs_dir, newest first."""
+    if not runs_dir.is_dir():
+        return []
+    runs: list[dict] = []
+    for entry in runs_dir.iterdir():
+        try:
+            meta = json.loads((entry / RUN_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        runs.append(
+            {
+                "id": meta.get("id", entry.name),
+                "status": meta.get("status"),
+                "created": meta.get("created"),
+                "updated": meta.get("updated"),
+                "idea": meta.get("idea"),
+                "stages": sorted(meta.get("stages") or {}),
+                **({"error": meta["error"]} if meta.get("error") else {}),
+            }
+        )
+    runs.sort(key=lambda r: r.get("created") or 0, reverse=True)
+    return runs
@@ -0,0 +1,324 @@
+from __future__ import annotations
+
+import math
+import os
+import re
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+from .defaults import DEFAULT_CONTEXT_TOKENS
+
+# Rough chars-per-token ratio for code; only used for budgeting, never for billing.
+CHARS_PER_TOKEN = 4
+
+_SNIFF_BYTES = 8192
+# Extra weight for query terms that appear in a file's path or its declared symbols.
+_PATH_WEIGHT = 3
+_SYMBOL_WEIGHT = 2
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+_WORD_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|[0-9]+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+_SYMBOL_RE = re.compile(
+    r"^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?"
+    r"(?:def|class|function|interface|type|enum|const|let|var)\s+([A-Za-z_$][\w$]*)",
+    re.MULTILINE,
+)
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from in into is it of on or the to with this that add "
+    "make use when should must can".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased terms, with snake_case and camelCase identifiers also split into parts."""
+    terms: list[str] = []
+    for word in _WORD_RE.findall(text):
+        lower = word.lower().strip("_")
+        parts = [p.lower() for piece in word.split("_") for p in _CAMEL_RE.findall(piece)]
+        for term in (lower, *parts) if len(parts) > 1 else (lower,):
+            if len(term) > 1 and term not in _STOPWORDS:
+                terms.append(term)
+    return terms
+
+
+def extract_symbols(content: str) -> list[str]:
+    return _SYMBOL_RE.findall(content)
+
+
+def estimate_tokens(n_chars: int) -> int:
+    return max(1, math.ceil(n_chars / CHARS_PER_TOKEN))
+
+
+def is_probably_binary(head: bytes) -> bool:
+    if b"\0" in head:
+        return True
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as exc:
+        # A multi-byte character cut off at the end of the sniffed window is fine.
+        return exc.start < len(head) - 3
+    return False
+
+
+class GitIgnore:
+    """Matcher for the common subset of .gitignore syntax.
+
+    Supports comments, negation (!), directory-only patterns (trailing /), anchored patterns
+    (leading or inner /), * ? [..] and **. Patterns from nested .gitignore files apply to
+    their own subtree; later patterns override earlier ones.
+    """
+
+    def __init__(self) -> None:
+        self._rules: list[tuple[str, re.Pattern[str], bool, bool]] = []
+
+    def add_file(self, gitignore: Path, base: str) -> None:
+        try:
+            lines = gitignore.read_text(encoding="utf-8").splitlines()
+        except (OSError, UnicodeDecodeError):
+            return
+        for line in lines:
+            self.add_pattern(line, base)
+
+    def add_pattern(self, line: str, base: str = "") -> None:
+        pattern = line.rstrip()
+        if not pattern or pattern.startswith("#"):
+            return
+        negate = pattern.startswith("!")
+        if negate:
+            pattern = pattern[1:]
+        pattern = pattern.removeprefix("\\")
+        dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        if not pattern:
+            return
+        anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+        regex = _glob_to_regex(pattern)
+        if not anchored:
+            regex = f"(?:.*/)?{regex}"
+        self._rules.append((base, re.compile(f"^{regex}$"), negate, dir_only))
+
+    def ignored(self, rel_path: str, *, is_dir: bool) -> bool:
+        result = False
+        for base, regex, negate, dir_only in self._rules:
+            if dir_only and not is_dir:
+                continue
+            if base:
+                if not rel_path.startswith(base + "/"):
+                    continue
+                candidate = rel_path[len(base) + 1 :]
+            else:
+                candidate = rel_path
+            if regex.match(candidate):
+                result = not negate
+        return result
+
+
+def _glob_to_regex(pattern: str) -> str:
+    out: list[str] = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("/.*")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+                i += 1
+            else:
+                body = pattern[i + 1 : end].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = end + 1
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+
+def iter_candidate_files(root: Path) -> Iterator[tuple[str, Path]]:
+    """Yield (relative posix path, path) for files under root that are not ignored.
+
+    Skips hidden files and directories (including .git) and anything matched by .gitignore.
+    Content is not read here; binary detection happens when a file is loaded.
+    """
+    ignore = GitIgnore()
+    stack: list[tuple[Path, str]] = [(root, "")]
+    while stack:
+        directory, rel_dir = stack.pop()
+        gitignore = directory / ".gitignore"
+        if gitignore.is_file():
+            ignore.add_file(gitignore, rel_dir)
+        try:
+            entries = sorted(os.scandir(directory), key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirs: list[tuple[Path, str]] = []
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                is_file = entry.is_file()
+            except OSError:
+                continue
+            if is_dir:
+                if not ignore.ignored(rel, is_dir=True):
+                    subdirs.append((Path(entry.path), rel))
+            elif is_file and not ignore.ignored(rel, is_dir=False):
+                yield rel, Path(entry.path)
+        stack.extend(reversed(subdirs))
+
+
+def decode_text(raw: bytes) -> str | None:
+    """Return the text of raw file bytes, or None for binary / non-UTF-8 content."""
+    if is_probably_binary(raw[:_SNIFF_BYTES]):
+        return None
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+
+def read_text_file(path: Path) -> str | None:
+    try:
+        raw = path.read_bytes()
+    except OSError:
+        return None
+    return decode_text(raw)
+
+
+@dataclass(frozen=True)
+class Document:
+    path: str
+    chars: int
+    # Weighted term frequencies; may be restricted to the query terms (see RepoIndex).
+    terms: dict[str, int]
+    # Total weighted term count of the full document, used for BM25 length normalisation.
+    length: int
+
+
+def build_document(path: str, content: str) -> Document:
+    terms = Counter(tokenize(content))
+    for term in tokenize(path):
+        terms[term] += _PATH_WEIGHT
+    for symbol in extract_symbols(content):
+        for term in tokenize(symbol):
+            terms[term] += _SYMBOL_WEIGHT
+    return Document(path=path, chars=len(content), terms=dict(terms), length=sum(terms.values()))
+
+
+def rank_documents(docs: list[Document], query: str) -> list[tuple[Document, float]]:
+    """Score documents against the query with BM25; highest score first, ties by path."""
+    query_terms = set(tokenize(query))
+    if not docs:
+        return []
+
+    avg_len = (sum(d.length for d in docs) / len(docs)) or 1.0
+    n_docs = len(docs)
+    df = {t: sum(1 for d in docs if t in d.terms) for t in query_terms}
+
+    scored: list[tuple[Document, float]] = []
+    for doc in docs:
+        length = doc.length
+        score = 0.0
+        for term in query_terms:
+            tf = doc.terms.get(term, 0)
+            if not tf:
+                continue
+            idf = math.log(1 + (n_docs - df[term] + 0.5) / (df[term] + 0.5))
+            norm = tf + _BM25_K1 * (1 - _BM25_B + _BM25_B * length / avg_len)
+            score += idf * tf * (_BM25_K1 + 1) / norm
+        scored.append((doc, score))
+    scored.sort(key=lambda item: (-item[1], item[0].path))
+    return scored
+
+
+@dataclass(frozen=True)
+class SelectedFile:
+    path: str
+    content: str
+    score: float
+    tokens: int
+
+
+@dataclass(frozen=True)
+class Selection:
+    files: list[SelectedFile]
+    omitted: list[str]
+    budget_tokens: int
+    used_tokens: int
+
+    def report(self) -> dict:
+        return {
+            "budget_tokens": self.budget_tokens,
+            "used_tokens": self.used_tokens,
+            "included": [
+                {"path": f.path, "score": round(f.score, 3), "tokens": f.tokens} for f in self.files
+            ],
+            "omitted_count": len(self.omitted),
+        }
+
+
+def format_file_context(path: str, content: str) -> str:
+    return f"=== FILE: {path} ===\n{content}\n"
+
+
+def pack_documents(
+    ranked: Iterable[tuple[Document, float]],
+    *,
+    token_budget: int,
+    load: Callable[[str], str | None],
+) -> Selection:
+    """Greedily pack ranked files into the budget; files that do not fit are skipped."""
+    files: list[SelectedFile] = []
+    omitted: list[str] = []
+    used = 0
+    for doc, score in ranked:
+        # Cheap pre-check from the recorded size before reading the file.
+        if used + estimate_tokens(doc.chars) > token_budget:
+            omitted.append(doc.path)
+            continue
+        content = load(doc.path)
+        if content is None:
+            continue
+        tokens = estimate_tokens(len(format_file_context(doc.path, content)))
+        if used + tokens > token_budget:
+            omitted.append(doc.path)
+            continue
+        files.append(SelectedFile(path=doc.path, content=content, score=score, tokens=tokens))
+        used += tokens
+    return Selection(files=files, omitted=omitted, budget_tokens=token_budget, used_tokens=used)
+
+
+def select_files(root: Path, query: str, *, token_budget: int = DEFAULT_CONTEXT_TOKENS) -> Selection:
+    """Rank the text files under root against the query and pack the best into the budget."""
+    contents: dict[str, str] = {}
+    docs: list[Document] = []
+    for rel, path in iter_candidate_files(root):
+        content = read_text_file(path)
+        if content is None:
+            continue
+        contents[rel] = content
+        docs.append(build_document(rel, content))
+    return pack_documents(rank_documents(docs, query), token_budget=token_budget, load=contents.get)
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import posixpath
+
+from .defaults import env_limit
+from .parsing import FileBlock, format_file_blocks
+from .selector import estimate_tokens
+from .static_validate import local_imports
+
+# Roughly a quarter of a typical context window, leaving room for the prompt and the report.
+DEFAULT_SHARD_TOKENS = 24_000
+DEFAULT_SHARD_CONCURRENCY = 4
+
+
+def shard_limits_from_env() -> tuple[int, int]:
+    """(max tokens per shard, concurrent shard validations) from the environment."""
+    return (
+        env_limit("AIWEB_VALIDATOR_SHARD_TOKENS", DEFAULT_SHARD_TOKENS),
+        env_limit("AIWEB_VALIDATOR_CONCURRENCY", DEFAULT_SHARD_CONCURRENCY),
+    )
+
+
+def _directory_order(path: str) -> tuple[str, str]:
+    return posixpath.dirname(path), path
+
+
+def shard_blocks(
+    blocks: list[FileBlock], *, max_tokens: int = DEFAULT_SHARD_TOKENS
+) -> list[list[FileBlock]]:
+    """Split a generated bundle into size-bounded groups of related files.
+
+    Files connected by relative imports stay in the same shard where the size allows, and
+    groups are packed in directory order so neighbouring files tend to share a shard. A
+    group larger than max_tokens is split along directory order; a single file larger than
+    max_tokens gets a shard of its own.
+    """
+    by_path: dict[str, FileBlock] = {}
+    for block in blocks:
+        by_path[block.path] = block
+    paths = frozenset(by_path)
+
+    parent = {p: p for p in by_path}
+
+    def find(p: str) -> str:
+        while parent[p] != p:
+            parent[p] = parent[parent[p]]
+            p = parent[p]
+        return p
+
+    for block in by_path.values():
+        for dep in local_imports(block.path, block.content, paths):
+            a, b = find(block.path), find(dep)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+
+    groups: dict[str, list[str]] = {}
+    for p in by_path:
+        groups.setdefault(find(p), []).append(p)
+    components = sorted(
+        (sorted(g, key=_directory_order) for g in groups.values()),
+        key=lambda g: _directory_order(g[0]),
+    )
+
+    cost = {p: estimate_tokens(len(format_file_blocks([b]))) for p, b in by_path.items()}
+    shards: list[list[FileBlock]] = []
+    current: list[FileBlock] = []
+    used = 0
+    for component in components:
+        # An oversized group is packed file by file, still in directory order.
+        if sum(cost[p] for p in component) <= max_tokens:
+            pieces = [component]
+        else:
+            pieces = [[p] for p in component]
+        for piece in pieces:
+            tokens = sum(cost[q] for q in piece)
+            if current and used + tokens > max_tokens:
+                shards.append(current)
+                current, used = [], 0
+            current.extend(by_path[q] for q in piece)
+            used += tokens
+    if current:
+        shards.append(current)
+    return shards
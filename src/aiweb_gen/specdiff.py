@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+
+SECTIONS = ("pages", "components", "database_models", "api_endpoints")
+# Top-level keys whose change touches every generated file; incremental mode rebuilds fully.
+GLOBAL_KEYS = ("app_name", "tech_stack")
+# Spec sections each generated branch is built from.
+BRANCH_SECTIONS = {
+    "backend": ("database_models", "api_endpoints"),
+    "frontend": ("pages", "components", "api_endpoints"),
+}
+
+
+def _canonical(value: object) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def item_key(section: str, item: object) -> str:
+    """Stable identity of a spec entry, so a renamed field is a change rather than add+remove."""
+    if isinstance(item, dict):
+        if section == "api_endpoints" and item.get("path"):
+            return f"{str(item.get('method', '')).upper()} {item['path']}".strip()
+        for key in ("name", "route", "path", "title", "id"):
+            if item.get(key):
+                return str(item[key])
+    elif isinstance(item, str):
+        return item
+    return _canonical(item)
+
+
+def _keyed(section: str, items: object) -> dict[str, object]:
+    keyed: dict[str, object] = {}
+    for item in items if isinstance(items, list) else []:
+        key = base = item_key(section, item)
+        n = 2
+        while key in keyed:
+            key = f"{base}#{n}"
+            n += 1
+        keyed[key] = item
+    return keyed
+
+
+@dataclass(frozen=True)
+class SectionDiff:
+    added: list = field(default_factory=list)
+    changed: list = field(default_factory=list)
+    removed: list = field(default_factory=list)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.added or self.changed or self.removed)
+
+    def as_dict(self) -> dict:
+        return {"added": self.added, "changed": self.changed, "removed": self.removed}
+
+
+@dataclass(frozen=True)
+class SpecDiff:
+    sections: dict[str, SectionDiff]
+    # Changed keys from GLOBAL_KEYS.
+    global_changes: list[str] = field(default_factory=list)
+    # Other changed top-level keys (description, non_functional_requirements, ...).
+    other_changes: list[str] = field(default_factory=list)
+
+    @property
+    def full_rebuild(self) -> bool:
+        return bool(self.global_changes)
+
+    @property
+    def empty(self) -> bool:
+        return not self.global_changes and all(d.empty for d in self.sections.values())
+
+    def affects(self, branch: str) -> bool:
+        return any(not self.sections[s].empty for s in BRANCH_SECTIONS[branch])
+
+    def for_branch(self, branch: str) -> dict:
+        """The changed entries of the sections a branch is built from, as JSON-ready data."""
+        return {
+            s: self.sections[s].as_dict()
+            for s in BRANCH_SECTIONS[branch]
+            if not self.sections[s].empty
+        }
+
+    def changed_names(self, branch: str) -> list[str]:
+        names: list[str] = []
+        for s in BRANCH_SECTIONS[branch]:
+            d = self.sections[s]
+            names.extend(item_key(s, item) for item in (*d.added, *d.changed, *d.removed))
+        return names
+
+    def summary(self) -> dict:
+        return {
+            "full_rebuild": self.full_rebuild,
+            "global_changes": self.global_changes,
+            "other_changes": self.other_changes,
+            "sections": {
+                s: {k: len(v) for k, v in d.as_dict().items()} for s, d in self.sections.items()
+            },
+        }
+
+
+def diff_specs(old: dict, new: dict) -> SpecDiff:
+    """Structural diff of two architect specs, entry by entry within each section."""
+    sections: dict[str, SectionDiff] = {}
+    for section in SECTIONS:
+        before = _keyed(section, old.get(section))
+        after = _keyed(section, new.get(section))
+        sections[section] = SectionDiff(
+            added=[after[k] for k in after if k not in before],
+            changed=[
+                item
+                for k, item in after.items()
+                if k in before and _canonical(item) != _canonical(before[k])
+            ],
+            removed=[before[k] for k in before if k not in after],
+        )
+
+    top_level = (set(old) | set(new)) - set(SECTIONS)
+    changed = sorted(k for k in top_level if _canonical(old.get(k)) != _canonical(new.get(k)))
+    return SpecDiff(
+        sections=sections,
+        global_changes=[k for k in changed if k in GLOBAL_KEYS],
+        other_changes=[k for k in changed if k not in GLOBAL_KEYS],
+    )
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import ast
+import json
+import multiprocessing
+import posixpath
+import re
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from .parsing import FileBlock
+
+try:  # Python 3.11+
+    import tomllib
+except ModuleNotFoundError:  # pragma: no cover - Python 3.10
+    tomllib = None  # type: ignore[assignment]
+
+try:
+    import yaml  # type: ignore[import-untyped]
+except ModuleNotFoundError:
+    yaml = None
+
+# Below this much work a process pool costs more to start than the checks themselves.
+_POOL_MIN_FILES = 32
+_POOL_MIN_CHARS = 256_000
+
+_JS_EXTENSIONS = (".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs")
+# Extensions a bundler resolves for an extension-less relative import, in lookup order.
+_JS_RESOLVE_EXTENSIONS = (*_JS_EXTENSIONS, ".json", ".vue", ".svelte", ".css", ".scss")
+_JS_IMPORT_RE = re.compile(
+    r"""(?:\bimport\s+(?:[^'";]*?\s+from\s+)?|\bexport\s+[^'";]*?\s+from\s+|"""
+    r"""\brequire\s*\(\s*|\bimport\s*\(\s*)['"](\.{1,2}/[^'"]*)['"]"""
+)
+_HTML_REF_RE = re.compile(r"""\b(?:src|href)\s*=\s*['"]([^'"]+)['"]""", re.IGNORECASE)
+_CSS_IMPORT_RE = re.compile(r"""@import\s+(?:url\(\s*)?['"]?(\.{1,2}/[^'")\s;]+)""")
+_EXTERNAL_REF_RE = re.compile(r"^(?:[a-z][a-z0-9+.-]*:|//|#|\{|\$)", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class Issue:
+    file: str
+    severity: str
+    description: str
+
+    def as_dict(self) -> dict:
+        return {"file": self.file, "severity": self.severity, "description": self.description}
+
+
+def _python_module_path(module: str, package_dir: str, paths: frozenset[str]) -> str | None:
+    """The generated file a relative module name resolves to, or None."""
+    base = posixpath.normpath(posixpath.join(package_dir, *module.split(".")))
+    base = "" if base == "." else base
+    prefix = f"{base}/" if base else ""
+    if f"{base}.py" in paths:
+        return f"{base}.py"
+    if f"{prefix}__init__.py" in paths:
+        return f"{prefix}__init__.py"
+    # Namespace package: any generated file below the directory counts.
+    if prefix:
+        return next((p for p in sorted(paths) if p.startswith(prefix)), None)
+    return None
+
+
+def _python_relative_imports(
+    path: str, tree: ast.AST, paths: frozenset[str]
+) -> Iterator[tuple[str, int, str | None]]:
+    """Yield (import as written, line, resolved path or None) for each relative import."""
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.ImportFrom) or node.level == 0:
+            continue
+        package_dir = posixpath.dirname(path)
+        for _ in range(node.level - 1):
+            package_dir = posixpath.dirname(package_dir)
+        dots = "." * node.level
+        if node.module:
+            resolved = _python_module_path(node.module, package_dir, paths)
+            yield dots + node.module, node.lineno, resolved
+            continue
+        # from . import name: each name is a submodule or something defined in __init__.py.
+        init = posixpath.join(package_dir, "__init__.py") if package_dir else "__init__.py"
+        for alias in node.names:
+            resolved = _python_module_path(alias.name, package_dir, paths)
+            if resolved is None and init in paths:
+                resolved = init
+            yield f"{dots} {alias.name}", node.lineno, resolved
+
+
+def _check_python(path: str, content: str, paths: frozenset[str]) -> list[Issue]:
+    try:
+        tree = ast.parse(content, filename=path)
+    except SyntaxError as exc:
+        return [Issue(path, "high", f"Syntax error at line {exc.lineno}: {exc.msg}")]
+    return [
+        Issue(path, "high", f"Missing import: {name} (line {line})")
+        for name, line, resolved in _python_relative_imports(path, tree, paths)
+        if resolved is None
+    ]
+
+
+def _resolve_js(spec: str, from_dir: str, paths: frozenset[str]) -> str | None:
+    target = posixpath.normpath(posixpath.join(from_dir, spec))
+    candidates = [target]
+    stem, ext = posixpath.splitext(target)
+    # TypeScript lets "./x.js" refer to the source file "./x.ts".
+    if ext in (".js", ".jsx", ".mjs", ".cjs"):
+        candidates += [stem + ".ts", stem + ".tsx", stem + ".mts", stem + ".cts"]
+    candidates += [target + e for e in _JS_RESOLVE_EXTENSIONS]
+    candidates += [posixpath.join(target, "index" + e) for e in _JS_RESOLVE_EXTENSIONS]
+    return next((c for c in candidates if c in paths), None)
+
+
+def _js_relative_imports(
+    path: str, content: str, paths: frozenset[str]
+) -> Iterator[tuple[str, int, str | None]]:
+    from_dir = posixpath.dirname(path)
+    for match in _JS_IMPORT_RE.finditer(content):
+        spec = match.group(1).split("?", 1)[0]
+        line = content.count("\n", 0, match.start()) + 1
+        yield spec, line, _resolve_js(spec, from_dir, paths)
+
+
+def _check_js(path: str, content: str, paths: frozenset[str]) -> list[Issue]:
+    return [
+        Issue(path, "high", f"Missing import: {spec} (line {line})")
+        for spec, line, resolved in _js_relative_imports(path, content, paths)
+        if resolved is None
+    ]
+
+
+def local_imports(path: str, content: str, paths: frozenset[str]) -> list[str]:
+    """Generated files that path imports through relative Python or JS/TS imports."""
+    lower = path.lower()
+    if lower.endswith(".py"):
+        try:
+            tree = ast.parse(content, filename=path)
+        except SyntaxError:
+            return []
+        found = _python_relative_imports(path, tree, paths)
+    elif lower.endswith(_JS_EXTENSIONS):
+        found = _js_relative_imports(path, content, paths)
+    else:
+        return []
+    return sorted({resolved for _, _, resolved in found if resolved is not None and resolved != path})
+
+
+def _reference_exists(ref: str, from_dir: str, paths: frozenset[str]) -> bool:
+    ref = ref.split("?", 1)[0].split("#", 1)[0]
+    if not ref:
+        return True
+    if ref.startswith("/"):
+        # Root-relative: served from the bundle root or, with Vite-style tooling, public/.
+        rel = ref.lstrip("/")
+        return rel in paths or f"public/{rel}" in paths
+    return posixpath.normpath(posixpath.join(from_dir, ref)) in paths
+
+
+def _check_references(
+    path: str, content: str, paths: frozenset[str], pattern: re.Pattern[str]
+) -> list[Issue]:
+    from_dir = posixpath.dirname(path)
+    issues: list[Issue] = []
+    for match in pattern.finditer(content):
+        ref = match.group(1).strip()
+        if _EXTERNAL_REF_RE.match(ref):
+            continue
+        if not _reference_exists(ref, from_dir, paths):
+            line = content.count("\n", 0, match.start()) + 1
+            issues.append(Issue(path, "medium", f"Referenced file not found: {ref} (line {line})"))
+    return issues
+
+
+def check_file(path: str, content: str, paths: frozenset[str]) -> list[dict]:
+    """Run every local check that applies to one file; paths is the whole bundle."""
+    lower = path.lower()
+    issues: list[Issue] = []
+    if lower.endswith(".py"):
+        issues = _check_python(path, content, paths)
+    elif lower.endswith(".json"):
+        # tsconfig-style files allow comments and trailing commas; do not second-guess them.
+        if not posixpath.basename(lower).startswith(("tsconfig", "jsconfig")):
+            try:
+                json.loads(content)
+            except json.JSONDecodeError as exc:
+                issues = [Issue(path, "high", f"Invalid JSON at line {exc.lineno}: {exc.msg}")]
+    elif lower.endswith(".toml"):
+        if tomllib is not None:
+            try:
+                tomllib.loads(content)
+            except tomllib.TOMLDecodeError as exc:
+                issues = [Issue(path, "high", f"Invalid TOML: {exc}")]
+    elif lower.endswith((".yaml", ".yml")):
+        if yaml is not None:
+            try:
+                list(yaml.safe_load_all(content))
+            except yaml.YAMLError as exc:
+                issues = [Issue(path, "high", f"Invalid YAML: {exc}".splitlines()[0])]
+    elif lower.endswith(_JS_EXTENSIONS):
+        issues = _check_js(path, content, paths)
+    elif lower.endswith((".html", ".htm")):
+        issues = _check_references(path, content, paths, _HTML_REF_RE)
+    elif lower.endswith((".css", ".scss")):
+        issues = _check_references(path, content, paths, _CSS_IMPORT_RE)
+    return [i.as_dict() for i in issues]
+
+
+def _check_file_args(args: tuple[str, str, frozenset[str]]) -> list[dict]:
+    return check_file(*args)
+
+
+def _pool_context() -> multiprocessing.context.BaseContext:
+    # Validation runs in worker threads (concurrent branches, daemon jobs, batches); fork
+    # would copy locks other threads hold into the children, where they never get released.
+    # forkserver forks from a clean single-threaded server; spawn is what Windows has.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def validate_blocks(
+    blocks: list[FileBlock],
+    *,
+    known_paths: Iterable[str] = (),
+    max_workers: int | None = None,
+) -> dict:
+    """Validate generated files locally and report in the CODE_VALIDATOR schema.
+
+    Checks syntax (Python via ast, JSON, TOML, and YAML when PyYAML is installed), relative
+    imports between the generated files (Python and JS/TS) and files referenced from HTML
+    and CSS. Only high-severity issues make the bundle invalid. Large bundles are checked
+    in a process pool. known_paths lists files that already exist next to the bundle (for
+    an incremental update); imports and references to them count as resolved.
+    """
+    paths = frozenset(b.path for b in blocks).union(known_paths)
+    work = [(b.path, b.content, paths) for b in blocks]
+    large = len(work) >= _POOL_MIN_FILES or sum(len(b.content) for b in blocks) >= _POOL_MIN_CHARS
+    if large and max_workers != 1:
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=_pool_context()) as pool:
+            results = list(pool.map(_check_file_args, work, chunksize=8))
+    else:
+        results = [_check_file_args(w) for w in work]
+
+    issues = [issue for file_issues in results for issue in file_issues]
+    return {
+        "valid": not any(i["severity"] == "high" for i in issues),
+        "issues": issues,
+        "checked_files": len(blocks),
+    }
+
+
+def merge_reports(*reports: dict) -> dict:
+    """Combine validator reports: invalid if any is, issues de-duplicated per file."""
+    seen: set[tuple[str, str]] = set()
+    issues: list[dict] = []
+    for report in reports:
+        for issue in report.get("issues") or []:
+            if not isinstance(issue, dict):
+                continue
+            key = (str(issue.get("file", "")), str(issue.get("description", "")).strip().lower())
+            if key in seen:
+                continue
+            seen.add(key)
+            issues.append(issue)
+    return {"valid": all(bool(r.get("valid", False)) for r in reports), "issues": issues}
@@ -0,0 +1,410 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+Responder = Callable[[dict], str]
+CASSETTE_MATCHES = ("exact", "system")
+
+
+def _echo_responder(payload: dict) -> str:
+    messages = payload.get("messages") or []
+    return str(messages[-1].get("content", "")) if messages else ""
+
+
+def _usage(payload: dict, content: str) -> dict:
+    # Rough 4-chars-per-token estimate; enough for tests and benchmarks to see token counts.
+    prompt_chars = sum(len(str(m.get("content", ""))) for m in payload.get("messages") or [])
+    prompt_tokens = -(-prompt_chars // 4)
+    completion_tokens = -(-len(content) // 4)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _message(payload: dict, role: str) -> str:
+    for m in payload.get("messages") or []:
+        if m.get("role") == role:
+            content = m.get("content", "")
+            if isinstance(content, list):
+                # Content blocks (e.g. with cache_control hints) match like the plain text.
+                return "".join(str(b.get("text", "")) for b in content if isinstance(b, dict))
+            return str(content)
+    return ""
+
+
+class Cassette:
+    """Recorded chat completions, stored as JSON lines of ``{"request": ..., "response": ...}``.
+
+    ``match="exact"`` replays by system + user message; ``match="system"`` only looks at the
+    system prompt, which keeps a cassette usable when user messages vary between runs (spec
+    JSON, file contexts). Several recordings under one key are replayed in order, cycling.
+    """
+
+    def __init__(self, path: Path | None = None, *, match: str = "exact") -> None:
+        if match not in CASSETTE_MATCHES:
+            raise ValueError(f"Unknown cassette match mode: {match}")
+        self.path = path
+        self.match = match
+        self._entries: dict[str, list[str]] = {}
+        self._cursor: dict[str, int] = {}
+        self._lock = threading.Lock()
+        if path is not None and path.is_file():
+            with path.open(encoding="utf-8") as fh:
+                for line in fh:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._index(entry["request"], entry["response"])
+
+    def _key(self, payload: dict) -> str:
+        parts = [_message(payload, "system")]
+        if self.match == "exact":
+            parts.append(_message(payload, "user"))
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    def _index(self, request: dict, response: str) -> None:
+        self._entries.setdefault(self._key(request), []).append(response)
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._entries.values())
+
+    def lookup(self, payload: dict) -> str | None:
+        key = self._key(payload)
+        with self._lock:
+            responses = self._entries.get(key)
+            if not responses:
+                return None
+            i = self._cursor.get(key, 0)
+            self._cursor[key] = i + 1
+            return responses[i % len(responses)]
+
+    def add(self, payload: dict, response: str) -> None:
+        request = {"model": payload.get("model"), "messages": payload.get("messages") or []}
+        with self._lock:
+            self._index(request, response)
+            if self.path is not None:
+                line = json.dumps({"request": request, "response": response}, ensure_ascii=False)
+                with self.path.open("a", encoding="utf-8") as fh:
+                    fh.write(line + "\n")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive between requests.
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; without TCP_NODELAY, Nagle + delayed ACK
+    # would add ~40ms to every response on a reused connection.
+    disable_nagle_algorithm = True
+    server: _StubHTTPServer
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        return
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.stub.record_connection(self.client_address)
+
+    def _send_json(self, status: int, body: dict, headers: dict | None = None) -> None:
+        raw = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+    def _send_stream(self, payload: dict, content: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        stub = self.server.stub
+        size = stub.stream_chunk_chars
+        for start in range(0, len(content), size):
+            stub.generation_delay(content[start : start + size])
+            event = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "model": payload.get("model", "stub"),
+                "choices": [{"index": 0, "delta": {"content": content[start : start + size]}}],
+            }
+            self._write_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        if (payload.get("stream_options") or {}).get("include_usage"):
+            event = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "model": payload.get("model", "stub"),
+                "choices": [],
+                "usage": _usage(payload, content),
+            }
+            self._write_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path.rstrip("/").endswith("/stats"):
+            self._send_json(200, self.server.stub.stats())
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path: {self.path}"}})
+
+    def do_POST(self) -> None:  # noqa: N802
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path: {self.path}"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "Request body is not JSON"}})
+            return
+
+        stub = self.server.stub
+        if stub.record_request():
+            retry_after = f"{stub.retry_after_s:g}"
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached (injected)", "type": "rate_limit"}},
+                headers={"Retry-After": retry_after},
+            )
+            return
+        stub.first_byte_delay()
+        try:
+            content = stub.respond(payload)
+        except LookupError as exc:
+            self._send_json(404, {"error": {"message": str(exc)}})
+            return
+        if payload.get("stream"):
+            self._send_stream(payload, content)
+            return
+        stub.generation_delay(content)
+        self._send_json(
+            200,
+            {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "model": payload.get("model", "stub"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": _usage(payload, content),
+            },
+        )
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    stub: StubServer
+
+
+class StubServer:
+    """Local OpenAI-compatible /chat/completions endpoint for tests and benchmarks.
+
+    Runs in a background thread; use as a context manager and point OPENAI_BASE_URL at
+    ``base_url``. Counts requests and accepted TCP connections so callers can check that
+    keep-alive pooling actually reuses sockets; ``GET <base_url>/stats`` reports them for
+    out-of-process callers.
+
+    Answers come from the cassette when one is given (a miss is a 404, so a replay never
+    silently diverges), from ``upstream`` when recording, and from ``responder`` otherwise.
+    Provider behaviour can be simulated: ``latency_s`` (+ up to ``jitter_s``) before the
+    first byte, ``tokens_per_s`` for generation speed (spread over stream chunks), and a
+    429 with ``Retry-After: retry_after_s`` on every ``rate_limit_every``-th request.
+    """
+
+    def __init__(
+        self,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        responder: Responder | None = None,
+        stream_chunk_chars: int = 16,
+        cassette: Cassette | None = None,
+        upstream: str | None = None,
+        upstream_api_key: str = "",
+        latency_s: float = 0.0,
+        jitter_s: float = 0.0,
+        tokens_per_s: float = 0.0,
+        rate_limit_every: int = 0,
+        retry_after_s: float = 1.0,
+        seed: int | None = None,
+    ) -> None:
+        if upstream and cassette is None:
+            raise ValueError("Recording from upstream needs a cassette to write to")
+        self.responder = responder or _echo_responder
+        self.stream_chunk_chars = stream_chunk_chars
+        self.cassette = cassette
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.upstream_api_key = upstream_api_key
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.tokens_per_s = tokens_per_s
+        self.rate_limit_every = rate_limit_every
+        self.retry_after_s = retry_after_s
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.rate_limited = 0
+        self.cassette_misses = 0
+        self._httpd = _StubHTTPServer((host, port), _Handler)
+        self._httpd.stub = self
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def record_request(self) -> bool:
+        """Count a request; return True if it should be answered with an injected 429."""
+        with self._lock:
+            self.requests += 1
+            if self.rate_limit_every and self.requests % self.rate_limit_every == 0:
+                self.rate_limited += 1
+                return True
+            return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "connections": self.connections,
+                "rate_limited": self.rate_limited,
+                "cassette_misses": self.cassette_misses,
+            }
+
+    def first_byte_delay(self) -> None:
+        delay = self.latency_s
+        if self.jitter_s:
+            with self._lock:
+                delay += self._random.uniform(0.0, self.jitter_s)
+        if delay > 0:
+            time.sleep(delay)
+
+    def generation_delay(self, text: str) -> None:
+        if self.tokens_per_s > 0 and text:
+            time.sleep(-(-len(text) // 4) / self.tokens_per_s)
+
+    def respond(self, payload: dict) -> str:
+        if self.upstream is not None:
+            content = self._fetch_upstream(payload)
+            assert self.cassette is not None
+            self.cassette.add(payload, content)
+            return content
+        if self.cassette is not None:
+            content = self.cassette.lookup(payload)
+            if content is None:
+                with self._lock:
+                    self.cassette_misses += 1
+                raise LookupError("No cassette entry for this request")
+            return content
+        return self.responder(payload)
+
+    def _fetch_upstream(self, payload: dict) -> str:
+        # Imported here: requests is only needed when recording.
+        import requests
+
+        body = {k: v for k, v in payload.items() if k not in ("stream", "stream_options")}
+        resp = requests.post(
+            f"{self.upstream}/chat/completions",
+            json=body,
+            headers={"Authorization": f"Bearer {self.upstream_api_key}"},
+            timeout=300,
+        )
+        resp.raise_for_status()
+        return resp.json()["choices"][0]["message"]["content"]
+
+    def record_connection(self, _address: object) -> None:
+        with self._lock:
+            self.connections += 1
+
+    def start(self) -> StubServer:
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> StubServer:
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="aiweb-gen-stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument(
+        "--cassette", help="JSONL cassette to replay (or to append to with --record)"
+    )
+    parser.add_argument("--match", choices=CASSETTE_MATCHES, default="exact")
+    parser.add_argument(
+        "--record",
+        metavar="UPSTREAM_URL",
+        help="Forward requests to this OpenAI-compatible base URL (key from OPENAI_API_KEY) "
+        "and record the answers into --cassette",
+    )
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before the first byte")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random latency, seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--rate-limit-every", type=int, default=0, metavar="N")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+    if args.record and not args.cassette:
+        parser.error("--record needs --cassette")
+
+    cassette = Cassette(Path(args.cassette), match=args.match) if args.cassette else None
+    server = StubServer(
+        host=args.host,
+        port=args.port,
+        cassette=cassette,
+        upstream=args.record,
+        upstream_api_key=os.environ.get("OPENAI_API_KEY", ""),
+        latency_s=args.latency,
+        jitter_s=args.jitter,
+        tokens_per_s=args.tokens_per_second,
+        rate_limit_every=args.rate_limit_every,
+        retry_after_s=args.retry_after,
+        seed=args.seed,
+    )
+    # Flushed so a parent process can read the URL (port 0 picks a free port).
+    print(f"Serving stub LLM on {server.base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
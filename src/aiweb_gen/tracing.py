@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import contextvars
+import itertools
+import json
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+# Numeric span attributes that roll up into every enclosing span.
+COUNTERS = (
+    "llm_calls",
+    "request_bytes",
+    "response_bytes",
+    "prompt_tokens",
+    "completion_tokens",
+    "http_retries",
+    "hedged_requests",
+    "rate_limited",
+    "throttle_ms",
+    "cache_hits",
+    "cache_misses",
+    "output_repairs",
+    "bytes_written",
+)
+
+
+@dataclass
+class Span:
+    name: str
+    span_id: int
+    parent: Span | None
+    thread_id: int
+    start_ns: int
+    end_ns: int | None = None
+    attrs: dict[str, Any] = field(default_factory=dict)
+    tracer_id: int = 0
+    # Child spans in other threads add to this span's counters concurrently.
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def finish(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.perf_counter_ns()
+
+    def add(self, **counters: int) -> None:
+        """Add counters to this span and every span enclosing it."""
+        current: Span | None = self
+        while current is not None:
+            with current._lock:
+                for key, value in counters.items():
+                    current.attrs[key] = current.attrs.get(key, 0) + value
+            current = current.parent
+
+    def snapshot(self) -> dict[str, Any]:
+        """A copy of attrs that counters still being added cannot change under the reader."""
+        with self._lock:
+            return dict(self.attrs)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.perf_counter_ns()
+        return (end - self.start_ns) / 1e6
+
+
+class Tracer:
+    """Collects timed spans for one run (a CLI invocation or a daemon job).
+
+    Spans nest through a context variable, so LLM calls made anywhere below a stage span are
+    attributed to it (counters roll up to every ancestor). Worker threads must be started
+    with ``run_in_context`` to inherit the current tracer and span.
+    """
+
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._origin_ns = time.perf_counter_ns()
+
+    def start(self, name: str, **attrs: Any) -> Span:
+        """Open a span under the current one without making it current (for generators)."""
+        parent = _current_span.get()
+        span = Span(
+            name=name,
+            span_id=next(self._ids),
+            parent=parent if parent is not None and parent.tracer_id == id(self) else None,
+            thread_id=threading.get_ident(),
+            start_ns=time.perf_counter_ns(),
+            attrs=dict(attrs),
+            tracer_id=id(self),
+        )
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[Span]:
+        span = self.start(name, **attrs)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.attrs["error"] = type(exc).__name__
+            raise
+        finally:
+            span.finish()
+            _current_span.reset(token)
+
+    def summary(self) -> dict:
+        """Per-stage totals keyed by span name, plus counters across all top-level spans."""
+        stages: dict[str, dict[str, Any]] = {}
+        totals: dict[str, Any] = dict.fromkeys(COUNTERS, 0)
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            stage = stages.setdefault(span.name, {"count": 0, "wall_ms": 0.0})
+            stage["count"] += 1
+            stage["wall_ms"] = round(stage["wall_ms"] + span.duration_ms, 3)
+            attrs = span.snapshot()
+            for key in COUNTERS:
+                if key in attrs:
+                    stage[key] = stage.get(key, 0) + attrs[key]
+                    if span.parent is None:
+                        totals[key] += attrs[key]
+        return {"stages": stages, "totals": totals}
+
+    def events(self) -> list[dict]:
+        with self._lock:
+            spans = list(self.spans)
+        return [
+            {
+                "name": s.name,
+                "id": s.span_id,
+                "parent": s.parent.span_id if s.parent else None,
+                "thread": s.thread_id,
+                "start_ms": round((s.start_ns - self._origin_ns) / 1e6, 3),
+                "duration_ms": round(s.duration_ms, 3),
+                "attrs": s.snapshot(),
+            }
+            for s in spans
+        ]
+
+    def to_chrome_trace(self) -> dict:
+        """Trace Event Format, loadable in chrome://tracing or Perfetto."""
+        return {
+            "traceEvents": [
+                {
+                    "name": e["name"],
+                    "ph": "X",
+                    "ts": round(e["start_ms"] * 1000, 1),
+                    "dur": round(e["duration_ms"] * 1000, 1),
+                    "pid": 1,
+                    "tid": e["thread"],
+                    "args": e["attrs"],
+                }
+                for e in self.events()
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def write(self, path: Path, fmt: str = "chrome") -> None:
+        if fmt == "chrome":
+            path.write_text(json.dumps(self.to_chrome_trace()), encoding="utf-8")
+        elif fmt == "jsonl":
+            path.write_text(
+                "".join(json.dumps(e) + "\n" for e in self.events()),
+                encoding="utf-8",
+            )
+        else:
+            raise ValueError(f"Unknown trace format: {fmt}")
+
+
+_current_tracer: contextvars.ContextVar[Tracer | None] = contextvars.ContextVar(
+    "aiweb_tracer", default=None
+)
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar(
+    "aiweb_span", default=None
+)
+
+
+@contextmanager
+def use_tracer(tracer: Tracer) -> Iterator[Tracer]:
+    token = _current_tracer.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _current_tracer.reset(token)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span | None]:
+    """Open a span on the active tracer; a no-op when tracing is off."""
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield None
+        return
+    with tracer.span(name, **attrs) as s:
+        yield s
+
+
+def start_span(name: str, **attrs: Any) -> Span | None:
+    """Like span(), but the caller must call finish(); nothing is made current.
+
+    Generators use this: a context variable set inside one would leak into the consumer
+    between yields.
+    """
+    tracer = _current_tracer.get()
+    return tracer.start(name, **attrs) if tracer is not None else None
+
+
+def record(**counters: int) -> None:
+    """Add counters to the current span and every span enclosing it."""
+    current = _current_span.get()
+    if current is not None:
+        current.add(**counters)
+
+
+def run_in_context(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap fn so a thread-pool worker runs it with the caller's tracer and span."""
+    ctx = contextvars.copy_context()
+
+    def runner(*args: Any, **kwargs: Any) -> Any:
+        return ctx.run(fn, *args, **kwargs)
+
+    return runner
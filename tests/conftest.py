@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import json
+import threading
+
+import pytest
+
+SPEC = {
+    "app_name": "demo",
+    "description": "d",
+    "tech_stack": {},
+    "pages": [],
+    "components": [],
+    "database_models": [],
+    "api_endpoints": [],
+    "non_functional_requirements": [],
+}
+
+
+class FakeClient:
+    """Answers by prompt name; the validator rejects any bundle containing 'BROKEN'."""
+
+    def __init__(self, *, frontend_broken: bool = False) -> None:
+        self.frontend_broken = frontend_broken
+        self.calls: list[str] = []
+        self._lock = threading.Lock()
+
+    def chat_completion(self, *, system: str, user: str, **_: object) -> str:
+        with self._lock:
+            self.calls.append(system)
+        if system == "ARCHITECT_MODE":
+            return json.dumps(SPEC)
+        if system == "BACKEND_GENERATOR":
+            return "=== FILE: main.py ===\nprint('hi')\n"
+        if system == "FRONTEND_GENERATOR":
+            body = "BROKEN" if self.frontend_broken else "export {}"
+            return f"=== FILE: src/main.ts ===\n{body}\n"
+        if system == "CODE_VALIDATOR":
+            return json.dumps({"valid": "BROKEN" not in user, "issues": []})
+        raise AssertionError(f"unexpected prompt {system}")
+
+    def stream_chat_completion(self, *, system: str, user: str, **kwargs: object):
+        text = self.chat_completion(system=system, user=user, **kwargs)
+        yield from (text[i : i + 4] for i in range(0, len(text), 4))
+
+
+@pytest.fixture
+def prompts_dir(tmp_path):
+    d = tmp_path / "prompts"
+    d.mkdir()
+    for name in ("ARCHITECT_MODE", "BACKEND_GENERATOR", "FRONTEND_GENERATOR", "CODE_VALIDATOR"):
+        (d / f"{name}.txt").write_text(name, encoding="utf-8")
+    return d
+
+
+@pytest.fixture
+def make_fake_client():
+    return FakeClient
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import pytest
+
+from aiweb_gen.batch import BatchError, read_batch_items, run_batch
+
+
+def test_read_batch_items_accepts_strings_and_objects():
+    items = read_batch_items(['"todo app"\n', "\n", '{"idea": "crm", "id": "crm-1"}\n'])
+    assert [(i.index, i.id, i.idea) for i in items] == [(0, "1", "todo app"), (1, "crm-1", "crm")]
+
+
+@pytest.mark.parametrize(
+    "line",
+    ["not json", '{"id": "x"}', '{"idea": "a", "id": "../evil"}', "42"],
+)
+def test_read_batch_items_rejects_bad_lines(line):
+    with pytest.raises(BatchError):
+        read_batch_items([line])
+
+
+def test_run_batch_emits_one_record_per_idea(tmp_path, prompts_dir, make_fake_client):
+    items = read_batch_items([f'"idea {n}"' for n in range(5)])
+    records: list[dict] = []
+    summary = run_batch(
+        items,
+        out_dir=tmp_path / "out",
+        prompts_dir=prompts_dir,
+        strict=True,
+        concurrency=3,
+        client=make_fake_client(),
+        emit=records.append,
+    )
+    assert sorted(r["id"] for r in records) == ["1", "2", "3", "4", "5"]
+    assert all(r["ok"] for r in records)
+    assert summary["total"] == 5 and summary["failed"] == 0
+    assert summary["latency_p50_s"] is not None
+    assert (tmp_path / "out" / "3" / "demo" / "spec.json").exists()
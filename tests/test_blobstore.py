@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import json
+import shutil
+import sys
+
+from aiweb_gen import cli
+from aiweb_gen.blobstore import BlobStore
+from aiweb_gen.fsops import bulk_write_files
+
+
+def _app(name: str) -> list[tuple[str, str]]:
+    return [
+        ("package.json", '{"name": "app"}\n'),
+        ("src/main.tsx", "render(<App />)\n"),
+        ("src/App.tsx", f"export const App = () => '{name}'\n"),
+    ]
+
+
+def test_apps_share_blobs_and_rewrites_stay_isolated(tmp_path):
+    store = BlobStore(tmp_path / "store")
+    first = bulk_write_files(tmp_path / "a", _app("a"), store=store)
+    second = bulk_write_files(tmp_path / "b", _app("b"), store=store)
+
+    assert first.bytes_deduped == 0
+    assert second.bytes_deduped == len('{"name": "app"}\n') + len("render(<App />)\n")
+    assert (tmp_path / "a" / "package.json").samefile(tmp_path / "b" / "package.json")
+    assert (tmp_path / "b" / "src" / "App.tsx").read_text(encoding="utf-8").endswith("'b'\n")
+    assert store.stats.as_dict()["reused"] == 2
+
+    # Re-materialising is recognised by inode, without reading the files.
+    again = bulk_write_files(tmp_path / "b", _app("b"), store=store)
+    assert len(again.skipped) == 3 and again.changed == []
+
+    # A changed file is replaced, not edited through the shared inode.
+    files = _app("b")
+    files[0] = ("package.json", '{"name": "b"}\n')
+    bulk_write_files(tmp_path / "b", files, store=store)
+    assert (tmp_path / "a" / "package.json").read_text(encoding="utf-8") == '{"name": "app"}\n'
+
+    usage = store.usage().as_dict()
+    assert usage["blobs"] == 5
+    assert usage["linked_files"] == 6
+    assert usage["saved_bytes"] == len("render(<App />)\n")
+
+
+def test_gc_removes_only_unreferenced_blobs(tmp_path, capsys):
+    store_dir = tmp_path / "store"
+    store = BlobStore(store_dir)
+    bulk_write_files(tmp_path / "a", _app("a"), store=store)
+    bulk_write_files(tmp_path / "b", _app("b"), store=store)
+    shutil.rmtree(tmp_path / "b")
+
+    assert store.gc(grace_s=3600) == {"removed": 0, "bytes_freed": 0, "dry_run": False}
+    assert cli.main(["store", "gc", "--blob-store", str(store_dir), "--grace-s", "0"]) == 0
+    assert json.loads(capsys.readouterr().out)["removed"] == 1
+
+    assert cli.main(["store", "stats", "--blob-store", str(store_dir)]) == 0
+    stats = json.loads(capsys.readouterr().out)
+    assert stats["blobs"] == 3 and stats["unreferenced"] == 0
+    assert (tmp_path / "a" / "src" / "App.tsx").read_text(encoding="utf-8").endswith("'a'\n")
+
+
+def test_reflink_mode_copies_where_fcntl_is_missing(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "fcntl", None)  # as on Windows
+    store = BlobStore(tmp_path / "store", link="reflink")
+    report = bulk_write_files(tmp_path / "a", _app("a"), store=store)
+
+    assert sorted(report.changed) == ["package.json", "src/App.tsx", "src/main.tsx"]
+    assert store.stats.copied == 3
+    assert (tmp_path / "a" / "src" / "App.tsx").read_text(encoding="utf-8").endswith("'a'\n")
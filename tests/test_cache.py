@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import os
+import time
+
+from aiweb_gen.cache import ResponseCache
+from aiweb_gen.llm import LLMClient, LLMConfig
+from aiweb_gen.stubserver import StubServer
+
+
+def test_deterministic_calls_are_served_from_cache(tmp_path):
+    cache = ResponseCache(tmp_path)
+    with StubServer() as stub:
+        cfg = LLMConfig(api_key="k", base_url=stub.base_url, model="stub")
+        with LLMClient(cfg, cache=cache) as client:
+            first = client.chat_completion(system="s", user="hello")
+            second = client.chat_completion(system="s", user="hello")
+            client.chat_completion(system="s", user="hello", temperature=0.7)
+            client.chat_completion(system="s", user="hello", refresh_cache=True)
+
+    assert first == second == "hello"
+    assert stub.requests == 3
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 1
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = ResponseCache(tmp_path, ttl_s=0.0)
+    cache.put("ab" * 32, "x")
+    time.sleep(0.01)
+    assert cache.get("ab" * 32) is None
+    assert cache.stats.expired == 1
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=10_000)
+    keys = [ResponseCache.key({"n": i}) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, "x" * 3000)
+        past = time.time() - 100 + i
+        os.utime(cache._path(key), (past, past))
+
+    assert cache.get(keys[0]) is not None  # touch: now most recently used
+    cache.put(ResponseCache.key({"n": 3}), "x" * 3000)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.stats.evictions == 1
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import http.client
+import json
+import os
+import socket
+import stat
+import threading
+import time
+
+import pytest
+
+from aiweb_gen import cli
+from aiweb_gen.daemon import DaemonError, DaemonServer, Job, JobQueue, request, submit_job
+from aiweb_gen.stubserver import StubServer
+
+
+def test_higher_priority_jobs_run_first():
+    release = threading.Event()
+    ran: list[str] = []
+
+    def runner(job: Job) -> tuple[int, str, str]:
+        if job.args.get("block"):
+            release.wait(5)
+        ran.append(job.args["name"])
+        return 0, job.args["name"], ""
+
+    jobs = JobQueue(runner, workers=1)
+    first = jobs.submit("patch", {"name": "first", "block": True})
+    while first.status != "running":
+        time.sleep(0.001)
+    low = jobs.submit("patch", {"name": "low"}, priority=-1)
+    jobs.submit("patch", {"name": "normal-1"})
+    jobs.submit("patch", {"name": "high"}, priority=5)
+    jobs.submit("patch", {"name": "normal-2"})
+    release.set()
+    jobs.close()
+
+    assert ran == ["first", "high", "normal-1", "normal-2", "low"]
+    assert low.as_dict()["output"] == "low"
+    assert jobs.snapshot()["completed"] == 5
+
+
+def test_full_queue_is_refused_over_http(tmp_path, monkeypatch):
+    monkeypatch.setenv("AIWEB_DAEMON_TOKEN_DIR", str(tmp_path))
+    release = threading.Event()
+
+    def runner(job: Job) -> tuple[int, str, str]:
+        release.wait(5)
+        return 0, "", ""
+
+    with DaemonServer(runner, port=0, workers=1, max_queue=1) as server:
+        running = server.jobs.submit("architect", {})
+        while running.status != "running":
+            time.sleep(0.001)
+        server.jobs.submit("architect", {})
+        with pytest.raises(DaemonError, match="HTTP 503"):
+            submit_job(server.address, "architect", {})
+        with pytest.raises(DaemonError, match="HTTP 400"):
+            submit_job(server.address, "deploy", {})
+        release.set()
+        status, stats = request(server.address, "GET", "/stats")
+    assert status == 200
+    assert stats["jobs"]["rejected"] == 1
+
+
+def test_requests_a_web_page_could_send_are_refused(tmp_path, monkeypatch):
+    monkeypatch.setenv("AIWEB_DAEMON_TOKEN_DIR", str(tmp_path))
+    ran: list[Job] = []
+
+    def runner(job: Job) -> tuple[int, str, str]:
+        ran.append(job)
+        return 0, "", ""
+
+    with DaemonServer(runner, port=0) as server:
+        if os.name == "posix":
+            assert stat.S_IMODE(server.token_file.stat().st_mode) == 0o600
+        auth = {"Authorization": f"Bearer {server.token}"}
+        body = json.dumps({"cmd": "patch", "args": {"root": "/"}})
+        port = server.port
+
+        def post(headers: dict) -> int:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("POST", "/jobs", body=body, headers=headers)
+            status = conn.getresponse().status
+            conn.close()
+            return status
+
+        json_type = {"Content-Type": "application/json"}
+        assert post({**auth, "Content-Type": "text/plain"}) == 415
+        assert post({**auth, **json_type, "Origin": "https://evil.example"}) == 403
+        assert post({**auth, **json_type, "Host": f"evil.example:{port}"}) == 403
+        assert post(json_type) == 401
+        assert post({"Authorization": "Bearer wrong", **json_type}) == 401
+        assert ran == []
+        assert post({**auth, **json_type}) == 200
+    assert len(ran) == 1
+    assert not server.token_file.exists()
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets")
+def test_cli_forwards_jobs_to_a_warm_daemon(tmp_path, prompts_dir, monkeypatch, capsys):
+    spec = {
+        "app_name": "demo",
+        "description": "d",
+        "tech_stack": {},
+        "pages": [],
+        "components": [],
+        "database_models": [],
+        "api_endpoints": [],
+        "non_functional_requirements": [],
+    }
+    address = f"unix:{tmp_path / 'd.sock'}"
+    monkeypatch.chdir(tmp_path)
+    with StubServer(responder=lambda payload: json.dumps(spec)) as stub:
+        monkeypatch.setenv("OPENAI_API_KEY", "k")
+        monkeypatch.setenv("OPENAI_BASE_URL", stub.base_url)
+        serve = threading.Thread(
+            target=cli.main, args=(["serve", "--socket", str(tmp_path / "d.sock"), "--no-cache"],)
+        )
+        serve.start()
+        for _ in range(500):
+            try:
+                request(address, "GET", "/health")
+                break
+            except DaemonError:
+                time.sleep(0.01)
+
+        # "prompts" is relative to the client's directory, not the daemon's.
+        argv = ["--daemon", address, "architect", "--idea", "todo app", "--prompts", "prompts"]
+        assert cli.main(argv) == 0
+        assert cli.main(argv) == 0
+        _, stats = request(address, "GET", "/stats")
+        request(address, "POST", "/shutdown")
+        serve.join(5)
+
+    out = capsys.readouterr().out
+    assert json.loads(out[: len(out) // 2]) == spec
+    assert stats["jobs"]["completed"] == 2
+    # Both jobs went over the daemon's one pooled keep-alive connection.
+    assert stub.connections == 1
+    assert not serve.is_alive()
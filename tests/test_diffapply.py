@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import pytest
+
+from aiweb_gen.diffapply import PatchError, apply_unified_diff, parse_unified_diff
+
+ORIGINAL = "".join(f"line {n}\n" for n in range(1, 21))
+
+DIFF = """\
+diff --git a/app.txt b/app.txt
+--- a/app.txt
++++ b/app.txt
+@@ -2,3 +2,3 @@
+ line 2
+-line 3
++line three
+ line 4
+@@ -15,3 +15,4 @@
+ line 15
+ line 16
++line 16.5
+ line 17
+--- /dev/null
++++ b/new/readme.md
+@@ -0,0 +1,2 @@
++# New
++file
+"""
+
+
+def test_parse_counts_hunks_per_file():
+    patches = parse_unified_diff(DIFF)
+    assert [(p.old_path, p.new_path, len(p.hunks)) for p in patches] == [
+        ("app.txt", "app.txt", 2),
+        (None, "new/readme.md", 1),
+    ]
+
+
+def test_applies_hunks_and_creates_files(tmp_path):
+    (tmp_path / "app.txt").write_text(ORIGINAL, encoding="utf-8")
+    result = apply_unified_diff(tmp_path, DIFF)
+
+    text = (tmp_path / "app.txt").read_text(encoding="utf-8")
+    assert "line three\n" in text and "line 16\nline 16.5\nline 17\n" in text
+    assert (tmp_path / "new" / "readme.md").read_text(encoding="utf-8") == "# New\nfile\n"
+    assert result.applied_files == ["app.txt", "new/readme.md"]
+    assert result.total_hunks == 3
+    assert result.hunks_per_file == {"app.txt": 2, "new/readme.md": 1}
+    assert result.fuzzy_hunks == 0
+
+
+def test_fuzzy_match_tolerates_drift_and_bad_counts(tmp_path):
+    (tmp_path / "app.txt").write_text("header\nextra\n" + ORIGINAL, encoding="utf-8")
+    diff = "--- a/app.txt\n+++ b/app.txt\n@@ -2,9 +2,9 @@\n line 2\n-line 3\n+line three\n line 4\n"
+    result = apply_unified_diff(tmp_path, diff)
+    assert "line three" in (tmp_path / "app.txt").read_text(encoding="utf-8")
+    assert result.fuzzy_hunks == 1
+
+
+def test_failed_hunk_leaves_tree_untouched(tmp_path):
+    (tmp_path / "app.txt").write_text(ORIGINAL, encoding="utf-8")
+    bad = DIFF.replace(" line 16\n+line 16.5", " line 99\n+line 16.5")
+    with pytest.raises(PatchError):
+        apply_unified_diff(tmp_path, bad)
+    assert (tmp_path / "app.txt").read_text(encoding="utf-8") == ORIGINAL
+    assert not (tmp_path / "new").exists()
+
+
+def test_dry_run_and_path_traversal(tmp_path):
+    (tmp_path / "app.txt").write_text(ORIGINAL, encoding="utf-8")
+    apply_unified_diff(tmp_path, DIFF, dry_run=True)
+    assert (tmp_path / "app.txt").read_text(encoding="utf-8") == ORIGINAL
+
+    with pytest.raises(PatchError):
+        apply_unified_diff(tmp_path, "--- a/../x\n+++ b/../x\n@@ -1 +1 @@\n-a\n+b\n")
+
+
+def test_crlf_files_keep_their_line_endings(tmp_path):
+    (tmp_path / "app.txt").write_bytes(b"a\r\nb\r\nc\r\n")
+    apply_unified_diff(tmp_path, "--- a/app.txt\n+++ b/app.txt\n@@ -1,3 +1,3 @@\n a\n-b\n+B\n c\n")
+    assert (tmp_path / "app.txt").read_bytes() == b"a\r\nB\r\nc\r\n"
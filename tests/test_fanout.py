@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import json
+import threading
+
+from aiweb_gen.fanout import merge_unit_outputs, plan_units, render_unit_request
+from aiweb_gen.flow import generate_flow
+from aiweb_gen.parsing import FileBlock
+
+SPEC = {
+    "app_name": "demo",
+    "description": "d",
+    "tech_stack": {"backend": "fastapi"},
+    "pages": [{"name": "Task List", "route": "/"}, {"name": "Login", "route": "/login"}],
+    "components": [],
+    "database_models": [{"name": "Task", "fields": {"title": "str"}}],
+    "api_endpoints": [
+        {"method": "get", "path": "/api/v1/tasks", "auth_required": True},
+        {"method": "delete", "path": "/api/v1/tasks/{id}", "auth_required": True},
+        {"method": "post", "path": "/auth/login", "auth_required": False},
+    ],
+    "non_functional_requirements": [],
+}
+
+
+def test_backend_units_group_endpoints_by_model():
+    units = plan_units(SPEC, "backend")
+    assert [(u.name, u.kind) for u in units] == [
+        ("skeleton", "skeleton"),
+        ("task", "model"),
+        ("auth", "router"),
+    ]
+    task = units[1]
+    assert len(task.spec["api_endpoints"]) == 2
+    assert task.paths == ["app/models/task.py", "app/schemas/task.py", "app/routers/tasks.py"]
+
+
+def test_frontend_units_are_one_per_page():
+    units = plan_units(SPEC, "frontend")
+    assert [u.paths for u in units[1:]] == [["src/pages/TaskList.jsx"], ["src/pages/Login.jsx"]]
+
+
+def test_merge_reports_differing_duplicates_only():
+    merged, collisions = merge_unit_outputs(
+        [
+            ("skeleton", [FileBlock("app/main.py", "A"), FileBlock("README.md", "r")]),
+            ("task", [FileBlock("app/main.py", "B"), FileBlock("README.md", "r")]),
+        ]
+    )
+    assert [(b.path, b.content) for b in merged] == [("app/main.py", "A"), ("README.md", "r")]
+    assert [(c.path, c.units) for c in collisions] == [("app/main.py", ["skeleton", "task"])]
+
+
+class _FanoutClient:
+    def __init__(self) -> None:
+        self.units: list[tuple[str, str]] = []
+        self._lock = threading.Lock()
+
+    def chat_completion(self, *, system: str, user: str, **_: object) -> str:
+        if system == "ARCHITECT_MODE":
+            return json.dumps(SPEC)
+        if system == "CODE_VALIDATOR":
+            return json.dumps({"valid": True, "issues": []})
+        if system in ("BACKEND_FANOUT", "FRONTEND_FANOUT"):
+            unit = json.loads(user)["unit"]
+            with self._lock:
+                self.units.append((system, unit["name"]))
+            return "".join(f"=== FILE: {p} ===\n# {unit['name']}\n" for p in unit["paths"])
+        raise AssertionError(f"unexpected prompt {system}")
+
+
+def test_generate_fanout_writes_every_unit(tmp_path, prompts_dir):
+    for name in ("BACKEND_FANOUT", "FRONTEND_FANOUT"):
+        (prompts_dir / f"{name}.txt").write_text(name, encoding="utf-8")
+    client = _FanoutClient()
+    result = generate_flow(
+        idea="x",
+        out_dir=tmp_path,
+        prompts_dir=prompts_dir,
+        strict=True,
+        validator="llm",
+        fanout=True,
+        client=client,
+    )
+
+    assert result["ok"] is True
+    assert sorted(client.units) == [
+        ("BACKEND_FANOUT", "auth"),
+        ("BACKEND_FANOUT", "skeleton"),
+        ("BACKEND_FANOUT", "task"),
+        ("FRONTEND_FANOUT", "login"),
+        ("FRONTEND_FANOUT", "skeleton"),
+        ("FRONTEND_FANOUT", "task_list"),
+    ]
+    root = tmp_path / "demo"
+    assert (root / "backend" / "app" / "routers" / "tasks.py").read_text() == "# task\n"
+    assert (root / "frontend" / "src" / "pages" / "Login.jsx").exists()
+
+
+def test_unit_requests_share_a_prefix():
+    units = plan_units(SPEC, "backend")
+    rendered = [render_unit_request(SPEC, unit, units) for unit in units]
+    prefixes = {text[:shared] for text, shared in rendered}
+    assert len(prefixes) == 1
+    assert [json.loads(text)["unit"]["name"] for text, _ in rendered] == [u.name for u in units]
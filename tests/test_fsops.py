@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import pytest
+
+from aiweb_gen.fsops import WriteError, bulk_write_files, safe_write_files
+
+
+def test_bulk_write_creates_tree_and_skips_unchanged(tmp_path):
+    root = tmp_path / "app"
+    files = [(f"pkg{n % 3}/mod{n}.py", f"x = {n}\n") for n in range(30)]
+
+    first = bulk_write_files(root, files)
+    assert len(first.changed) == 30 and first.skipped == []
+    assert (root / "pkg2" / "mod29.py").read_text(encoding="utf-8") == "x = 29\n"
+
+    files[0] = ("pkg0/mod0.py", "x = 'changed'\n")
+    second = bulk_write_files(root, files)
+    assert second.changed == ["pkg0/mod0.py"]
+    assert len(second.skipped) == 29
+    assert second.bytes_skipped > 0 and second.bytes_written == len("x = 'changed'\n")
+    assert not any(p.name.startswith(".app.staging-") for p in tmp_path.iterdir())
+
+
+def test_dry_run_writes_nothing(tmp_path):
+    root = tmp_path / "app"
+    assert safe_write_files(root, [("a/b.txt", "x")], dry_run=True) == ["a/b.txt"]
+    assert not root.exists()
+
+
+def test_refuses_paths_outside_root(tmp_path):
+    with pytest.raises(WriteError):
+        bulk_write_files(tmp_path / "app", [("ok.txt", "x"), ("../escape.txt", "x")])
+    assert not (tmp_path / "app").exists()
+    assert not (tmp_path / "escape.txt").exists()
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+
+import pytest
+
+from aiweb_gen import cli
+from aiweb_gen.flow import generate_flow
+from aiweb_gen.stubserver import StubServer
+
+
+@pytest.mark.parametrize(
+    ("concurrent", "stream", "strict"),
+    [(False, False, True), (True, False, True), (False, True, False), (True, True, True)],
+)
+def test_generate_writes_both_branches(
+    tmp_path, prompts_dir, make_fake_client, concurrent, stream, strict
+):
+    out = tmp_path / "out"
+    result = generate_flow(
+        idea="x",
+        out_dir=out,
+        prompts_dir=prompts_dir,
+        strict=strict,
+        concurrent=concurrent,
+        stream=stream,
+        client=make_fake_client(),
+    )
+    assert result["ok"] is True
+    assert result["backend"]["files_written"] == ["main.py"]
+    assert (out / "demo" / "backend" / "main.py").exists()
+    assert (out / "demo" / "frontend" / "src" / "main.ts").exists()
+    assert (out / "demo" / "spec.json").exists()
+
+
+@pytest.mark.parametrize("concurrent", [False, True])
+def test_strict_frontend_failure_keeps_serial_semantics(
+    tmp_path, prompts_dir, make_fake_client, concurrent
+):
+    out = tmp_path / "out"
+    result = generate_flow(
+        idea="x",
+        out_dir=out,
+        prompts_dir=prompts_dir,
+        strict=True,
+        concurrent=concurrent,
+        client=make_fake_client(frontend_broken=True),
+    )
+    assert result["ok"] is False
+    assert result["stage"] == "frontend_validation_failed"
+    assert (out / "demo" / "backend" / "main.py").exists()
+    assert not (out / "demo" / "frontend").exists()
+    assert not (out / "demo" / "spec.json").exists()
+
+
+class _FailingBackendClient:
+    """The backend request fails while the frontend request is still in flight."""
+
+    def __init__(self, inner) -> None:
+        self.inner = inner
+        self.frontend_started = threading.Event()
+        self.release = threading.Event()
+
+    def chat_completion(self, *, system: str, user: str, **kwargs: object) -> str:
+        if system == "BACKEND_GENERATOR":
+            self.frontend_started.wait(5)
+            raise ValueError("backend exploded")
+        if system == "FRONTEND_GENERATOR":
+            self.frontend_started.set()
+            self.release.wait(5)
+        return self.inner.chat_completion(system=system, user=user, **kwargs)
+
+
+def test_backend_failure_does_not_wait_for_the_frontend(tmp_path, prompts_dir, make_fake_client):
+    inner = make_fake_client()
+    client = _FailingBackendClient(inner)
+    started = time.monotonic()
+    with pytest.raises(ValueError, match="backend exploded"):
+        generate_flow(
+            idea="x",
+            out_dir=tmp_path,
+            prompts_dir=prompts_dir,
+            strict=True,
+            concurrent=True,
+            client=client,
+        )
+    assert time.monotonic() - started < 2
+
+    # The in-flight frontend request finishes, but its validation request is never sent.
+    client.release.set()
+    deadline = time.monotonic() + 5
+    while any(t.name.startswith("aiweb-gen") for t in threading.enumerate()):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert inner.calls == ["ARCHITECT_MODE", "FRONTEND_GENERATOR"]
+    assert not (tmp_path / "demo").exists()
+
+
+class _DecoratedClient:
+    """Wraps every answer the way chatty models do; repairs must avoid any retry."""
+
+    def __init__(self, inner) -> None:
+        self.inner = inner
+
+    def chat_completion(self, *, system: str, user: str, **kwargs: object) -> str:
+        out = self.inner.chat_completion(system=system, user=user, **kwargs)
+        if system in ("ARCHITECT_MODE", "CODE_VALIDATOR"):
+            return f"Here is the result:\n```json\n{out}\n```"
+        return out.replace("=== FILE: main.py ===", "==== File: main.py")
+
+
+def test_decorated_output_is_repaired_without_retry(tmp_path, prompts_dir, make_fake_client):
+    inner = make_fake_client()
+    result = generate_flow(
+        idea="x",
+        out_dir=tmp_path,
+        prompts_dir=prompts_dir,
+        strict=True,
+        auto_retry=True,
+        validator="llm",
+        client=_DecoratedClient(inner),
+    )
+    assert result["ok"] is True
+    assert inner.calls.count("ARCHITECT_MODE") == 1
+    assert inner.calls.count("BACKEND_GENERATOR") == 1
+    assert result["backend"]["validator"]["repairs"] == ["header_variant"]
+
+
+def test_cli_generate_prints_the_result(
+    tmp_path, prompts_dir, make_fake_client, monkeypatch, capsys
+):
+    fake = make_fake_client()
+
+    def respond(payload: dict) -> str:
+        system, user = (m["content"] for m in payload["messages"])
+        return fake.chat_completion(system=system, user=user)
+
+    out = tmp_path / "out"
+    with StubServer(responder=respond) as stub:
+        monkeypatch.setenv("OPENAI_API_KEY", "k")
+        monkeypatch.setenv("OPENAI_BASE_URL", stub.base_url)
+        argv = ["generate", "--idea", "x", "--out", str(out), "--prompts", str(prompts_dir)]
+        code = cli.main([*argv, "--no-checkpoint", "--no-cache"])
+
+    captured = capsys.readouterr()
+    assert code == 0, captured.err
+    result = json.loads(captured.out)
+    assert result["ok"] is True and result["app_root"] == str(out / "demo")
+    assert (out / "demo" / "backend" / "main.py").exists()
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import os
+
+from aiweb_gen.flow import apply_patch_flow
+from aiweb_gen.index import RepoIndex
+
+
+def test_refresh_only_rereads_changed_files(tmp_path):
+    (tmp_path / "auth.py").write_text("def login_user():\n    pass\n", encoding="utf-8")
+    (tmp_path / "theme.ts").write_text("export function toggleTheme() {}\n", encoding="utf-8")
+
+    with RepoIndex(tmp_path) as index:
+        first = index.refresh()
+        assert (first.scanned, first.reindexed) == (2, 2)
+        assert index.entry("theme.ts")["language"] == "typescript"
+        assert index.entry("theme.ts")["symbols"] == ["toggleTheme"]
+
+    (tmp_path / "auth.py").write_text("def login_user(name):\n    pass\n", encoding="utf-8")
+    os.utime(tmp_path / "theme.ts")  # touched, content unchanged
+    (tmp_path / "new.md").write_text("notes", encoding="utf-8")
+
+    with RepoIndex(tmp_path) as index:
+        second = index.refresh()
+        assert (second.scanned, second.reindexed, second.removed) == (3, 2, 0)
+        (tmp_path / "new.md").unlink()
+        assert index.refresh().removed == 1
+
+        selection = index.select("toggle the theme")
+        assert selection.files[0].path == "theme.ts"
+        assert "toggleTheme" in selection.files[0].content
+
+    assert (tmp_path / ".aiweb" / "index.db").exists()
+
+
+class _DiffClient:
+    def chat_completion(self, **_: object) -> str:
+        return "--- a/auth.py\n+++ b/auth.py\n@@ -1 +1 @@\n-x = 1\n+x = 2\n"
+
+
+def test_dry_run_patch_leaves_the_tree_and_its_index_alone(tmp_path, prompts_dir):
+    (prompts_dir / "PATCH_MODE.txt").write_text("PATCH_MODE", encoding="utf-8")
+    root = tmp_path / "repo"
+    root.mkdir()
+    (root / "auth.py").write_text("x = 1\n", encoding="utf-8")
+
+    result = apply_patch_flow(
+        root_dir=root,
+        change_request="bump x",
+        prompts_dir=prompts_dir,
+        dry_run=True,
+        client=_DiffClient(),
+    )
+    assert result["context"]["index"]["reindexed"] == 1
+    assert not (root / ".aiweb").exists()
+    assert (root / "auth.py").read_text(encoding="utf-8") == "x = 1\n"
+
+    # An existing index is reused read-only: the in-memory refresh does not write it back.
+    with RepoIndex(root) as index:
+        index.refresh()
+    stored = (root / ".aiweb" / "index.db").read_bytes()
+    (root / "new.py").write_text("y = 1\n", encoding="utf-8")
+    with RepoIndex(root, persist=False) as index:
+        stats = index.refresh()
+        assert (stats.scanned, stats.reindexed) == (2, 1)
+    assert (root / ".aiweb" / "index.db").read_bytes() == stored
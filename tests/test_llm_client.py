@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import json
+import threading
+
+import pytest
+import requests
+
+from aiweb_gen.llm import (
+    CircuitOpenError,
+    Hedger,
+    LLMClient,
+    LLMConfig,
+    LLMError,
+    RequestScheduler,
+    TokenBucket,
+    load_llm_config,
+    retry_after_seconds,
+)
+from aiweb_gen.stubserver import StubServer
+
+
+def test_client_reuses_one_connection_across_calls():
+    with StubServer() as stub:
+        cfg = LLMConfig(api_key="k", base_url=stub.base_url, model="stub")
+        with LLMClient(cfg) as client:
+            outputs = [client.chat_completion(system="s", user=f"u{i}") for i in range(5)]
+
+    assert outputs == [f"u{i}" for i in range(5)]
+    assert stub.requests == 5
+    assert stub.connections == 1
+
+
+def test_load_llm_config_reads_pool_settings(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "k")
+    monkeypatch.setenv("AIWEB_HTTP_POOL_CONNECTIONS", "2")
+    monkeypatch.setenv("AIWEB_HTTP_POOL_MAXSIZE", "16")
+    monkeypatch.setenv("AIWEB_LLM_RPM", "0")
+    monkeypatch.setenv("AIWEB_LLM_TPM", "0")
+    cfg = load_llm_config()
+    assert cfg.pool_connections == 2
+    assert cfg.pool_maxsize == 16
+    assert cfg.requests_per_minute == cfg.tokens_per_minute == 0
+
+
+def test_load_llm_config_rejects_bad_pool_size(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "k")
+    monkeypatch.setenv("AIWEB_HTTP_POOL_MAXSIZE", "0")
+    with pytest.raises(LLMError):
+        load_llm_config()
+    monkeypatch.delenv("AIWEB_HTTP_POOL_MAXSIZE")
+    monkeypatch.setenv("AIWEB_LLM_RPM", "-1")
+    with pytest.raises(LLMError, match="AIWEB_LLM_RPM must be >= 0"):
+        load_llm_config()
+
+
+def _response(status: int, body: dict | None = None, headers: dict | None = None):
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = json.dumps(body or {"error": "x"}).encode("utf-8")
+    resp.headers.update(headers or {})
+    return resp
+
+
+def _ok(content: str) -> requests.Response:
+    return _response(200, {"choices": [{"message": {"content": content}}]})
+
+
+class _ScriptedSession:
+    def __init__(self, responses: list) -> None:
+        self.responses = list(responses)
+        self.posts = 0
+
+    def post(self, url: str, **_: object):
+        self.posts += 1
+        return self.responses.pop(0)
+
+    def close(self) -> None:
+        return
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _client(
+    responses: list, clock: _Clock, *, max_retries: int = 2, **scheduler: object
+) -> LLMClient:
+    cfg = LLMConfig(api_key="k", base_url="http://llm", model="m", max_retries=max_retries)
+    sched = RequestScheduler(clock=clock, sleep=clock.sleep, rand=lambda: 1.0, **scheduler)
+    return LLMClient(cfg, session=_ScriptedSession(responses), scheduler=sched)
+
+
+def test_token_bucket_waits_for_refill():
+    clock = _Clock()
+    bucket = TokenBucket(60, clock=clock)
+    assert [bucket.reserve(1) for _ in range(60)] == [0.0] * 60
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    clock.now += 2
+    assert bucket.reserve(1) == 0.0
+
+
+def test_retry_after_header_formats():
+    assert retry_after_seconds({"retry-after": "3"}) == 3.0
+    assert retry_after_seconds({"retry-after-ms": "250"}) == 0.25
+    assert retry_after_seconds({"x-ratelimit-reset-tokens": "1m30s"}) == 90.0
+    assert retry_after_seconds({}) is None
+
+
+def test_429_honours_retry_after_for_every_caller():
+    clock = _Clock()
+    client = _client([_response(429, headers={"Retry-After": "7"}), _ok("a"), _ok("b")], clock)
+    assert client.chat_completion(system="s", user="u") == "a"
+    assert clock.sleeps == [7.0]
+    assert client.chat_completion(system="s", user="u") == "b"
+    stats = client.scheduler_stats()
+    assert stats["rate_limited"] == 1
+    assert stats["throttled"] == 1
+
+
+def test_non_retryable_4xx_fails_without_retry():
+    clock = _Clock()
+    client = _client([_response(400), _ok("never")], clock)
+    with pytest.raises(LLMError, match="HTTP 400"):
+        client.chat_completion(system="s", user="u")
+    assert client.session.posts == 1
+    assert clock.sleeps == []
+
+
+def test_rpm_budget_spaces_requests():
+    clock = _Clock()
+    client = _client([_ok("a"), _ok("b"), _ok("c")], clock, requests_per_minute=2)
+    for _ in range(3):
+        client.chat_completion(system="s", user="u")
+    assert clock.sleeps == [pytest.approx(30.0)]
+
+
+def test_circuit_opens_after_consecutive_server_errors():
+    clock = _Clock()
+    responses = [_response(500), _response(503), _ok("probe")]
+    client = _client(responses, clock, max_retries=1, breaker_threshold=2, breaker_reset_s=10)
+    with pytest.raises(LLMError, match="HTTP 503"):
+        client.chat_completion(system="s", user="u")
+    with pytest.raises(CircuitOpenError):
+        client.chat_completion(system="s", user="u")
+    assert client.session.posts == 2
+
+    clock.now += 10
+    assert client.chat_completion(system="s", user="u") == "probe"
+    assert client.scheduler_stats()["circuit"] == "closed"
+
+
+def test_abandoned_stream_probe_releases_the_circuit():
+    clock = _Clock()
+    sched = RequestScheduler(clock=clock, sleep=clock.sleep, breaker_threshold=1)
+    sched.on_failure(LLMError("boom"), 0)
+    clock.now += sched.breaker_reset_s
+    with StubServer(responder=lambda payload: "x" * 4000) as stub:
+        cfg = LLMConfig(api_key="k", base_url=stub.base_url, model="m")
+        with LLMClient(cfg, scheduler=sched) as client:
+            stream = client.stream_chat_completion(system="s", user="u")
+            next(stream)
+            stream.close()  # the probe's caller stopped reading
+            assert client.scheduler_stats()["circuit"] == "half-open"
+            assert client.chat_completion(system="s", user="u") == "x" * 4000
+    assert sched.snapshot()["circuit"] == "closed"
+
+
+def test_hedger_waits_for_history_and_respects_budget():
+    hedger = Hedger(percentile=90, budget=0.25, min_samples=4)
+    for seconds in (1.0, 2.0, 3.0):
+        hedger.observe("ARCHITECT_MODE", seconds)
+    assert hedger.delay("ARCHITECT_MODE") is None
+    hedger.observe("ARCHITECT_MODE", 10.0)
+    assert hedger.delay("ARCHITECT_MODE") == 10.0
+    assert hedger.delay("CODE_VALIDATOR") is None
+
+    for _ in range(4):
+        hedger.note_request()
+    assert hedger.try_hedge() is True
+    assert hedger.try_hedge() is False
+    assert hedger.stats.over_budget == 1
+
+
+class _SlowFirstSession:
+    """The first request hangs until released; later ones answer at once."""
+
+    def __init__(self) -> None:
+        self.release = threading.Event()
+        self.urls: list[str] = []
+        self._lock = threading.Lock()
+
+    def post(self, url: str, **_: object):
+        with self._lock:
+            self.urls.append(url)
+            first = len(self.urls) == 1
+        if first:
+            self.release.wait(5)
+            return _ok("slow")
+        return _ok("fast")
+
+    def close(self) -> None:
+        self.release.set()
+
+
+def test_slow_call_is_hedged_and_first_answer_wins():
+    cfg = LLMConfig(
+        api_key="k",
+        base_url="http://primary",
+        model="m",
+        hedge_percentile=50,
+        hedge_budget=1.0,
+        hedge_base_url="http://secondary",
+    )
+    session = _SlowFirstSession()
+    with LLMClient(cfg, session=session) as client:
+        for _ in range(client.hedger.min_samples):
+            client.hedger.observe("BACKEND_GENERATOR", 0.01)
+        out = client.chat_completion(system="s", user="u", prompt="BACKEND_GENERATOR")
+        stats = client.hedge_stats()
+
+    assert out == "fast"
+    assert session.urls == [
+        "http://primary/chat/completions",
+        "http://secondary/chat/completions",
+    ]
+    assert stats["hedged"] == 1
+    assert stats["hedge_wins"] == 1
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from aiweb_gen.llm import LLMClient, LLMConfig
+from aiweb_gen.parsing import ParseError, iter_file_blocks, parse_file_blocks, parse_json
+from aiweb_gen.stubserver import StubServer
+
+BUNDLE = (
+    "preamble ignored\r\n"
+    "=== FILE: app/main.py ===\r\n"
+    "import os\r\n"
+    "\r\n"
+    "print(os.name)\r\n"
+    "=== FILE: README.md ===\n"
+    "# Title\n"
+    "\n"
+)
+
+
+def test_parse_file_blocks():
+    blocks = parse_file_blocks(BUNDLE)
+    assert [b.path for b in blocks] == ["app/main.py", "README.md"]
+    assert blocks[0].content == "import os\n\nprint(os.name)\n"
+    assert blocks[1].content == "# Title\n"
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64])
+def test_incremental_parser_matches_whole_text(size):
+    chunks = [BUNDLE[i : i + size] for i in range(0, len(BUNDLE), size)]
+    assert list(iter_file_blocks(chunks)) == parse_file_blocks(BUNDLE)
+
+
+def test_incremental_parser_yields_before_stream_ends():
+    def chunks():
+        yield "=== FILE: a.txt ===\nA\n"
+        yield "=== FILE: b.txt ===\n"
+        raise AssertionError("first block should be available before this point")
+
+    it = iter_file_blocks(chunks())
+    assert next(it).path == "a.txt"
+
+
+def test_rejects_absolute_paths_and_empty_output():
+    with pytest.raises(ParseError):
+        parse_file_blocks("=== FILE: /etc/passwd ===\nx\n")
+    with pytest.raises(ParseError):
+        parse_file_blocks("no blocks here")
+
+
+def test_streamed_completion_round_trips_through_parser():
+    with StubServer(stream_chunk_chars=5) as stub:
+        cfg = LLMConfig(api_key="k", base_url=stub.base_url, model="stub")
+        with LLMClient(cfg) as client:
+            chunks = list(client.stream_chat_completion(system="s", user=BUNDLE))
+
+    assert len(chunks) > 1
+    assert "".join(chunks) == BUNDLE
+    assert list(iter_file_blocks(chunks)) == parse_file_blocks(BUNDLE)
+
+
+@pytest.mark.parametrize(
+    ("text", "expected_repairs"),
+    [
+        ('{"valid": true, "issues": []}', []),
+        ('Here you go:\n```json\n{"valid": true, "issues": []}\n```\nDone.', ["code_fence"]),
+        ('Sure! {"valid": true, "issues": []} Hope that helps.', ["surrounding_text"]),
+        ('{"valid": true, "issues": [],}', ["trailing_commas"]),
+    ],
+)
+def test_parse_json_repairs_decorated_output(text, expected_repairs):
+    repairs: list[str] = []
+    assert parse_json(text, repairs=repairs) == {"valid": True, "issues": []}
+    assert repairs == expected_repairs
+
+
+def test_parse_json_closes_truncated_object():
+    text = '{"valid": false, "issues": [{"file": "a.py", "severity": "high"}, {"file": "b'
+    repairs: list[str] = []
+    report = parse_json(text, repairs=repairs)
+    assert report == {"valid": False, "issues": [{"file": "a.py", "severity": "high"}]}
+    assert repairs == ["truncated_object"]
+
+
+def test_parse_json_gives_up_without_an_object():
+    with pytest.raises(ParseError):
+        parse_json("I could not produce a spec.")
+
+
+def test_file_header_variants_and_fences_are_repaired():
+    text = (
+        "```\n"
+        "==== File: `app/main.py` ====\n"
+        "```python\n"
+        "print('hi')\n"
+        "```\n"
+        "=== FILE: README.md\n"
+        "# Title\n"
+        "```\n"
+    )
+    repairs: list[str] = []
+    blocks = parse_file_blocks(text, repairs=repairs)
+    assert [(b.path, b.content) for b in blocks] == [
+        ("app/main.py", "print('hi')\n"),
+        ("README.md", "# Title\n"),
+    ]
+    assert repairs == ["header_variant", "content_fence", "trailing_fence"]
+
+
+def test_header_like_lines_inside_content_stay_content():
+    readme = "# Notes\n=== File: notes ===\n==== FILE: docs/a.md ====\nend\n"
+    text = f"=== FILE: README.md ===\n{readme}=== FILE: app.py ===\nx = 1\n"
+    repairs: list[str] = []
+    blocks = parse_file_blocks(text, repairs=repairs)
+    assert [(b.path, b.content) for b in blocks] == [("README.md", readme), ("app.py", "x = 1\n")]
+    assert repairs == []
+
+    # Without any strict header, a variant still needs a path that looks like a file.
+    blocks = parse_file_blocks("==== File: main.py ====\n=== file notes\nx = 1\n")
+    assert [(b.path, b.content) for b in blocks] == [("main.py", "=== file notes\nx = 1\n")]
+
+
+def test_json_mode_sends_response_format_when_enabled():
+    def responder(payload: dict) -> str:
+        return json.dumps(payload.get("response_format"))
+
+    with StubServer(responder=responder) as stub:
+        cfg = LLMConfig(api_key="k", base_url=stub.base_url, model="stub", json_mode=True)
+        with LLMClient(cfg) as client:
+            on = client.chat_completion(system="s", user="u", json_output=True)
+            off = client.chat_completion(system="s", user="u")
+
+    assert json.loads(on) == {"type": "json_object"}
+    assert json.loads(off) is None
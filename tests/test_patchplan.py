@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import json
+import threading
+
+import pytest
+
+from aiweb_gen.diffapply import PatchError
+from aiweb_gen.flow import apply_patch_flow
+from aiweb_gen.patchplan import FileChange, PlanError, merge_file_diffs, parse_patch_plan
+
+UTIL_DIFF = """--- a/app/util.py
++++ b/app/util.py
+@@ -1,2 +1,5 @@
+ def add(a, b):
+     return a + b
++
++def sub(a, b):
++    return a - b
+"""
+NEW_DIFF = """```diff
+--- /dev/null
++++ b/app/ops.py
+@@ -0,0 +1,2 @@
++from app.util import add, sub
++OPS = {"+": add, "-": sub}
+```
+"""
+
+
+def test_plan_is_normalised_and_diffs_must_stay_in_their_file():
+    changes = parse_patch_plan(
+        {
+            "files": [
+                {"path": "./app/util.py", "intent": "add sub", "context": ["app/util.py"]},
+                {"path": "app/ops.py", "intent": "operator table", "context": ["app/util.py"]},
+                {"path": "app//util.py", "intent": "export it"},
+            ]
+        }
+    )
+    assert [c.as_dict() for c in changes] == [
+        {"path": "app/util.py", "intent": "add sub; export it", "context": []},
+        {"path": "app/ops.py", "intent": "operator table", "context": ["app/util.py"]},
+    ]
+    with pytest.raises(PlanError, match="outside"):
+        parse_patch_plan({"files": [{"path": "../etc/passwd", "intent": "x"}]})
+
+    util, ops = changes
+    fenced = FileChange("app/ops.py", "")
+    merged = merge_file_diffs([(util, UTIL_DIFF), (ops, ""), (fenced, NEW_DIFF)])
+    assert merged.index("a/app/util.py") < merged.index("b/app/ops.py")
+    with pytest.raises(PatchError, match="Diff for app/ops.py touches app/util.py"):
+        merge_file_diffs([(ops, UTIL_DIFF)])
+
+
+class _PlanningClient:
+    def __init__(self) -> None:
+        self.file_requests: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def chat_completion(self, *, system: str, user: str, **_: object) -> str:
+        if system == "PATCH_PLANNER":
+            assert "OTHER FILES" not in user and "def add" in user
+            plan = [
+                {"path": "app/util.py", "intent": "add sub(a, b)"},
+                {"path": "app/ops.py", "intent": "OPS table", "context": ["app/util.py"]},
+            ]
+            return json.dumps({"files": plan})
+        assert system == "PATCH_FILE"
+        path = user.split("FILE TO CHANGE: ", 1)[1].split("\n", 1)[0]
+        with self._lock:
+            self.file_requests[path] = user
+        return UTIL_DIFF if path == "app/util.py" else NEW_DIFF
+
+
+def test_planned_patch_fans_out_per_file_and_applies_once(tmp_path, prompts_dir):
+    for name in ("PATCH_MODE", "PATCH_PLANNER", "PATCH_FILE"):
+        (prompts_dir / f"{name}.txt").write_text(name, encoding="utf-8")
+    root = tmp_path / "repo"
+    (root / "app").mkdir(parents=True)
+    (root / "app" / "util.py").write_text("def add(a, b):\n    return a + b\n", encoding="utf-8")
+    (root / "app" / "main.py").write_text("print('unrelated')\n", encoding="utf-8")
+    client = _PlanningClient()
+
+    result = apply_patch_flow(
+        root_dir=root,
+        change_request="add an operator table",
+        prompts_dir=prompts_dir,
+        dry_run=False,
+        use_index=False,
+        plan=True,
+        client=client,
+    )
+
+    assert result["changed"] and sorted(result["applied_files"]) == ["app/ops.py", "app/util.py"]
+    assert [c["path"] for c in result["plan"]] == ["app/util.py", "app/ops.py"]
+    assert "def sub" in (root / "app" / "util.py").read_text(encoding="utf-8")
+    assert (root / "app" / "ops.py").read_text(encoding="utf-8").startswith("from app.util")
+    # Each request carries its own file (plus named context) and nothing unrelated.
+    util_request = client.file_requests["app/util.py"]
+    ops_request = client.file_requests["app/ops.py"]
+    assert "CURRENT CONTENT" in util_request and "unrelated" not in util_request
+    assert "does not exist yet" in ops_request and "=== FILE: app/util.py ===" in ops_request
+    assert util_request.split("CURRENT")[0].startswith(ops_request.split("CONTEXT FILES")[0])
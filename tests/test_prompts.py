@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import json
+import os
+
+import pytest
+
+from aiweb_gen.cache import ResponseCache
+from aiweb_gen.llm import LLMClient, LLMConfig
+from aiweb_gen.prompts import PromptError, PromptRegistry, load_prompt, prompt_hash
+from aiweb_gen.stubserver import StubServer
+from aiweb_gen.tracing import Tracer, use_tracer
+
+
+def test_registry_parses_versions_and_variables(tmp_path):
+    (tmp_path / "GREET.txt").write_text(
+        "---\nversion: 3\n---\nHello {{ name }}, you are in {{room}}.\n", encoding="utf-8"
+    )
+    (tmp_path / "PLAIN.txt").write_text("Plain prompt\n", encoding="utf-8")
+    registry = PromptRegistry(tmp_path)
+
+    greet = registry.get("GREET")
+    assert greet.version == "3"
+    assert greet.variables == {"name", "room"}
+    assert greet.render(name="Ada", room="B") == "Hello Ada, you are in B.\n"
+    with pytest.raises(PromptError, match="missing variables"):
+        greet.render(name="Ada")
+    assert registry.manifest()["PLAIN"] == {
+        "version": "1",
+        "sha256": prompt_hash("Plain prompt\n"),
+        "variables": [],
+    }
+
+    # Edits are picked up on the next lookup.
+    path = tmp_path / "PLAIN.txt"
+    path.write_text("Edited\n", encoding="utf-8")
+    os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 1_000_000))
+    assert registry.get("PLAIN").text == "Edited\n"
+
+
+def test_one_broken_prompt_fails_the_first_lookup(tmp_path):
+    (tmp_path / "GOOD.txt").write_text("fine", encoding="utf-8")
+    (tmp_path / "BAD.txt").write_text("Hello {{ name", encoding="utf-8")
+    with pytest.raises(PromptError, match="BAD: malformed"):
+        load_prompt(tmp_path, "GOOD")
+
+
+def test_prompt_cache_hints_do_not_change_the_response_cache_key(tmp_path):
+    seen: list[dict] = []
+
+    def responder(payload: dict) -> str:
+        seen.append(payload)
+        return "ok"
+
+    cache = ResponseCache(tmp_path / "cache")
+    tracer = Tracer()
+    with StubServer(responder=responder) as stub, use_tracer(tracer):
+        for mode in ("anthropic", "openai"):
+            cfg = LLMConfig(api_key="k", base_url=stub.base_url, model="stub", prompt_cache=mode)
+            with LLMClient(cfg, cache=cache) as client:
+                client.chat_completion(
+                    system="SYS", user="SHARED|tail", prompt="P", stable_prefix=7
+                )
+
+    assert len(seen) == 1
+    system, user = seen[0]["messages"]
+    assert system["content"] == [
+        {"type": "text", "text": "SYS", "cache_control": {"type": "ephemeral"}}
+    ]
+    assert user["content"] == [
+        {"type": "text", "text": "SHARED|", "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": "tail"},
+    ]
+    assert cache.stats.hits == 1
+    spans = [e for e in tracer.events() if e["name"] == "llm.request"]
+    assert [s["attrs"]["prompt_hash"] for s in spans] == [prompt_hash("SYS")] * 2
+
+
+def test_openai_prompt_cache_key_names_the_prompt_revision():
+    with StubServer(responder=lambda payload: json.dumps(payload["prompt_cache_key"])) as stub:
+        cfg = LLMConfig(api_key="k", base_url=stub.base_url, model="stub", prompt_cache="openai")
+        with LLMClient(cfg) as client:
+            key = json.loads(client.chat_completion(system="SYS", user="u", prompt="P"))
+    assert key == f"aiweb-P-{prompt_hash('SYS')}"
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import socket
+
+import pytest
+
+from aiweb_gen.routing import LLMRouter, RoutingError
+from aiweb_gen.stubserver import StubServer
+
+
+def _model(payload: dict) -> str:
+    return payload["model"]
+
+
+def _dead_url() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/v1"
+
+
+@pytest.fixture(autouse=True)
+def _api_key(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "k")
+
+
+def test_prompts_route_to_their_models_with_weighted_balancing():
+    with StubServer(responder=_model) as big, StubServer(responder=_model) as small:
+        config = {
+            "endpoints": {
+                "big-a": {"base_url": big.base_url, "model": "big", "weight": 3},
+                "big-b": {"base_url": small.base_url, "model": "big-spare"},
+                "small": {"base_url": small.base_url, "model": "small"},
+            },
+            "routes": {
+                "CODE_VALIDATOR": ["small"],
+                "default": ["big-a", "big-b"],
+            },
+        }
+        with LLMRouter.from_dict(config) as router:
+            validator = router.chat_completion(system="s", user="u", prompt="CODE_VALIDATOR")
+            models = [
+                router.chat_completion(system="s", user=str(i), prompt="BACKEND_GENERATOR")
+                for i in range(8)
+            ]
+            stats = router.routing_stats()
+
+    assert validator == "small"
+    assert models.count("big") == 6
+    assert models.count("big-spare") == 2
+    assert stats["small"]["requests"] == 1
+    assert big.requests == 6
+
+
+def test_failed_endpoint_fails_over_to_the_next_entry():
+    with StubServer(responder=_model) as backup:
+        config = {
+            "endpoints": {
+                "down": {"base_url": _dead_url(), "model": "primary", "max_retries": 0},
+                "backup": {"base_url": backup.base_url, "model": "backup", "weight": 0},
+            },
+            "routes": {"default": ["down", "backup"]},
+        }
+        with LLMRouter.from_dict(config) as router:
+            out = router.chat_completion(system="s", user="u", prompt="ARCHITECT_MODE")
+            stats = router.routing_stats()
+
+    assert out == "backup"
+    assert stats["down"]["failures"] == 1
+    assert stats["backup"]["failovers"] == 1
+
+
+def test_route_to_unknown_endpoint_is_rejected():
+    config = {
+        "endpoints": {"a": {"base_url": "http://a", "model": "m"}},
+        "routes": {"PATCH_MODE": ["b"]},
+    }
+    with pytest.raises(RoutingError, match="unknown endpoint 'b'"):
+        LLMRouter.from_dict(config)
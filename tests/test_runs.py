@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import json
+
+from aiweb_gen.cli import main
+from aiweb_gen.flow import generate_flow
+from aiweb_gen.runs import Run, list_runs
+
+
+def test_resume_skips_completed_stages(tmp_path, prompts_dir, make_fake_client):
+    runs_dir = tmp_path / "runs"
+    out = tmp_path / "out"
+    run = Run.create(runs_dir, idea="x", options={"out": str(out)})
+
+    first = generate_flow(
+        idea="x",
+        out_dir=out,
+        prompts_dir=prompts_dir,
+        strict=True,
+        run=run,
+        client=make_fake_client(frontend_broken=True),
+    )
+    assert first["ok"] is False
+    assert list_runs(runs_dir)[0]["status"] == "failed"
+    assert list_runs(runs_dir)[0]["stages"] == ["backend", "spec"]
+
+    client = make_fake_client()
+    resumed = generate_flow(
+        idea="x",
+        out_dir=out,
+        prompts_dir=prompts_dir,
+        strict=True,
+        run=Run.open(runs_dir, run.id),
+        client=client,
+    )
+    assert resumed["ok"] is True
+    assert resumed["run_id"] == run.id
+    assert client.calls == ["FRONTEND_GENERATOR", "CODE_VALIDATOR"]
+    assert (out / "demo" / "backend" / "main.py").exists()
+    summary = list_runs(runs_dir)[0]
+    assert summary["status"] == "completed"
+    assert summary["stages"] == ["backend", "frontend", "spec"]
+
+
+def test_runs_list_command_needs_no_llm_config(tmp_path, monkeypatch, capsys):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    Run.create(tmp_path, idea="an idea", options={}, run_id="r1")
+    assert main(["runs", "list", "--runs-dir", str(tmp_path)]) == 0
+    runs = json.loads(capsys.readouterr().out)
+    assert [(r["id"], r["status"], r["idea"]) for r in runs] == [("r1", "running", "an idea")]
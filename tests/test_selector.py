@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from aiweb_gen.selector import GitIgnore, iter_candidate_files, select_files
+
+
+def _write(root, rel, content):
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(content, bytes):
+        path.write_bytes(content)
+    else:
+        path.write_text(content, encoding="utf-8")
+
+
+def test_gitignore_patterns():
+    ig = GitIgnore()
+    for line in ("# comment", "*.log", "build/", "/secret.txt", "!keep.log", "docs/**/draft.md"):
+        ig.add_pattern(line)
+    assert ig.ignored("a/b/debug.log", is_dir=False)
+    assert not ig.ignored("keep.log", is_dir=False)
+    assert ig.ignored("build", is_dir=True)
+    assert not ig.ignored("build", is_dir=False)
+    assert ig.ignored("secret.txt", is_dir=False)
+    assert not ig.ignored("sub/secret.txt", is_dir=False)
+    assert ig.ignored("docs/x/y/draft.md", is_dir=False)
+
+
+def test_candidates_honour_gitignore_and_hidden(tmp_path):
+    _write(tmp_path, ".gitignore", "node_modules/\n")
+    _write(tmp_path, "node_modules/pkg/index.js", "x")
+    _write(tmp_path, ".git/config", "x")
+    _write(tmp_path, "web/.gitignore", "*.gen.ts\n")
+    _write(tmp_path, "web/api.gen.ts", "x")
+    _write(tmp_path, "web/app.ts", "x")
+    assert [rel for rel, _ in iter_candidate_files(tmp_path)] == ["web/app.ts"]
+
+
+def test_select_ranks_relevant_files_and_skips_binaries(tmp_path):
+    _write(tmp_path, "app/dark_mode.py", "def toggle_dark_mode():\n    return 'theme'\n")
+    _write(tmp_path, "app/billing.py", "def charge_invoice():\n    return 1\n" * 50)
+    _write(tmp_path, "logo.bin", b"\x89PNG\x00\x00binary")
+
+    selection = select_files(tmp_path, "Add a dark mode toggle", token_budget=60)
+
+    assert [f.path for f in selection.files] == ["app/dark_mode.py"]
+    assert selection.omitted == ["app/billing.py"]
+    assert selection.report()["included"][0]["path"] == "app/dark_mode.py"
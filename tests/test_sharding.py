@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import json
+import threading
+
+from aiweb_gen.flow import validate_bundle_flow
+from aiweb_gen.parsing import FileBlock, format_file_blocks, parse_file_blocks
+from aiweb_gen.sharding import shard_blocks
+
+
+def _paths(shards: list[list[FileBlock]]) -> list[list[str]]:
+    return [[b.path for b in shard] for shard in shards]
+
+
+def test_small_bundle_is_one_shard():
+    blocks = [FileBlock("a.py", "x = 1\n"), FileBlock("b.py", "y = 2\n")]
+    assert _paths(shard_blocks(blocks, max_tokens=1000)) == [["a.py", "b.py"]]
+
+
+def test_imported_files_share_a_shard_across_directories():
+    filler = "# " + "x" * 400 + "\n"
+    blocks = [
+        FileBlock("api/routes.py", "from ..core import db\n" + filler),
+        FileBlock("core/__init__.py", ""),
+        FileBlock("core/db.py", filler),
+        FileBlock("web/page.ts", "import { h } from '../util/h'\n" + filler),
+        FileBlock("util/h.ts", "export const h = 1\n" + filler),
+    ]
+    shards = _paths(shard_blocks(blocks, max_tokens=300))
+    assert sorted(sorted(s) for s in shards) == [
+        ["api/routes.py", "core/__init__.py", "core/db.py"],
+        ["util/h.ts", "web/page.ts"],
+    ]
+
+
+def test_oversized_group_and_file_still_get_shards():
+    big = FileBlock("big.py", "x" * 10_000)
+    small = FileBlock("small.py", "y = 1\n")
+    shards = _paths(shard_blocks([big, small], max_tokens=100))
+    assert shards == [["big.py"], ["small.py"]]
+
+
+class _ShardValidator:
+    """CODE_VALIDATOR stand-in that flags every file it sees in a fixed issue."""
+
+    def __init__(self) -> None:
+        self.bundles: list[str] = []
+        self._lock = threading.Lock()
+
+    def chat_completion(self, *, user: str, **_: object) -> str:
+        with self._lock:
+            self.bundles.append(user)
+        files = [b.path for b in parse_file_blocks(user)]
+        issues = [{"file": f, "severity": "low", "description": "style"} for f in files]
+        issues.append({"file": "shared.py", "severity": "low", "description": "duplicated"})
+        return json.dumps({"valid": True, "issues": issues})
+
+
+def test_validate_bundle_flow_merges_shard_reports(prompts_dir):
+    blocks = [FileBlock(f"pkg{i}/m.py", "x = 1\n" * 200) for i in range(4)]
+    client = _ShardValidator()
+    report = validate_bundle_flow(
+        blocks=blocks,
+        code_bundle_text=format_file_blocks(blocks),
+        prompts_dir=prompts_dir,
+        max_shard_tokens=400,
+        max_concurrency=2,
+        client=client,
+    )
+    assert report["shards"] == 4
+    assert len(client.bundles) == 4
+    assert report["valid"] is True
+    assert sorted(i["file"] for i in report["issues"]) == [
+        "pkg0/m.py",
+        "pkg1/m.py",
+        "pkg2/m.py",
+        "pkg3/m.py",
+        "shared.py",
+    ]
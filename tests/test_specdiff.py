@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from aiweb_gen.flow import generate_flow, incremental_generate_flow
+from aiweb_gen.fsops import WriteError, delete_files
+from aiweb_gen.specdiff import diff_specs
+
+BASE = {
+    "app_name": "demo",
+    "description": "d",
+    "tech_stack": {"backend": "fastapi"},
+    "pages": [{"name": "Home", "route": "/"}],
+    "components": [],
+    "database_models": [{"name": "Task", "fields": {"title": "str"}}],
+    "api_endpoints": [{"method": "get", "path": "/tasks", "auth_required": True}],
+    "non_functional_requirements": [],
+}
+
+
+def _with(**changes: object) -> dict:
+    return {**BASE, **changes}
+
+
+def test_diff_matches_entries_by_identity():
+    new = _with(
+        pages=[{"name": "Home", "route": "/"}, {"name": "About", "route": "/about"}],
+        database_models=[{"name": "Task", "fields": {"title": "str", "done": "bool"}}],
+        api_endpoints=[],
+        description="changed",
+    )
+    diff = diff_specs(BASE, new)
+    assert not diff.full_rebuild
+    assert diff.summary()["sections"] == {
+        "pages": {"added": 1, "changed": 0, "removed": 0},
+        "components": {"added": 0, "changed": 0, "removed": 0},
+        "database_models": {"added": 0, "changed": 1, "removed": 0},
+        "api_endpoints": {"added": 0, "changed": 0, "removed": 1},
+    }
+    assert diff.other_changes == ["description"]
+    assert diff.changed_names("backend") == ["Task", "GET /tasks"]
+
+
+def test_tech_stack_change_forces_full_rebuild():
+    diff = diff_specs(BASE, _with(tech_stack={"backend": "django"}))
+    assert diff.full_rebuild
+    assert diff_specs(BASE, BASE).empty
+
+
+class _SpecClient:
+    def __init__(self, spec: dict, frontend: str | None = None) -> None:
+        self.spec = spec
+        self.frontend = frontend or "=== FILE: src/About.tsx ===\nimport './Home'\nexport {}\n"
+        self.calls: list[str] = []
+        self.users: dict[str, str] = {}
+
+    def chat_completion(self, *, system: str, user: str, **_: object) -> str:
+        self.calls.append(system)
+        self.users[system] = user
+        if system == "ARCHITECT_MODE":
+            return json.dumps(self.spec)
+        if system == "BACKEND_GENERATOR":
+            return "=== FILE: app/__init__.py ===\n\n=== FILE: app/models.py ===\nX = 1\n"
+        if system == "FRONTEND_GENERATOR":
+            return "=== FILE: src/Home.tsx ===\nexport {}\n"
+        if system == "FRONTEND_INCREMENTAL":
+            return self.frontend
+        if system == "CODE_VALIDATOR":
+            return json.dumps({"valid": True, "issues": []})
+        raise AssertionError(f"unexpected prompt {system}")
+
+
+def test_incremental_regenerates_only_the_affected_branch(tmp_path, prompts_dir):
+    for name in ("BACKEND_INCREMENTAL", "FRONTEND_INCREMENTAL"):
+        (prompts_dir / f"{name}.txt").write_text(name, encoding="utf-8")
+    out = tmp_path / "out"
+    generate_flow(
+        idea="x", out_dir=out, prompts_dir=prompts_dir, strict=True, client=_SpecClient(BASE)
+    )
+
+    new = _with(pages=[*BASE["pages"], {"name": "About", "route": "/about"}])
+    client = _SpecClient(new)
+    result = incremental_generate_flow(
+        idea="x", out_dir=out, prompts_dir=prompts_dir, strict=True, client=client
+    )
+
+    assert result["ok"] is True
+    assert result["mode"] == "incremental"
+    assert client.calls == ["ARCHITECT_MODE", "FRONTEND_INCREMENTAL", "CODE_VALIDATOR"]
+    assert result["backend"]["regenerated"] is False
+    assert result["frontend"]["files_written"] == ["src/About.tsx"]
+    request = json.loads(client.users["FRONTEND_INCREMENTAL"])
+    assert request["existing_paths"] == ["src/Home.tsx"]
+    assert request["changes"]["pages"]["added"] == [{"name": "About", "route": "/about"}]
+    assert (out / "demo" / "frontend" / "src" / "Home.tsx").exists()
+    assert json.loads((out / "demo" / "spec.json").read_text(encoding="utf-8")) == new
+
+
+def test_incremental_deletes_files_of_removed_entries(tmp_path, prompts_dir):
+    for name in ("BACKEND_INCREMENTAL", "FRONTEND_INCREMENTAL"):
+        (prompts_dir / f"{name}.txt").write_text(name, encoding="utf-8")
+    out = tmp_path / "out"
+    generate_flow(
+        idea="x", out_dir=out, prompts_dir=prompts_dir, strict=True, client=_SpecClient(BASE)
+    )
+
+    new = _with(pages=[{"name": "Start", "route": "/"}])
+    reply = "=== DELETE: src/Home.tsx ===\n=== FILE: src/pages/Start.tsx ===\nexport {}\n"
+    result = incremental_generate_flow(
+        idea="x", out_dir=out, prompts_dir=prompts_dir, strict=True, client=_SpecClient(new, reply)
+    )
+
+    frontend = out / "demo" / "frontend"
+    assert result["ok"] is True
+    assert result["frontend"]["files_written"] == ["src/pages/Start.tsx"]
+    assert result["frontend"]["files_deleted"] == ["src/Home.tsx"]
+    assert not (frontend / "src" / "Home.tsx").exists()
+    assert (frontend / "src" / "pages" / "Start.tsx").exists()
+
+    # Only deletions is a valid reply; imports of a deleted file no longer resolve.
+    reply = "=== DELETE: src/pages/Start.tsx ===\n"
+    reply += "=== FILE: src/App.tsx ===\nimport './pages/Start'\n"
+    result = incremental_generate_flow(
+        idea="x",
+        out_dir=out,
+        prompts_dir=prompts_dir,
+        strict=True,
+        client=_SpecClient(_with(pages=[]), reply),
+    )
+    assert result["ok"] is False and result["stage"] == "frontend_validation_failed"
+    assert (frontend / "src" / "pages" / "Start.tsx").exists()
+
+    result = incremental_generate_flow(
+        idea="x",
+        out_dir=out,
+        prompts_dir=prompts_dir,
+        strict=True,
+        client=_SpecClient(_with(pages=[]), "=== DELETE: src/pages/Start.tsx ===\n"),
+    )
+    assert result["frontend"]["files_deleted"] == ["src/pages/Start.tsx"]
+    assert not (frontend / "src").exists()
+    with pytest.raises(WriteError, match="outside root"):
+        delete_files(frontend, ["../backend/app/models.py"])
+
+
+def test_incremental_without_previous_spec_runs_full_generate(tmp_path, prompts_dir):
+    client = _SpecClient(BASE)
+    result = incremental_generate_flow(
+        idea="x", out_dir=tmp_path, prompts_dir=prompts_dir, strict=False, client=client
+    )
+    assert result["mode"] == "full"
+    assert client.calls.count("ARCHITECT_MODE") == 1
+    assert (tmp_path / "demo" / "backend" / "app" / "models.py").exists()
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from aiweb_gen import __version__
+
+SRC = Path(__file__).resolve().parents[1] / "src"
+# Generous for slow CI machines: the CLI imports in ~5ms; the full pipeline takes ~200ms.
+IMPORT_BUDGET_US = 60_000
+# Modules only a subcommand that talks to a model (or to the daemon) may load.
+HEAVY_MODULES = ("requests", "urllib3", "aiweb_gen.flow", "aiweb_gen.llm", "http.client")
+
+
+def _python(*args: str) -> subprocess.CompletedProcess:
+    path = os.pathsep.join(filter(None, [str(SRC), os.environ.get("PYTHONPATH")]))
+    env = {**os.environ, "PYTHONPATH": path}
+    return subprocess.run(
+        [sys.executable, *args], capture_output=True, text=True, env=env, check=True
+    )
+
+
+def test_cli_import_stays_within_budget():
+    stderr = _python("-X", "importtime", "-c", "import aiweb_gen.cli").stderr
+    imported: dict[str, int] = {}
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "self [us]" not in line:
+            _, cumulative_us, name = line[len("import time:") :].split("|", 2)
+            imported[name.strip()] = int(cumulative_us)
+
+    assert [m for m in HEAVY_MODULES if m in imported] == []
+    assert imported["aiweb_gen.cli"] < IMPORT_BUDGET_US
+
+
+def test_version_fast_path():
+    assert _python("-m", "aiweb_gen", "--version").stdout == f"aiweb-gen {__version__}\n"
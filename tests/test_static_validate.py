@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+from aiweb_gen import static_validate
+from aiweb_gen.flow import backend_flow
+from aiweb_gen.parsing import FileBlock
+from aiweb_gen.static_validate import merge_reports, validate_blocks
+
+
+def _issues(report: dict) -> set[tuple[str, str]]:
+    # Drop line suffixes and parser messages, which vary between Python versions.
+    return {(i["file"], i["description"].split(" (line")[0].split(":")[0]) for i in report["issues"]}
+
+
+def test_clean_bundle_is_valid():
+    blocks = [
+        FileBlock("app/__init__.py", ""),
+        FileBlock("app/main.py", "from .routes import router\nfrom . import models\n"),
+        FileBlock("app/routes.py", "router = None\n"),
+        FileBlock("app/models.py", "X = 1\n"),
+        FileBlock("pyproject.toml", '[project]\nname = "x"\n'),
+        FileBlock("src/main.tsx", "import App from './App'\nimport './index.css'\n"),
+        FileBlock("src/App.tsx", "export default function App() {}\n"),
+        FileBlock("src/index.css", "body {}\n"),
+        FileBlock("index.html", '<script type="module" src="/src/main.tsx"></script>'),
+        FileBlock("package.json", '{"name": "x"}'),
+    ]
+    report = validate_blocks(blocks)
+    assert report == {"valid": True, "issues": [], "checked_files": len(blocks)}
+
+
+def test_reports_syntax_errors_and_broken_references():
+    blocks = [
+        FileBlock("main.py", "def broken(:\n"),
+        FileBlock("app/api.py", "from .missing import thing\n"),
+        FileBlock("data.json", "{bad json}"),
+        FileBlock("src/main.ts", "import { a } from './nope'\n"),
+        FileBlock("index.html", '<link href="style.css"><a href="https://x.test/">x</a>'),
+    ]
+    report = validate_blocks(blocks)
+    assert report["valid"] is False
+    assert _issues(report) == {
+        ("main.py", "Syntax error at line 1"),
+        ("app/api.py", "Missing import"),
+        ("data.json", "Invalid JSON at line 1"),
+        ("src/main.ts", "Missing import"),
+        ("index.html", "Referenced file not found"),
+    }
+    severities = {i["file"]: i["severity"] for i in report["issues"]}
+    assert severities["index.html"] == "medium"
+
+
+def test_process_pool_matches_inline(monkeypatch):
+    blocks = [FileBlock(f"pkg/m{i}.py", f"from .m{i + 1} import x\n") for i in range(40)]
+    contexts = []
+
+    class Pool(static_validate.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs) -> None:
+            contexts.append(kwargs.get("mp_context"))
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(static_validate, "ProcessPoolExecutor", Pool)
+    inline = validate_blocks(blocks, max_workers=1)
+    pooled = validate_blocks(blocks, max_workers=2)
+    assert inline == pooled
+    # Never fork: the pool is started from threads that may hold locks.
+    assert [c.get_start_method() for c in contexts] in (["forkserver"], ["spawn"])
+    assert [i["file"] for i in pooled["issues"]] == ["pkg/m39.py"]
+
+
+def test_merge_reports_dedupes_issues():
+    a = {"valid": True, "issues": [{"file": "a.py", "severity": "low", "description": "X"}]}
+    b = {"valid": False, "issues": [{"file": "a.py", "severity": "high", "description": "x "}]}
+    merged = merge_reports(a, b)
+    assert merged["valid"] is False
+    assert len(merged["issues"]) == 1
+
+
+class _BrokenBackendClient:
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+
+    def chat_completion(self, *, system: str, **_: object) -> str:
+        self.calls.append(system)
+        if system == "BACKEND_GENERATOR":
+            return "=== FILE: main.py ===\ndef broken(:\n"
+        raise AssertionError(f"unexpected prompt {system}")
+
+
+def test_hybrid_mode_skips_llm_validator_on_local_failure(prompts_dir):
+    client = _BrokenBackendClient()
+    files, report = backend_flow(spec={"app_name": "demo"}, prompts_dir=prompts_dir, client=client)
+    assert files == [("main.py", "def broken(:\n")]
+    assert report["valid"] is False
+    assert report["validator"] == "local"
+    assert client.calls == ["BACKEND_GENERATOR"]
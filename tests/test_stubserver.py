@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+import requests
+
+from aiweb_gen.llm import LLMClient, LLMConfig, LLMError
+from aiweb_gen.stubserver import Cassette, StubServer
+
+
+def _client(stub: StubServer, **overrides: object) -> LLMClient:
+    return LLMClient(LLMConfig(api_key="k", base_url=stub.base_url, model="stub", **overrides))
+
+
+def _payload(system: str, user: str) -> dict:
+    return {"messages": [{"role": "system", "content": system}, {"role": "user", "content": user}]}
+
+
+def test_cassette_records_and_replays(tmp_path):
+    path = tmp_path / "calls.jsonl"
+    recorder = Cassette(path)
+    recorder.add(_payload("A", "1"), "one")
+    recorder.add(_payload("A", "2"), "two")
+
+    with StubServer(cassette=Cassette(path)) as stub, _client(stub, max_retries=0) as client:
+        assert client.chat_completion(system="A", user="2") == "two"
+        assert "".join(client.stream_chat_completion(system="A", user="1")) == "one"
+        with pytest.raises(LLMError, match="HTTP 404"):
+            client.chat_completion(system="A", user="3")
+        assert requests.get(f"{stub.base_url}/stats", timeout=5).json()["cassette_misses"] == 1
+
+    with StubServer(cassette=Cassette(path, match="system")) as stub, _client(stub) as client:
+        answers = [client.chat_completion(system="A", user=f"new {i}") for i in range(3)]
+    assert answers == ["one", "two", "one"]
+
+
+def test_injected_rate_limits_are_retried():
+    with StubServer(rate_limit_every=2, retry_after_s=0) as stub, _client(stub) as client:
+        outputs = [client.chat_completion(system="s", user=f"u{i}") for i in range(3)]
+        stats = client.scheduler_stats()
+    assert outputs == ["u0", "u1", "u2"]
+    assert stub.rate_limited == 2
+    assert stats["rate_limited"] == 2
+
+
+def test_latency_and_token_rate_slow_responses_down():
+    with StubServer(latency_s=0.05, tokens_per_s=400) as stub, _client(stub) as client:
+        start = time.perf_counter()
+        client.chat_completion(system="s", user="x" * 80)
+        elapsed = time.perf_counter() - start
+    # 50ms to first byte + 20 tokens at 400 tokens/s.
+    assert elapsed >= 0.1
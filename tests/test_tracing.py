@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import json
+import sys
+import threading
+
+from aiweb_gen.flow import generate_flow
+from aiweb_gen.llm import LLMClient, LLMConfig
+from aiweb_gen.stubserver import StubServer
+from aiweb_gen.tracing import Tracer, use_tracer
+
+
+def test_client_records_bytes_and_usage_on_stage_span():
+    tracer = Tracer()
+    with StubServer() as stub, use_tracer(tracer):
+        cfg = LLMConfig(api_key="k", base_url=stub.base_url, model="stub")
+        with LLMClient(cfg) as client:
+            with tracer.span("stage"):
+                client.chat_completion(system="s", user="hello world")
+                "".join(client.stream_chat_completion(system="s", user="streamed"))
+
+    stage = tracer.summary()["stages"]["stage"]
+    assert stage["llm_calls"] == 2
+    assert stage["request_bytes"] > 0 and stage["response_bytes"] > 0
+    assert stage["prompt_tokens"] > 0 and stage["completion_tokens"] > 0
+    assert tracer.summary()["stages"]["llm.request"]["count"] == 2
+
+
+def test_generate_flow_spans_cover_every_stage(tmp_path, prompts_dir, make_fake_client):
+    tracer = Tracer()
+    with use_tracer(tracer):
+        generate_flow(
+            idea="x",
+            out_dir=tmp_path / "out",
+            prompts_dir=prompts_dir,
+            strict=False,
+            concurrent=True,
+            client=make_fake_client(),
+        )
+
+    names = {e["name"] for e in tracer.events()}
+    assert {
+        "architect",
+        "backend.generate",
+        "backend.validate",
+        "frontend.generate",
+        "frontend.validate",
+        "backend.write",
+        "frontend.write",
+        "spec.write",
+    } <= names
+    assert tracer.summary()["stages"]["backend.write"]["bytes_written"] > 0
+
+    trace_path = tmp_path / "trace.json"
+    tracer.write(trace_path, "chrome")
+    events = json.loads(trace_path.read_text(encoding="utf-8"))["traceEvents"]
+    assert all(e["ph"] == "X" for e in events)
+
+
+def test_counters_added_from_many_threads_are_not_lost():
+    tracer = Tracer()
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads often enough to expose lost updates
+    try:
+        with use_tracer(tracer), tracer.span("stage") as stage:
+            children = [tracer.start("unit") for _ in range(8)]
+            threads = [
+                threading.Thread(target=lambda s=child: [s.add(llm_calls=1) for _ in range(2000)])
+                for child in children
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    assert stage.snapshot()["llm_calls"] == 8 * 2000
+    assert tracer.summary()["totals"]["llm_calls"] == 8 * 2000